@@ -0,0 +1,215 @@
+"""命令行入口：不启动界面，直接按 settings.json 整理目录，适合在服务器上用 cron / systemd 定时运行
+
+用法:
+    python -m cli run 源目录 [目标目录] [--settings 路径] [--set 键=值 ...]
+    python -m cli serve [--host 地址] [--port 端口] [--token 令牌]   # 任务服务（HTTP 接口）
+
+退出码: 0 全部成功（或没有需要处理的文件），1 有文件处理失败，2 参数或设置错误，
+3 运行出错，130 被中断（Ctrl+C / SIGTERM，检查点已保存，下次运行从中断处继续）
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from typing import Dict, Any, List
+
+from config import load_settings, get_default_settings, DEFAULT_JOB_SERVER_HOST, DEFAULT_JOB_SERVER_PORT
+from core.engine import ProcessingEngine
+
+EXIT_OK = 0
+EXIT_FILES_FAILED = 1
+EXIT_USAGE = 2
+EXIT_ERROR = 3
+EXIT_INTERRUPTED = 130
+
+
+def load_cli_settings(settings_path: str, overrides: List[str]) -> Dict[str, Any]:
+    """读取设置文件（缺少的键使用默认值）并应用 --set 覆盖，值按 JSON 解析，解析失败时作为字符串"""
+    settings = get_default_settings()
+    if settings_path:
+        with open(settings_path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    else:
+        settings.update(load_settings())
+    for override in overrides:
+        key, sep, value = override.partition("=")
+        key = key.strip()
+        if not sep or not key:
+            raise ValueError(f"无效的设置覆盖（应为 键=值）: {override}")
+        try:
+            settings[key] = json.loads(value)
+        except ValueError:
+            settings[key] = value
+    return settings
+
+
+class ProgressPrinter:
+    """定期输出进度和吞吐量（到标准错误），日志输出到标准输出"""
+
+    def __init__(self, interval: float, quiet: bool):
+        self.interval = interval
+        self.quiet = quiet
+        self.started_at = time.time()
+        self._last_print = 0.0
+        self._lock = threading.Lock()
+
+    def log(self, message: str) -> None:
+        if not self.quiet:
+            print(message, flush=True)
+
+    def progress(self, current: int, total: int) -> None:
+        now = time.time()
+        with self._lock:
+            if current < total and now - self._last_print < self.interval:
+                return
+            self._last_print = now
+        elapsed = max(now - self.started_at, 1e-6)
+        rate = current / elapsed
+        line = f"进度: {current}/{total} ({current / total * 100:.1f}%)，{rate:.2f} 个/秒"
+        if 0 < current < total and rate > 0:
+            line += f"，预计剩余 {format_seconds((total - current) / rate)}"
+        print(line, file=sys.stderr, flush=True)
+
+
+def format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}时{seconds % 3600 // 60:02d}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60:02d}秒"
+    return f"{seconds}秒"
+
+
+def run_command(args: argparse.Namespace) -> int:
+    if not os.path.isdir(args.source):
+        print(f"源目录不存在: {args.source}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        settings = load_cli_settings(args.settings, args.set)
+    except (OSError, ValueError) as e:
+        print(f"读取设置失败: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if args.rescan:
+        settings["checkpoint_rescan"] = True
+
+    source_dir = os.path.abspath(args.source)
+    target_dir = os.path.abspath(args.target) if args.target else source_dir
+    printer = ProgressPrinter(args.progress_interval, args.quiet)
+    engine = ProcessingEngine(
+        source_dir,
+        target_dir,
+        not args.no_recursive,
+        settings,
+        on_log=printer.log,
+        on_progress=printer.progress
+    )
+
+    # Ctrl+C / SIGTERM 时停止派发新文件并等待在途文件完成，检查点保留到下次运行
+    def on_signal(signum, frame):
+        print("收到停止信号，等待正在处理的文件完成...", file=sys.stderr, flush=True)
+        engine.stop()
+        signal.signal(signum, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+
+    try:
+        summary = engine.run()
+    except Exception as e:
+        print(f"运行出错: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    elapsed = summary["elapsed"]
+    rate = summary["processed"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"完成: 成功 {summary['succeeded']}，失败 {summary['failed']}，"
+        f"共 {summary['total']} 个待处理，耗时 {format_seconds(elapsed)}，{rate:.2f} 个/秒",
+        file=sys.stderr
+    )
+    if args.summary_json:
+        print(json.dumps(summary, ensure_ascii=False))
+    if summary["stopped"]:
+        return EXIT_INTERRUPTED
+    if summary["failed"]:
+        return EXIT_FILES_FAILED
+    return EXIT_OK
+
+
+def serve_command(args: argparse.Namespace) -> int:
+    # 只有服务模式才加载 HTTP 服务相关模块
+    from core.job_server import JobManager, create_server
+
+    try:
+        settings = load_cli_settings(args.settings, args.set)
+    except (OSError, ValueError) as e:
+        print(f"读取设置失败: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    token = args.token or os.environ.get("AI_PICK_TOKEN")
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not token:
+        print("警告: 监听非本机地址但未设置令牌（--token），任何能访问该端口的人都可以提交任务", file=sys.stderr)
+
+    try:
+        manager = JobManager(settings, log=lambda message: print(message, flush=True))
+        server = create_server(manager, args.host, args.port, token)
+    except Exception as e:
+        print(f"启动任务服务失败: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    # SIGTERM（systemd 停止服务）与 Ctrl+C 相同：停止接收请求，取消任务并等待在途文件完成
+    def on_signal(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+
+    print(f"任务服务已启动: http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        print("正在停止任务服务，等待在途文件完成...", file=sys.stderr, flush=True)
+        manager.shutdown()
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli", description="AI 媒体文件整理（命令行）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="整理一个目录")
+    run_parser.add_argument("source", help="源目录")
+    run_parser.add_argument("target", nargs="?", help="目标目录（默认与源目录相同）")
+    run_parser.add_argument("--settings", help="设置文件路径（默认使用程序目录下的 settings.json）")
+    run_parser.add_argument(
+        "--set", action="append", default=[], metavar="键=值",
+        help="覆盖单个设置，值按 JSON 解析，例如 --set operation_mode=move --set max_concurrent=4（可重复）"
+    )
+    run_parser.add_argument("--no-recursive", action="store_true", help="不扫描子目录")
+    run_parser.add_argument("--rescan", action="store_true", help="从检查点继续时也重新扫描源目录，加入中断后新增的文件")
+    run_parser.add_argument("--progress-interval", type=float, default=5.0, help="输出进度的间隔（秒），默认 5")
+    run_parser.add_argument("--quiet", action="store_true", help="不输出日志，只输出进度和汇总")
+    run_parser.add_argument("--summary-json", action="store_true", help="结束时在标准输出打印 JSON 格式的汇总")
+    run_parser.set_defaults(func=run_command)
+
+    serve_parser = subparsers.add_parser("serve", help="启动任务服务（HTTP 接口提交和查看任务，所有任务共用推理线程池）")
+    serve_parser.add_argument("--host", default=DEFAULT_JOB_SERVER_HOST, help=f"监听地址，默认 {DEFAULT_JOB_SERVER_HOST}")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_JOB_SERVER_PORT, help=f"端口，默认 {DEFAULT_JOB_SERVER_PORT}")
+    serve_parser.add_argument("--token", help="访问令牌，请求需带 Authorization: Bearer <令牌>（也可用环境变量 AI_PICK_TOKEN）")
+    serve_parser.add_argument("--settings", help="设置文件路径（默认使用程序目录下的 settings.json）")
+    serve_parser.add_argument("--set", action="append", default=[], metavar="键=值", help="覆盖单个设置（可重复）")
+    serve_parser.set_defaults(func=serve_command)
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,6 +17,10 @@ VIDEO_EXTENSIONS = {
 
 DEFAULT_OLLAMA_URL = "http://localhost:11434"
 DEFAULT_OLLAMA_MODEL = "llava:7b"
+DEFAULT_OLLAMA_KEEP_ALIVE = "30m"  # 模型在显存中的保留时间，"-1" 表示常驻
+DEFAULT_OLLAMA_NUM_PREDICT = 128  # 单次生成的最大token数
+DEFAULT_OLLAMA_NUM_PARALLEL = 0  # 服务端并行数，0 表示自动检测（环境变量或探测）
+DEFAULT_OLLAMA_URLS = []  # 多个 Ollama 服务地址组成端点池，为空时只使用 DEFAULT_OLLAMA_URL
 DEFAULT_MODELS = ["llava:7b", "llava:13b", "bakllava:7b"]
 
 # Network API configuration
@@ -32,7 +36,48 @@ DEFAULT_NETWORK_API_MODELS = [
     "deepseek-ai/DeepSeek-V3.2",
     "gemini-3-pro-low"
 ]
+# 每个模型的速率预算，格式: {模型名: {"rpm": 每分钟请求数, "tpm": 每分钟token数}}，未配置或为 0 表示不限
+# 例如 {"Qwen/Qwen3-VL-8B-Instruct": {"rpm": 1000, "tpm": 50000}}，请按服务商账户的实际限额填写
+DEFAULT_NETWORK_API_MODEL_LIMITS = {}
 DEFAULT_NETWORK_API_ROUND_ROBIN = True  # 启用模型轮询
+# 多模型路由策略: least_loaded（活跃请求最少）, least_latency（预期完成时间最短）, p2c（随机二选一）
+DEFAULT_NETWORK_API_ROUTING = "least_latency"
+DEFAULT_MODEL_STATS_LOG_INTERVAL = 30  # 日志面板输出模型统计的间隔（秒）
+# 批量请求：每次网络API请求包含的图片数（1 表示不合并）
+DEFAULT_NETWORK_BATCH_SIZE = 1
+# 对冲请求配置：请求超过模型 P95 延迟仍未返回时向另一个模型发送副本，取先返回的结果
+DEFAULT_HEDGE_ENABLED = False
+DEFAULT_HEDGE_BUDGET_PERCENT = 5  # 对冲产生的额外请求占比上限（%）
+# 流式响应：边接收边解析，回答完整后提前断开，不等待模型生成剩余内容
+DEFAULT_NETWORK_STREAM_ENABLED = False
+# 输出约束：用 response_format（JSON Schema，类别为枚举）约束输出，并按输出结构设置 max_tokens
+DEFAULT_STRUCTURED_OUTPUT_ENABLED = True
+# 两级识别：网络API模式下先用 Ollama（本地小模型）识别，失败、无法解析或落入兜底类别时再请求网络模型
+DEFAULT_CASCADE_ENABLED = False
+# 离线批处理任务：把请求写成 JSONL 分片提交到 Batch API（或本地逐个发送），完成后统一入库和移动文件
+DEFAULT_BATCH_JOB_ENABLED = False
+DEFAULT_BATCH_JOB_BACKEND = "openai"  # openai: OpenAI 兼容的 Batch API；local: 本地逐个发送请求
+DEFAULT_BATCH_JOB_DIR = os.path.join(os.path.dirname(__file__), 'batch_jobs')
+DEFAULT_BATCH_JOB_SHARD_SIZE = 500  # 每个 JSONL 分片的请求数
+DEFAULT_BATCH_JOB_SHARD_MAX_MB = 150  # 每个 JSONL 分片的大小上限（MB），Batch API 单个输入文件最大 200 MB
+DEFAULT_BATCH_JOB_POLL_INTERVAL = 60  # 查询批处理任务状态的间隔（秒）
+# 分阶段流水线：检查（指纹/规则）、解码、识别、移动/入库各用独立的线程池，阶段之间用有界队列连接
+DEFAULT_PIPELINE_ENABLED = False
+DEFAULT_PIPELINE_IO_WORKERS = 2  # 检查和移动/入库阶段（磁盘）的线程数
+DEFAULT_PIPELINE_DECODE_WORKERS = 0  # 解码阶段（CPU）的线程数，0 表示使用 CPU 核数
+# 处理顺序：path 按路径（图片在前、视频在后），longest_first 估计耗时长的先处理，
+# interleave 图片和视频交替，locality 按目录分组
+DEFAULT_SCHEDULING_POLICY = "path"
+# 自适应并发配置（AIMD，根据延迟和 429/5xx/超时自动调整网络 API 并发数）
+DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED = False
+DEFAULT_ADAPTIVE_CONCURRENCY_MIN = 1
+DEFAULT_ADAPTIVE_CONCURRENCY_MAX = 16
+# 异步推理引擎配置（仅网络 API）
+DEFAULT_ASYNC_ENGINE_ENABLED = False
+DEFAULT_ASYNC_MAX_IN_FLIGHT = 200  # 异步模式下最大在途请求数
+# 硅基流动客户端默认配置（与网络 API 默认值一致）
+DEFAULT_SILICONFLOW_URL = DEFAULT_NETWORK_API_URL
+DEFAULT_SILICONFLOW_MODEL = DEFAULT_NETWORK_API_MODEL
 
 # Rename configuration
 DEFAULT_RENAME_ENABLED = False
@@ -47,6 +92,9 @@ DEFAULT_RETRY_ENABLED = True
 DEFAULT_RETRY_COUNT = 3
 DEFAULT_RETRY_DELAY = 2  # seconds
 DEFAULT_REQUEST_TIMEOUT = 180  # seconds - 网络请求超时时间
+DEFAULT_RETRY_MAX_DELAY = 60  # seconds - 指数退避的最大等待时间
+DEFAULT_CIRCUIT_BREAKER_THRESHOLD = 5  # 模型连续失败该次数后熔断
+DEFAULT_CIRCUIT_BREAKER_COOLDOWN = 30  # seconds - 熔断后暂停使用模型的时间
 DEFAULT_ERROR_EXPORT_ENABLED = True
 DEFAULT_ERROR_EXPORT_FOLDER = "error_files"
 
@@ -64,6 +112,20 @@ CATEGORIES = [
     "其他"
 ]
 
+# 规则预分类：在解码和AI识别之前按文件名、尺寸、EXIF 等信息直接归类，命中第一条规则即采用其类别
+# 条件说明见 core/rule_engine.py 中的 ClassificationRule；类别不在分类列表中的规则被忽略
+# 默认只包含文件名规则，英文关键词后必须是分隔符、数字或扩展名（避免 Scandinavia.jpg、scanner.png 等误判）；
+# 只按尺寸判断的规则（如无相机信息的屏幕尺寸 PNG）会把壁纸、导出图误判为截图，需要时自行添加
+DEFAULT_RULE_ENGINE_ENABLED = True
+DEFAULT_CLASSIFICATION_RULES = [
+    {"name": "截图文件名", "category": "截图", "media": "image",
+     "filename": r"^((screen[\s_-]?shot|snipaste)([\s_\-\d.(]|$)|屏幕截图|截屏|截图|微信截图|qq截图)"},
+    {"name": "录屏文件名", "category": "截图", "media": "video",
+     "filename": r"^((screen[\s_-]?recording|screenrecord|record_screen)([\s_\-\d.(]|$)|录屏|屏幕录制)"},
+    {"name": "扫描件文件名", "category": "文档", "media": "image",
+     "filename": r"^((scan(ned)?|camscanner)([\s_\-\d.(]|$)|扫描|全能扫描王)"}
+]
+
 DEFAULT_PROMPT = """请分析这张图片，将其归类到以下类别之一：{categories}。
 执行逻辑（按顺序检查）：
 1. 视觉特征检查：
@@ -98,9 +160,20 @@ DEFAULT_VIDEO_PROMPT = """请分析这张图片，将其归类到以下类别之
 DEFAULT_MAX_CONCURRENT = 2
 DEFAULT_VIDEO_FRAME_COUNT = 1
 DEFAULT_VIDEO_FRAME_MODE = "middle"
+# 联系表模式：把多张图片的缩略图拼成一张图一次识别（1 表示关闭）
+DEFAULT_CONTACT_SHEET_SIZE = 1
+DEFAULT_CONTACT_SHEET_TILE_SIZE = 256  # 每个缩略图格子的边长（像素）
 DEFAULT_OPERATION_MODE = "copy"
 DEFAULT_TIME_SOURCE = "earliest"
 DEFAULT_FOLDER_STRUCTURE = "category_time"
+# 任务服务（python -m cli serve）：默认只监听本机，供其他机器提交任务时改为 0.0.0.0 并设置令牌
+DEFAULT_JOB_SERVER_HOST = "127.0.0.1"
+DEFAULT_JOB_SERVER_PORT = 8765
+# 运行检查点：把待处理列表和每个文件的状态保存到数据库，中断后以相同设置再次运行同一目录时
+# 直接从检查点继续，不再扫描源目录
+DEFAULT_CHECKPOINT_ENABLED = True
+# 从检查点继续时也重新扫描源目录，把中断后新增的文件追加到末尾（需要完整扫描，默认关闭）
+DEFAULT_CHECKPOINT_RESCAN = False
 
 
 def load_settings():
@@ -123,6 +196,10 @@ def get_default_settings():
         "api_type": DEFAULT_API_TYPE,
         "ollama_url": DEFAULT_OLLAMA_URL,
         "ollama_model": DEFAULT_OLLAMA_MODEL,
+        "ollama_keep_alive": DEFAULT_OLLAMA_KEEP_ALIVE,
+        "ollama_num_predict": DEFAULT_OLLAMA_NUM_PREDICT,
+        "ollama_num_parallel": DEFAULT_OLLAMA_NUM_PARALLEL,
+        "ollama_urls": list(DEFAULT_OLLAMA_URLS),
         "available_models": DEFAULT_MODELS.copy(),
         "network_api_url": DEFAULT_NETWORK_API_URL,
         "network_api_key": DEFAULT_NETWORK_API_KEY,
@@ -130,13 +207,39 @@ def get_default_settings():
         "network_api_max_concurrent": DEFAULT_NETWORK_API_MAX_CONCURRENT,
         "network_api_model_max_concurrent": DEFAULT_NETWORK_API_MODEL_MAX_CONCURRENT,
         "available_network_models": DEFAULT_NETWORK_API_MODELS.copy(),
+        "network_api_model_limits": dict(DEFAULT_NETWORK_API_MODEL_LIMITS),
         "network_api_round_robin": DEFAULT_NETWORK_API_ROUND_ROBIN,
+        "network_api_routing": DEFAULT_NETWORK_API_ROUTING,
+        "network_batch_size": DEFAULT_NETWORK_BATCH_SIZE,
+        "hedge_enabled": DEFAULT_HEDGE_ENABLED,
+        "hedge_budget_percent": DEFAULT_HEDGE_BUDGET_PERCENT,
+        "network_stream_enabled": DEFAULT_NETWORK_STREAM_ENABLED,
+        "structured_output_enabled": DEFAULT_STRUCTURED_OUTPUT_ENABLED,
+        "cascade_enabled": DEFAULT_CASCADE_ENABLED,
+        "pipeline_enabled": DEFAULT_PIPELINE_ENABLED,
+        "pipeline_io_workers": DEFAULT_PIPELINE_IO_WORKERS,
+        "pipeline_decode_workers": DEFAULT_PIPELINE_DECODE_WORKERS,
+        "scheduling_policy": DEFAULT_SCHEDULING_POLICY,
+        "batch_job_enabled": DEFAULT_BATCH_JOB_ENABLED,
+        "batch_job_backend": DEFAULT_BATCH_JOB_BACKEND,
+        "batch_job_dir": DEFAULT_BATCH_JOB_DIR,
+        "batch_job_shard_size": DEFAULT_BATCH_JOB_SHARD_SIZE,
+        "batch_job_shard_max_mb": DEFAULT_BATCH_JOB_SHARD_MAX_MB,
+        "batch_job_poll_interval": DEFAULT_BATCH_JOB_POLL_INTERVAL,
+        "adaptive_concurrency_enabled": DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED,
+        "adaptive_concurrency_min": DEFAULT_ADAPTIVE_CONCURRENCY_MIN,
+        "adaptive_concurrency_max": DEFAULT_ADAPTIVE_CONCURRENCY_MAX,
+        "async_engine_enabled": DEFAULT_ASYNC_ENGINE_ENABLED,
+        "async_max_in_flight": DEFAULT_ASYNC_MAX_IN_FLIGHT,
         "categories": CATEGORIES.copy(),
+        "rule_engine_enabled": DEFAULT_RULE_ENGINE_ENABLED,
+        "classification_rules": [dict(rule) for rule in DEFAULT_CLASSIFICATION_RULES],
         "prompt": DEFAULT_PROMPT,
         "video_prompt": DEFAULT_VIDEO_PROMPT,
         "max_concurrent": DEFAULT_MAX_CONCURRENT,
         "video_frame_count": DEFAULT_VIDEO_FRAME_COUNT,
         "video_frame_mode": DEFAULT_VIDEO_FRAME_MODE,
+        "contact_sheet_size": DEFAULT_CONTACT_SHEET_SIZE,
         "operation_mode": DEFAULT_OPERATION_MODE,
         "process_images": True,
         "process_videos": True,
@@ -144,6 +247,8 @@ def get_default_settings():
         "video_ai_enabled": True,
         "time_source": DEFAULT_TIME_SOURCE,
         "folder_structure": DEFAULT_FOLDER_STRUCTURE,
+        "checkpoint_enabled": DEFAULT_CHECKPOINT_ENABLED,
+        "checkpoint_rescan": DEFAULT_CHECKPOINT_RESCAN,
         # Rename settings
         "rename_enabled": DEFAULT_RENAME_ENABLED,
         "rename_prompt": DEFAULT_RENAME_PROMPT,
@@ -0,0 +1,280 @@
+import asyncio
+import time
+from typing import Optional, Dict, Any
+from .network_client import NetworkClient
+from .retry_policy import parse_retry_after
+from .streaming import StreamedResponse
+from .output_schema import payload_format_level
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  httpx 启用 HTTP/2 需要 h2 包
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AsyncInferenceEngine:
+    """基于 asyncio 的网络API推理引擎
+
+    单个事件循环即可承载数百个在途请求，不再为每个请求占用一个线程。
+    模型选择、并发槽位、提示词和重试规则均复用 NetworkClient 的实现，
+    与线程池模式保持一致。
+    """
+
+    # 熔断冷却结束不会触发通知，等待时定期重新检查（与 ModelSlotAllocator 相同）
+    RECHECK_INTERVAL = 1.0
+
+    def __init__(self, client: NetworkClient, max_in_flight: int = 200, http2: bool = True):
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("异步推理引擎需要安装 httpx: pip install httpx[http2]")
+        self.client = client
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._http: Optional["httpx.AsyncClient"] = None
+        self._slot_released: Optional[asyncio.Condition] = None
+        self._limit_released: Optional[asyncio.Condition] = None
+
+    async def __aenter__(self) -> "AsyncInferenceEngine":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        limits = httpx.Limits(
+            max_connections=self.max_in_flight,
+            max_keepalive_connections=self.max_in_flight
+        )
+        self._http = httpx.AsyncClient(
+            http2=self.http2,
+            limits=limits,
+            timeout=self.client.request_timeout
+        )
+        self._slot_released = asyncio.Condition()
+        self._limit_released = asyncio.Condition()
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _acquire_model(self, exclude: Optional[set] = None) -> str:
+        """等待直到某个模型有空闲槽位并占用它"""
+        async with self._slot_released:
+            while True:
+                model = self.client.try_acquire_model(exclude)
+                if model is not None:
+                    return model
+                try:
+                    await asyncio.wait_for(self._slot_released.wait(), self.RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release_model(self, model: str) -> None:
+        self.client.release_model(model)
+        async with self._slot_released:
+            # 等待者的排除条件各不相同，全部唤醒各自重新选择
+            self._slot_released.notify_all()
+
+    async def _acquire_limit(self, limiter) -> None:
+        """等待自适应并发上限（与线程池模式共用 AdaptiveConcurrencyLimiter，不阻塞事件循环）"""
+        async with self._limit_released:
+            while not limiter.acquire(timeout=0):
+                try:
+                    await asyncio.wait_for(self._limit_released.wait(), self.RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release_limit(self, limiter, latency: float, outcome: str) -> None:
+        limiter.release(latency, outcome)
+        async with self._limit_released:
+            self._limit_released.notify_all()
+
+    async def _send(self, payload: Dict[str, Any], stop_on_category: bool):
+        """发送请求；启用流式响应时边接收边解析，回答完整后立即关闭连接"""
+        client = self.client
+        if not client.stream_enabled:
+            return await self._http.post(client.url, json=payload, headers=client._build_headers())
+
+        async with self._http.stream(
+            "POST",
+            client.url,
+            json=client.with_stream_options(payload),
+            headers=client._build_headers()
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response
+            accumulator = client.new_stream_accumulator(stop_on_category)
+            async for line in response.aiter_lines():
+                if line and accumulator.feed_line(line):
+                    break
+        client.record_stream(accumulator)
+        return StreamedResponse(
+            response.status_code, response.headers, accumulator.to_result(), accumulator.early_stopped
+        )
+
+    async def _post(self, model: str, payload: Dict[str, Any], stop_on_category: bool = False):
+        """发送一次请求：与线程池模式共用按模型的 RPM/TPM 令牌桶，并记录延迟和结果"""
+        client = self.client
+        wait_time, reserved_tokens = client.rate_limiter.reserve(model)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        limiter = client.concurrency_limiter
+        if limiter is not None:
+            await self._acquire_limit(limiter)
+        used_tokens = None
+        start_time = time.time()
+        success = False
+        cancelled = False
+        # 被取消的请求只释放上限，不调整
+        outcome = "cancelled"
+        try:
+            response = await self._send(payload, stop_on_category)
+            response.format_level = payload_format_level(payload)
+            outcome = client.classify_status(response.status_code)
+            success = response.status_code == 200
+            if success:
+                used_tokens = client.get_usage_tokens(response.json())
+            return response
+        except asyncio.CancelledError:
+            # 被取消的对冲请求不计入延迟统计
+            cancelled = True
+            raise
+        except Exception as e:
+            outcome = client.classify_exception(e)
+            raise
+        finally:
+            latency = time.time() - start_time
+            if not cancelled:
+                client.model_stats.record(model, latency, success)
+            client.rate_limiter.record_usage(model, reserved_tokens, used_tokens)
+            if limiter is not None:
+                await self._release_limit(limiter, latency, outcome)
+
+    async def _post_hedged(
+        self,
+        model: str,
+        base64_image: str,
+        prompt: str,
+        stop_on_category: bool = False,
+        output: Optional[Dict[str, Any]] = None
+    ):
+        """超过该模型 P95 延迟仍未返回时向另一个模型发送对冲请求，先成功者胜出，另一个被取消
+
+        返回 (实际应答的模型, response)，调用方返回后持有应答模型的槽位。
+        """
+        client = self.client
+        payload = client._build_payload(model, base64_image, prompt, output)
+        client.hedge_budget.record_request()
+        delay = client.get_hedge_delay(model)
+        if delay is None:
+            return model, await self._post(model, payload, stop_on_category)
+
+        primary = asyncio.ensure_future(self._post(model, payload, stop_on_category))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        hedge_model = None if done else client.try_acquire_hedge_model(model)
+        if hedge_model is None:
+            return model, await primary
+
+        print(f"模型 {model} 超过 P95 延迟 {delay:.1f} 秒未返回，向模型 {hedge_model} 发送对冲请求")
+        hedge = asyncio.ensure_future(
+            self._post(hedge_model, client._build_payload(hedge_model, base64_image, prompt, output), stop_on_category)
+        )
+        owners = {primary: model, hedge: hedge_model}
+        winner = None
+        pending = set(owners)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code == 200:
+                        winner = task
+                        break
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        finally:
+            # 两个请求都失败时按原请求的结果处理；落后的请求直接取消
+            winner = winner or primary
+            for task, owner in owners.items():
+                if task is not winner:
+                    task.cancel()
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                    await self._release_model(owner)
+        if winner is hedge:
+            client.hedge_budget.record_win()
+            print(f"对冲请求先返回 (模型: {hedge_model})")
+        return owners[winner], await winner
+
+    async def analyze_image(
+        self,
+        base64_image: str,
+        is_video: bool = False,
+        structured_output_prompt: str = "",
+        rename_prompt: str = None,
+        constrained_output: bool = True
+    ) -> Dict[str, Any]:
+        client = self.client
+        if not client.api_key:
+            return {
+                "success": False,
+                "error": "API Key 未设置"
+            }
+
+        max_attempts = client.retry_count + 1 if client.retry_enabled else 1
+        current_model = await self._acquire_model()
+        print(f"网络API异步请求 (总次数: {client.total_request_count}) 使用模型: {current_model}")
+
+        try:
+            prompt = client._build_prompt(is_video, structured_output_prompt, rename_prompt)
+            output = client.output_constraints(bool(rename_prompt), constrained=constrained_output)
+            for attempt in range(max_attempts):
+                retry_after = None
+                try:
+                    current_model, response = await self._post_hedged(
+                        current_model, base64_image, prompt, not rename_prompt, output
+                    )
+                    if output and client._relax_output_constraints(current_model, response):
+                        current_model, response = await self._post_hedged(
+                            current_model, base64_image, prompt, not rename_prompt, output
+                        )
+
+                    if response.status_code == 200:
+                        client.record_success(current_model)
+                        return client._parse_response(response.json(), current_model)
+                    error_msg = f"HTTP {response.status_code}: {response.text}"
+                    error_info = {
+                        "status_code": response.status_code,
+                        "error_type": client.classify_status(response.status_code)
+                    }
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                except Exception as e:
+                    error_msg = str(e) or type(e).__name__
+                    error_info = {"error_type": client.classify_exception(e)}
+
+                delay = client.plan_retry(current_model, attempt, max_attempts, error_info["error_type"], retry_after)
+                if delay is None:
+                    return {
+                        "success": False,
+                        "error": error_msg,
+                        **error_info
+                    }
+                print(f"尝试 {attempt + 1}/{max_attempts} 失败 ({error_info['error_type']}): {error_msg}")
+                print(f"等待 {delay:.1f} 秒后重试...")
+                # 等待期间释放模型槽位，重试时优先换一个模型
+                failed_model, current_model = current_model, None
+                await self._release_model(failed_model)
+                await asyncio.sleep(delay)
+                current_model = await self._acquire_model(exclude={failed_model})
+        finally:
+            if current_model:
+                await self._release_model(current_model)
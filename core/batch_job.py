@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from .network_client import NetworkClient
+
+# 分片状态：prepared（已写出 JSONL）→ submitted（已提交）→ downloaded（已下载结果）→ ingested（已入库并移动文件）
+SHARD_PREPARED = "prepared"
+SHARD_SUBMITTED = "submitted"
+SHARD_DOWNLOADED = "downloaded"
+SHARD_INGESTED = "ingested"
+SHARD_FAILED = "failed"
+
+# Batch API 中表示任务已结束的状态
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+STATE_FILE = "state.json"
+
+
+def job_dir_for(base_dir: str, source_dir: str, target_dir: str) -> str:
+    """同一对源目录/目标目录使用同一个任务目录，再次运行时从上次的进度继续"""
+    key = f"{os.path.abspath(source_dir)}|{os.path.abspath(target_dir)}"
+    return os.path.join(base_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:12])
+
+
+def _write_json(path: str, data: Any) -> None:
+    """先写临时文件再替换，中途退出时不会留下不完整的状态文件"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+class OpenAIBatchBackend:
+    """OpenAI 兼容的 Batch API：上传 JSONL 文件、创建批处理任务、查询状态、下载结果"""
+
+    name = "openai"
+
+    def __init__(self, client: NetworkClient, completion_window: str = "24h"):
+        self.client = client
+        self.completion_window = completion_window
+        url = client.url
+        suffix = "/chat/completions"
+        self.base_url = url[:-len(suffix)] if url.endswith(suffix) else url.rstrip("/")
+        # 批处理中每行请求的 url 字段是接口路径，例如 /v1/chat/completions
+        self.endpoint = urlparse(url).path or "/v1/chat/completions"
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.client.api_key}"}
+
+    def _check(self, response, action: str) -> Dict[str, Any]:
+        if response.status_code != 200:
+            raise RuntimeError(f"{action}失败: HTTP {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def request_url(self) -> str:
+        return self.endpoint
+
+    def submit(self, shard_path: str) -> str:
+        with open(shard_path, "rb") as f:
+            response = self.client.session.post(
+                f"{self.base_url}/files",
+                headers=self._headers(),
+                data={"purpose": "batch"},
+                files={"file": (os.path.basename(shard_path), f, "application/jsonl")},
+                timeout=600
+            )
+        input_file_id = self._check(response, "上传请求文件")["id"]
+        response = self.client.session.post(
+            f"{self.base_url}/batches",
+            headers=self._headers(),
+            json={
+                "input_file_id": input_file_id,
+                "endpoint": self.endpoint,
+                "completion_window": self.completion_window
+            },
+            timeout=60
+        )
+        return self._check(response, "创建批处理任务")["id"]
+
+    def poll(self, batch_id: str) -> Dict[str, Any]:
+        response = self.client.session.get(f"{self.base_url}/batches/{batch_id}", headers=self._headers(), timeout=60)
+        return self._check(response, "查询批处理任务")
+
+    def download(self, batch: Dict[str, Any], output_path: str) -> None:
+        """下载结果文件（以及失败请求的错误文件）合并写入 output_path"""
+        temp_path = output_path + ".tmp"
+        with open(temp_path, "wb") as out:
+            for key in ("output_file_id", "error_file_id"):
+                file_id = batch.get(key)
+                if not file_id:
+                    continue
+                response = self.client.session.get(
+                    f"{self.base_url}/files/{file_id}/content", headers=self._headers(), timeout=600
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"下载结果文件失败: HTTP {response.status_code}")
+                out.write(response.content)
+                if response.content and not response.content.endswith(b"\n"):
+                    out.write(b"\n")
+        os.replace(temp_path, output_path)
+
+
+class LocalBatchBackend:
+    """本地替代实现：逐行发送同步请求（含重试和换模型），按 Batch API 的输出格式写出结果
+
+    用于不支持 Batch API 的服务或测试。查询状态时执行尚未完成的请求，已写出结果的请求不会重复发送。
+    """
+
+    name = "local"
+
+    def __init__(self, client: NetworkClient, max_workers: int = 2):
+        self.client = client
+        self.max_workers = max(1, max_workers)
+
+    def request_url(self) -> str:
+        return urlparse(self.client.url).path or "/v1/chat/completions"
+
+    def submit(self, shard_path: str) -> str:
+        return os.path.abspath(shard_path)
+
+    def _output_path(self, batch_id: str) -> str:
+        return batch_id + ".local_output.jsonl"
+
+    def _run_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        body = request["body"]
+        result = self.client._request(lambda model: {**body, "model": model}, lambda response_json, model: response_json)
+        if result.get("success") is False:
+            return {"custom_id": request["custom_id"], "response": None, "error": {"message": result.get("error")}}
+        return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": result}, "error": None}
+
+    def poll(self, batch_id: str) -> Dict[str, Any]:
+        output_path = self._output_path(batch_id)
+        done = set()
+        if os.path.exists(output_path):
+            with open(output_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)["custom_id"])
+                    except (ValueError, KeyError):
+                        continue
+        with open(batch_id, "r", encoding="utf-8") as f:
+            pending = [request for request in map(json.loads, f) if request["custom_id"] not in done]
+        with open(output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for line in executor.map(self._run_request, pending):
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                out.flush()
+        return {"id": batch_id, "status": "completed", "output_file_id": output_path}
+
+    def download(self, batch: Dict[str, Any], output_path: str) -> None:
+        shutil.copyfile(batch["output_file_id"], output_path)
+
+
+class BatchJob:
+    """离线批处理任务：准备 → 提交 → 轮询 → 入库，每个阶段都可以单独中断和继续
+
+    任务目录中保存：
+    - shard_NNNNN.jsonl：请求文件，每行 {"custom_id", "method", "url", "body"}
+    - shard_NNNNN.files.json：custom_id 对应的文件路径
+    - shard_NNNNN.results.jsonl：下载的结果文件
+    - state.json：各分片的状态和批处理任务ID
+    分片写完后才登记到状态文件，中途退出时未写完的分片会重新生成。
+    """
+
+    def __init__(
+        self,
+        job_dir: str,
+        classifier,
+        target_dir: str,
+        backend,
+        shard_size: int = 500,
+        log: Callable[[str], None] = print,
+        shard_max_bytes: int = 150 * 1024 * 1024
+    ):
+        self.job_dir = job_dir
+        self.classifier = classifier
+        self.target_dir = target_dir
+        self.backend = backend
+        self.shard_size = max(1, shard_size)
+        # 请求中带有 base64 图片，按请求数分片可能超过 Batch API 对单个输入文件的大小限制
+        self.shard_max_bytes = max(1, shard_max_bytes)
+        self.log = log
+        os.makedirs(job_dir, exist_ok=True)
+        self.state_path = os.path.join(job_dir, STATE_FILE)
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        else:
+            self.state = {"backend": backend.name, "shards": []}
+
+    def _save_state(self) -> None:
+        _write_json(self.state_path, self.state)
+
+    def _path(self, shard: Dict[str, Any], suffix: str) -> str:
+        return os.path.join(self.job_dir, shard["name"] + suffix)
+
+    def _load_files(self, shard: Dict[str, Any]) -> Dict[str, str]:
+        with open(self._path(shard, ".files.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def shards(self, status: str) -> List[Dict[str, Any]]:
+        return [shard for shard in self.state["shards"] if shard["status"] == status]
+
+    def pending_files(self) -> set:
+        """已写入尚未入库的分片中的文件"""
+        files = set()
+        for shard in self.state["shards"]:
+            if shard["status"] not in (SHARD_INGESTED, SHARD_FAILED):
+                files.update(self._load_files(shard).values())
+        return files
+
+    def prepare(
+        self,
+        file_paths: List[str],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """把尚未在任何分片中的文件准备好（解码、缩放）并写入新的分片，返回写入的请求数
+
+        命中预分类规则或准备失败的文件不写入分片，结果直接交给 on_result。
+        """
+        pending = self.pending_files()
+        request_url = self.backend.request_url()
+        written = 0
+        shard = None
+        out = None
+        shard_bytes = 0
+        files: Dict[str, str] = {}
+
+        def close_shard() -> None:
+            out.close()
+            os.replace(self._path(shard, ".jsonl.tmp"), self._path(shard, ".jsonl"))
+            _write_json(self._path(shard, ".files.json"), files)
+            shard["count"] = len(files)
+            self.state["shards"].append(shard)
+            self._save_state()
+            self.log(f"批处理分片已写出: {shard['name']}（{len(files)} 个请求）")
+
+        for file_path in file_paths:
+            if should_stop and should_stop():
+                break
+            if file_path in pending:
+                continue
+            try:
+                prepared = self.classifier.prepare_file(file_path)
+            except Exception as e:
+                prepared = {"success": False, "file_path": file_path, "error": str(e)}
+            if prepared["success"] and prepared.get("rule_response") is not None:
+                result = self.classifier.finalize_file(file_path, self.target_dir, prepared["rule_response"])
+            elif prepared["success"]:
+                body = self.classifier.build_batch_request(prepared)
+                line = None
+                if out is not None:
+                    line = self._request_line(f"{shard['name']}-{len(files)}", request_url, body)
+                    if shard_bytes + len(line.encode("utf-8")) > self.shard_max_bytes:
+                        close_shard()
+                        out = None
+                if out is None:
+                    shard = {"name": f"shard_{len(self.state['shards']) + 1:05d}", "status": SHARD_PREPARED,
+                             "batch_id": None, "count": 0}
+                    out = open(self._path(shard, ".jsonl.tmp"), "w", encoding="utf-8")
+                    files = {}
+                    shard_bytes = 0
+                    line = self._request_line(f"{shard['name']}-0", request_url, body)
+                out.write(line)
+                shard_bytes += len(line.encode("utf-8"))
+                files[f"{shard['name']}-{len(files)}"] = file_path
+                written += 1
+                if len(files) >= self.shard_size:
+                    close_shard()
+                    out = None
+                continue
+            else:
+                result = {"success": False, "file_path": file_path, "category": None,
+                          "error": prepared["error"], "ai_result": None}
+            if on_result:
+                on_result(result)
+
+        if out is not None:
+            if files and not (should_stop and should_stop()):
+                close_shard()
+            else:
+                # 停止时丢弃未写完的分片，下次运行重新准备这些文件
+                out.close()
+                os.remove(self._path(shard, ".jsonl.tmp"))
+        return written
+
+    @staticmethod
+    def _request_line(custom_id: str, request_url: str, body: Dict[str, Any]) -> str:
+        request = {"custom_id": custom_id, "method": "POST", "url": request_url, "body": body}
+        return json.dumps(request, ensure_ascii=False) + "\n"
+
+    def submit(self, should_stop: Optional[Callable[[], bool]] = None) -> None:
+        for shard in self.shards(SHARD_PREPARED):
+            if should_stop and should_stop():
+                return
+            shard["batch_id"] = self.backend.submit(self._path(shard, ".jsonl"))
+            shard["status"] = SHARD_SUBMITTED
+            shard["submitted_at"] = time.time()
+            self._save_state()
+            self.log(f"批处理分片已提交: {shard['name']} -> {shard['batch_id']}")
+
+    def poll(self) -> bool:
+        """查询已提交的分片，结束的下载结果；返回是否还有未结束的分片"""
+        for shard in self.shards(SHARD_SUBMITTED):
+            batch = self.backend.poll(shard["batch_id"])
+            status = batch.get("status")
+            if status not in BATCH_TERMINAL_STATUSES:
+                counts = batch.get("request_counts") or {}
+                self.log(f"批处理分片 {shard['name']}: {status}"
+                         f"（完成 {counts.get('completed', 0)}/{counts.get('total', shard['count'])}）")
+                continue
+            if batch.get("output_file_id") or batch.get("error_file_id"):
+                # 过期或取消的任务也可能有部分结果，没有结果的文件下次运行重新处理
+                self.backend.download(batch, self._path(shard, ".results.jsonl"))
+                shard["status"] = SHARD_DOWNLOADED
+            else:
+                shard["status"] = SHARD_FAILED
+            shard["batch_status"] = status
+            self._save_state()
+            self.log(f"批处理分片 {shard['name']} 已结束: {status}")
+        return bool(self.shards(SHARD_SUBMITTED))
+
+    def _parse_result_line(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        response = line.get("response") or {}
+        if response.get("status_code") == 200 and response.get("body"):
+            return self.classifier.network.parse_response_body(response["body"])
+        error = line.get("error") or (response.get("body") or {}).get("error") or {}
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        return {"success": False, "error": message or f"HTTP {response.get('status_code')}"}
+
+    def ingest(
+        self,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> None:
+        """把已下载的结果写入数据库并移动文件；已入库的文件跳过，可以重复执行"""
+        for shard in self.shards(SHARD_DOWNLOADED):
+            files = self._load_files(shard)
+            answered = set()
+            with open(self._path(shard, ".results.jsonl"), "r", encoding="utf-8") as f:
+                for raw_line in f:
+                    if should_stop and should_stop():
+                        return
+                    try:
+                        line = json.loads(raw_line)
+                    except ValueError:
+                        continue
+                    file_path = files.get(line.get("custom_id"))
+                    if file_path is None:
+                        continue
+                    answered.add(file_path)
+                    if self.classifier.db.is_file_processed(file_path):
+                        # 上次入库中断前已处理，仍然报告，使进度计数与总数一致
+                        if on_result:
+                            on_result({"success": True, "skipped": True, "file_path": file_path, "category": None,
+                                       "error": None, "ai_result": None})
+                        continue
+                    result = self.classifier.finalize_file(file_path, self.target_dir, self._parse_result_line(line))
+                    if on_result:
+                        on_result(result)
+            for file_path in files.values():
+                if file_path not in answered and on_result:
+                    on_result({"success": False, "file_path": file_path, "category": None,
+                               "error": "批处理结果中没有该文件", "ai_result": None})
+            shard["status"] = SHARD_INGESTED
+            self._save_state()
+            self.log(f"批处理分片 {shard['name']} 已入库")
+
+    def run(
+        self,
+        file_paths: List[str],
+        poll_interval: float = 60,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> None:
+        """依次执行尚未完成的阶段，等待所有分片结束后入库"""
+        written = self.prepare(file_paths, on_result, should_stop)
+        if written:
+            self.log(f"写入 {written} 个批处理请求")
+        self.submit(should_stop)
+        while not (should_stop and should_stop()) and self.poll():
+            deadline = time.time() + poll_interval
+            while time.time() < deadline and not (should_stop and should_stop()):
+                time.sleep(1)
+        self.ingest(on_result, should_stop)
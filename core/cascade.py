@@ -0,0 +1,84 @@
+import threading
+from typing import Optional, Dict, Any
+
+from .response_parser import CONFIDENCE_HIGH
+
+
+def needs_escalation(response: Optional[Dict[str, Any]], fallback_category: str) -> bool:
+    """第一级结果是否需要升级到网络模型：失败、不是可信的JSON结果，或落入兜底类别"""
+    if not response or not response.get("success"):
+        return True
+    if response.get("confidence") != CONFIDENCE_HIGH:
+        return True
+    return response.get("category") == fallback_category
+
+
+class CascadeStats:
+    """两级识别（本地小模型 → 网络模型）的统计
+
+    记录第一级的识别数、被接受数和耗时，以及升级到网络模型的请求耗时和token消耗，
+    用升级请求的平均延迟/token数估算第一级接受的结果节省的时间和费用。
+    """
+
+    def __init__(self):
+        self.local_requests = 0
+        self.local_accepted = 0
+        self.local_seconds = 0.0
+        self.remote_requests = 0
+        self.remote_seconds = 0.0
+        self.remote_tokens = 0
+        self.remote_token_samples = 0
+        self._lock = threading.Lock()
+
+    def record_local(self, elapsed: float, accepted: bool) -> None:
+        with self._lock:
+            self.local_requests += 1
+            self.local_seconds += elapsed
+            if accepted:
+                self.local_accepted += 1
+
+    def record_remote(self, elapsed: float, usage_tokens: Optional[int] = None) -> None:
+        with self._lock:
+            self.remote_requests += 1
+            self.remote_seconds += elapsed
+            if usage_tokens:
+                self.remote_tokens += usage_tokens
+                self.remote_token_samples += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            escalated = self.local_requests - self.local_accepted
+            avg_remote_seconds = self.remote_seconds / self.remote_requests if self.remote_requests else None
+            avg_remote_tokens = (
+                self.remote_tokens / self.remote_token_samples if self.remote_token_samples else None
+            )
+            saved_seconds = None
+            if avg_remote_seconds is not None:
+                # 第一级对升级的文件也花了时间，一并扣除
+                saved_seconds = self.local_accepted * avg_remote_seconds - self.local_seconds
+            return {
+                "local_requests": self.local_requests,
+                "local_accepted": self.local_accepted,
+                "escalated": escalated,
+                "escalation_rate": escalated / self.local_requests if self.local_requests else 0.0,
+                "avg_local_seconds": self.local_seconds / self.local_requests if self.local_requests else None,
+                "avg_remote_seconds": avg_remote_seconds,
+                "saved_seconds": saved_seconds,
+                "saved_tokens": self.local_accepted * avg_remote_tokens if avg_remote_tokens is not None else None
+            }
+
+    def format_stats(self) -> str:
+        stats = self.get_stats()
+        text = (
+            f"本地识别 {stats['local_requests']} 个，接受 {stats['local_accepted']} 个，"
+            f"升级到网络模型 {stats['escalated']} 个（{stats['escalation_rate'] * 100:.1f}%）"
+        )
+        if stats["avg_local_seconds"] is not None:
+            text += f"，本地平均 {stats['avg_local_seconds']:.1f} 秒"
+        if stats["avg_remote_seconds"] is not None:
+            text += f"，网络平均 {stats['avg_remote_seconds']:.1f} 秒"
+        if stats["saved_seconds"] is not None:
+            text += f"，估计节省请求耗时 {stats['saved_seconds']:.1f} 秒"
+        if stats["saved_tokens"] is not None:
+            text += f"、约 {stats['saved_tokens']:.0f} tokens"
+        return text
@@ -0,0 +1,215 @@
+import os
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from .database import (
+    Database, FILE_PENDING, FILE_IN_FLIGHT, FILE_DONE, FILE_FAILED
+)
+
+
+# 文件系统时间戳的精度（FAT 等为 2 秒），比较写出时间时留出的余量
+TIMESTAMP_SLACK_NS = 2_000_000_000
+
+
+def written_file_key(file_path: str, size: int, mtime_ns: int) -> Tuple[int, int, str]:
+    """匹配已写出文件的键：(文件大小, 修改时间, 小写扩展名)，重命名时扩展名不变"""
+    return size, mtime_ns, os.path.splitext(file_path)[1].lower()
+
+
+def find_written_files(target_dir: str, wanted: Dict[Tuple[int, int, str], str], since_ns: int) -> Dict[str, str]:
+    """在目标目录中查找 since_ns 之后写出的文件，返回 源路径 -> 目标路径
+
+    移动和复制（copy2）都会保留修改时间，按 written_file_key 匹配，重命名后文件名改变也能找到。
+    写入文件会更新所在目录的修改时间、移动或复制会更新文件的 ctime，所以只检查此后修改过的目录中
+    ctime 不早于 since_ns 的文件：目录仍要遍历，但不需要对整个目标目录的每个文件调用 stat，
+    中断前就已存在的同大小、同修改时间的文件也不会被误认。
+    """
+    found = {}
+    if not wanted or not os.path.isdir(target_dir):
+        return found
+    directories = [target_dir]
+    while directories:
+        directory = directories.pop()
+        try:
+            changed = os.stat(directory).st_mtime_ns >= since_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                    continue
+                if not changed or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.st_ctime_ns < since_ns:
+                continue
+            src_path = wanted.get(written_file_key(entry.path, stat.st_size, stat.st_mtime_ns))
+            if src_path is not None and src_path not in found:
+                found[src_path] = entry.path
+                if len(found) == len(wanted):
+                    return found
+    return found
+
+
+class RunCheckpoint:
+    """把一次运行的待处理列表和每个文件的状态保存到数据库，中断后从检查点继续
+
+    开始处理的文件立即标记为 in_flight（同时记录大小、修改时间和开始时间）；完成和失败的状态先缓存，
+    每 flush_every 个或每 flush_interval 秒批量写入。缓存中的状态在崩溃时丢失也没有关系：
+    恢复时 in_flight 的文件会按处理记录和目标目录中已写出的文件重新核对。
+    """
+
+    def __init__(self, db: Database, run_id: int, flush_every: int = 50, flush_interval: float = 2.0):
+        self.db = db
+        self.run_id = run_id
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending: List[str] = []
+        self.reconciled: Dict[str, int] = {}
+        self._updates: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls,
+        db: Database,
+        source_dir: str,
+        target_dir: str,
+        file_paths: List[str],
+        settings_key: str = ""
+    ) -> "RunCheckpoint":
+        checkpoint = cls(db, db.create_run(source_dir, target_dir, file_paths, settings_key))
+        checkpoint.pending = list(file_paths)
+        return checkpoint
+
+    @classmethod
+    def resume(
+        cls,
+        db: Database,
+        source_dir: str,
+        target_dir: str,
+        operation_mode: str,
+        settings_key: str = ""
+    ) -> Optional["RunCheckpoint"]:
+        """加载同一目录、相同设置未完成的运行并核对中断时正在处理的文件，没有时返回None"""
+        run = db.get_open_run(source_dir, target_dir, settings_key)
+        if run is None:
+            return None
+        checkpoint = cls(db, run["id"])
+        checkpoint._reconcile(target_dir, operation_mode)
+        return checkpoint
+
+    def _reconcile(self, target_dir: str, operation_mode: str) -> None:
+        rows = self.db.get_run_files(self.run_id, [FILE_PENDING, FILE_IN_FLIGHT])
+        processed = self.db.get_processed_paths([row["file_path"] for row in rows])
+        updates = []
+        wanted = {}
+        since_ns = None
+        requeued = set()
+        for row in rows:
+            file_path = row["file_path"]
+            in_flight = row["state"] == FILE_IN_FLIGHT
+            if file_path in processed:
+                # 移动/复制和入库都已完成，只是状态没来得及写入
+                updates.append((file_path, FILE_DONE, None, None))
+            elif in_flight and row["file_size"] is not None and (
+                operation_mode == "copy" or not os.path.exists(file_path)
+            ):
+                # 文件可能已写到目标目录但还没有入库
+                wanted[written_file_key(file_path, row["file_size"], row["file_mtime_ns"])] = file_path
+                started_ns = row["started_ns"] or 0
+                since_ns = started_ns if since_ns is None else min(since_ns, started_ns)
+            elif os.path.exists(file_path):
+                requeued.add(file_path)
+            else:
+                updates.append((file_path, FILE_FAILED, None, "源文件已不存在"))
+
+        found = find_written_files(target_dir, wanted, max(0, (since_ns or 0) - TIMESTAMP_SLACK_NS))
+        for file_path in wanted.values():
+            if file_path in found:
+                updates.append((file_path, FILE_DONE, found[file_path], None))
+                if os.path.exists(file_path):
+                    # 复制模式下源文件还在，补上处理记录，之后的扫描不再重复复制
+                    self.db.add_processed_file(file_path, None, "")
+            elif os.path.exists(file_path):
+                requeued.add(file_path)
+            else:
+                updates.append((file_path, FILE_FAILED, None, "源文件已不存在"))
+
+        if updates or requeued:
+            self.db.update_run_files(
+                self.run_id,
+                updates + [(file_path, FILE_PENDING, None, None) for file_path in requeued]
+            )
+        self.pending = [row["file_path"] for row in rows if row["file_path"] in requeued]
+        self.reconciled = {
+            "in_flight": sum(1 for row in rows if row["state"] == FILE_IN_FLIGHT),
+            "written": len(found),
+            "recorded": sum(1 for update in updates if update[1] == FILE_DONE) - len(found),
+            "missing": sum(1 for update in updates if update[1] == FILE_FAILED)
+        }
+
+    def merge(self, file_paths: List[str]) -> List[str]:
+        """把重新扫描得到的、运行中还没有的文件追加到待处理列表末尾，返回新增的文件"""
+        known = self.db.get_run_file_paths(self.run_id)
+        added = [file_path for file_path in file_paths if file_path not in known]
+        if added:
+            self.db.add_run_files(self.run_id, added)
+            self.pending.extend(added)
+        return added
+
+    def started(self, file_paths: List[str]) -> None:
+        """文件开始处理前调用（立即写入）"""
+        started_ns = time.time_ns()
+        entries = []
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+                entries.append((file_path, stat.st_size, stat.st_mtime_ns, started_ns))
+            except OSError:
+                entries.append((file_path, None, None, started_ns))
+        self.db.mark_run_files_in_flight(self.run_id, entries)
+
+    def finished(self, result: Dict[str, Any]) -> None:
+        """文件处理完成或失败时调用（批量写入）"""
+        if result["success"]:
+            update = (result["file_path"], FILE_DONE, result.get("moved_to"), None)
+        else:
+            update = (result["file_path"], FILE_FAILED, None, result.get("error"))
+        with self._lock:
+            self._updates.append(update)
+            due = len(self._updates) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            updates, self._updates = self._updates, []
+            self._last_flush = time.monotonic()
+        if updates:
+            self.db.update_run_files(self.run_id, updates)
+
+    def counts(self) -> Dict[str, int]:
+        self.flush()
+        return self.db.get_run_counts(self.run_id)
+
+    def complete(self) -> bool:
+        """没有未处理的文件时结束本次运行，返回是否已结束"""
+        counts = self.counts()
+        if counts.get(FILE_PENDING, 0) or counts.get(FILE_IN_FLIGHT, 0):
+            return False
+        self.db.finish_run(self.run_id)
+        return True
+
+    def format_counts(self) -> str:
+        counts = self.counts()
+        return (
+            f"完成 {counts.get(FILE_DONE, 0)}，失败 {counts.get(FILE_FAILED, 0)}，"
+            f"未处理 {counts.get(FILE_PENDING, 0) + counts.get(FILE_IN_FLIGHT, 0)}"
+        )
@@ -1,12 +1,16 @@
 import os
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from .file_scanner import FileScanner
 from .image_processor import ImageProcessor
 from .ollama_client import OllamaClient
 from .network_client import NetworkClient
 from .file_mover import FileMover
 from .database import Database
+from .response_parser import get_response_parser
+from .cascade import CascadeStats, needs_escalation
+from .rule_engine import RuleEngine
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import (
@@ -14,7 +18,14 @@ from config import (
     DEFAULT_OPERATION_MODE, DEFAULT_VIDEO_FRAME_COUNT,
     DEFAULT_TIME_SOURCE, DEFAULT_FOLDER_STRUCTURE,
     DEFAULT_VIDEO_FRAME_MODE,
-    DEFAULT_NETWORK_API_URL, DEFAULT_NETWORK_API_KEY, DEFAULT_NETWORK_API_MODEL
+    DEFAULT_NETWORK_API_URL, DEFAULT_NETWORK_API_KEY, DEFAULT_NETWORK_API_MODEL,
+    DEFAULT_MAX_CONCURRENT, DEFAULT_NETWORK_API_MAX_CONCURRENT,
+    DEFAULT_ADAPTIVE_CONCURRENCY_MIN, DEFAULT_ADAPTIVE_CONCURRENCY_MAX,
+    DEFAULT_NETWORK_API_ROUTING, DEFAULT_HEDGE_ENABLED, DEFAULT_HEDGE_BUDGET_PERCENT,
+    DEFAULT_NETWORK_BATCH_SIZE, DEFAULT_CONTACT_SHEET_SIZE, DEFAULT_NETWORK_STREAM_ENABLED,
+    DEFAULT_STRUCTURED_OUTPUT_ENABLED, DEFAULT_CASCADE_ENABLED,
+    DEFAULT_RULE_ENGINE_ENABLED, DEFAULT_CLASSIFICATION_RULES,
+    DEFAULT_OLLAMA_KEEP_ALIVE, DEFAULT_OLLAMA_NUM_PREDICT
 )
 
 
@@ -24,12 +35,33 @@ class MediaClassifier:
         api_type: str = DEFAULT_API_TYPE,
         ollama_url: str = DEFAULT_OLLAMA_URL,
         ollama_model: str = DEFAULT_OLLAMA_MODEL,
+        ollama_keep_alive: str = DEFAULT_OLLAMA_KEEP_ALIVE,
+        ollama_num_predict: int = DEFAULT_OLLAMA_NUM_PREDICT,
+        ollama_urls: List[str] = None,
         network_api_url: str = DEFAULT_NETWORK_API_URL,
         network_api_key: str = DEFAULT_NETWORK_API_KEY,
         network_api_model: str = DEFAULT_NETWORK_API_MODEL,
         network_api_models: List[str] = None,
         network_api_round_robin: bool = True,
+        network_api_routing: str = DEFAULT_NETWORK_API_ROUTING,
+        hedge_enabled: bool = DEFAULT_HEDGE_ENABLED,
+        hedge_budget_percent: float = DEFAULT_HEDGE_BUDGET_PERCENT,
+        network_stream_enabled: bool = DEFAULT_NETWORK_STREAM_ENABLED,
+        structured_output_enabled: bool = DEFAULT_STRUCTURED_OUTPUT_ENABLED,
+        cascade_enabled: bool = DEFAULT_CASCADE_ENABLED,
+        rule_engine_enabled: bool = DEFAULT_RULE_ENGINE_ENABLED,
+        classification_rules: List[Dict[str, Any]] = None,
         network_api_model_max_concurrent: int = 2,
+        network_api_max_concurrent: int = DEFAULT_NETWORK_API_MAX_CONCURRENT,
+        network_api_model_limits: Dict[str, Dict[str, Any]] = None,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        # Batched request settings (network API only)
+        network_batch_size: int = DEFAULT_NETWORK_BATCH_SIZE,
+        contact_sheet_size: int = DEFAULT_CONTACT_SHEET_SIZE,
+        # Adaptive concurrency settings
+        adaptive_concurrency_enabled: bool = False,
+        adaptive_concurrency_min: int = DEFAULT_ADAPTIVE_CONCURRENCY_MIN,
+        adaptive_concurrency_max: int = DEFAULT_ADAPTIVE_CONCURRENCY_MAX,
         categories: List[str] = None,
         prompt_template: str = None,
         video_prompt_template: str = None,
@@ -63,7 +95,12 @@ class MediaClassifier:
             url=ollama_url,
             model=ollama_model,
             categories=categories,
-            prompt_template=prompt_template
+            prompt_template=prompt_template,
+            pool_size=max_concurrent,
+            video_prompt_template=video_prompt_template,
+            keep_alive=ollama_keep_alive,
+            num_predict=ollama_num_predict,
+            urls=ollama_urls
         )
         
         self.network = NetworkClient(
@@ -81,18 +118,47 @@ class MediaClassifier:
             request_timeout=request_timeout,
             # Round robin settings
             round_robin=network_api_round_robin,
+            routing=network_api_routing,
+            hedge_enabled=hedge_enabled,
+            hedge_budget_percent=hedge_budget_percent,
+            stream_enabled=network_stream_enabled,
+            structured_output_enabled=structured_output_enabled,
             # Model concurrency settings
-            model_max_concurrent=network_api_model_max_concurrent
+            model_max_concurrent=network_api_model_max_concurrent,
+            # Connection pool settings
+            pool_size=network_api_max_concurrent,
+            # Per-model RPM/TPM budgets
+            model_limits=network_api_model_limits
         )
+        if adaptive_concurrency_enabled:
+            self.network.enable_adaptive_concurrency(
+                initial_limit=network_api_max_concurrent,
+                min_limit=adaptive_concurrency_min,
+                max_limit=adaptive_concurrency_max
+            )
         
         self.api_type = api_type
         self.ollama_url = ollama_url
+        self.ollama_urls = list(ollama_urls or [])
         self.ollama_model = ollama_model
         self.network_api_url = network_api_url
         self.network_api_key = network_api_key
         self.network_api_model = network_api_model
         self.categories = categories or CATEGORIES
         
+        # Cascade settings: Ollama first, escalate to the network API
+        self.cascade_enabled = cascade_enabled
+        self.cascade_stats = CascadeStats()
+        
+        # Rule-based pre-classification (before decoding)
+        self.rule_engine_enabled = rule_engine_enabled
+        self.classification_rules = classification_rules if classification_rules is not None else DEFAULT_CLASSIFICATION_RULES
+        self.rule_engine = self._build_rule_engine()
+        
+        # Batched request settings
+        self.network_batch_size = network_batch_size
+        self.contact_sheet_size = contact_sheet_size
+        
         # Rename settings
         self.rename_enabled = rename_enabled
         self.rename_prompt = rename_prompt
@@ -104,6 +170,8 @@ class MediaClassifier:
         # Structured output prompts
         self.image_structured_output_prompt = image_structured_output_prompt or ""
         self.video_structured_output_prompt = video_structured_output_prompt or ""
+        self._prompt_variants: Dict[Tuple[bool, bool], Tuple[str, Optional[str]]] = {}
+        self._build_prompt_variants()
         
         # Network retry and error export settings
         self.retry_enabled = retry_enabled
@@ -125,12 +193,28 @@ class MediaClassifier:
         api_type: str = None,
         ollama_url: str = None,
         ollama_model: str = None,
+        ollama_keep_alive: str = None,
+        ollama_num_predict: int = None,
+        ollama_urls: List[str] = None,
         network_api_url: str = None,
         network_api_key: str = None,
         network_api_model: str = None,
         network_api_models: List[str] = None,
         network_api_round_robin: bool = None,
+        network_api_routing: str = None,
+        hedge_enabled: bool = None,
+        hedge_budget_percent: float = None,
+        network_stream_enabled: bool = None,
+        structured_output_enabled: bool = None,
+        cascade_enabled: bool = None,
+        rule_engine_enabled: bool = None,
+        classification_rules: List[Dict[str, Any]] = None,
         network_api_model_max_concurrent: int = None,
+        network_api_max_concurrent: int = None,
+        network_api_model_limits: Dict[str, Dict[str, Any]] = None,
+        max_concurrent: int = None,
+        network_batch_size: int = None,
+        contact_sheet_size: int = None,
         categories: List[str] = None,
         prompt_template: str = None,
         video_prompt_template: str = None,
@@ -159,11 +243,19 @@ class MediaClassifier:
         if api_type:
             self.api_type = api_type
         if ollama_url:
-            self.ollama.url = ollama_url.rstrip('/')
             self.ollama_url = ollama_url
+        if ollama_urls is not None:
+            self.ollama_urls = list(ollama_urls)
+        if ollama_url or ollama_urls is not None:
+            # 地址或地址列表任一变化都重建端点池，避免继续发往旧地址
+            self.ollama.set_urls(self.ollama_urls, base_url=self.ollama_url)
         if ollama_model:
             self.ollama.set_model(ollama_model)
             self.ollama_model = ollama_model
+        if ollama_keep_alive:
+            self.ollama.keep_alive = ollama_keep_alive
+        if ollama_num_predict:
+            self.ollama.num_predict = ollama_num_predict
         if network_api_url:
             self.network.url = network_api_url.rstrip('/')
             self.network_api_url = network_api_url
@@ -177,9 +269,34 @@ class MediaClassifier:
             self.network.set_models(network_api_models)
         if network_api_round_robin is not None:
             self.network.round_robin = network_api_round_robin
+        if network_api_routing is not None:
+            self.network.routing = network_api_routing
+        if hedge_enabled is not None:
+            self.network.set_hedging(hedge_enabled, hedge_budget_percent)
+        if network_stream_enabled is not None:
+            self.network.stream_enabled = network_stream_enabled
+        if structured_output_enabled is not None:
+            self.network.structured_output_enabled = structured_output_enabled
+        if cascade_enabled is not None:
+            self.cascade_enabled = cascade_enabled
+        if rule_engine_enabled is not None:
+            self.rule_engine_enabled = rule_engine_enabled
+        if classification_rules is not None:
+            self.classification_rules = classification_rules
         if network_api_model_max_concurrent is not None:
             self.network.model_max_concurrent = network_api_model_max_concurrent
+        if network_api_max_concurrent is not None:
+            self.network.set_pool_size(network_api_max_concurrent)
+        if network_api_model_limits is not None:
+            self.network.set_model_limits(network_api_model_limits)
+        if max_concurrent is not None:
+            self.ollama.set_pool_size(max_concurrent)
+        if network_batch_size is not None:
+            self.network_batch_size = network_batch_size
+        if contact_sheet_size is not None:
+            self.contact_sheet_size = contact_sheet_size
         if categories:
+            self.categories = categories
             self.ollama.set_categories(categories)
             self.network.set_categories(categories)
         if prompt_template:
@@ -187,6 +304,7 @@ class MediaClassifier:
             self.network.set_prompt_template(prompt_template)
         if video_prompt_template:
             self.network.video_prompt_template = video_prompt_template
+            self.ollama.video_prompt_template = video_prompt_template
         if image_structured_output_prompt is not None:
             self.image_structured_output_prompt = image_structured_output_prompt
         if video_structured_output_prompt is not None:
@@ -232,69 +350,325 @@ class MediaClassifier:
             self.error_export_enabled = error_export_enabled
         if error_export_folder:
             self.error_export_folder = error_export_folder
+        self._build_prompt_variants()
+        self.rule_engine = self._build_rule_engine()
 
-    def process_single_file(
-        self, 
-        file_path: str, 
-        target_dir: str
-    ) -> Dict[str, Any]:
-        result = {
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """返回当前API客户端的连接复用统计"""
+        if self.api_type == "network":
+            return self.network.get_connection_stats()
+        return self.ollama.get_connection_stats()
+
+    def format_model_stats(self) -> str:
+        """网络API各模型的延迟、错误率和吞吐量"""
+        return self.network.format_model_stats()
+
+    def format_hedge_stats(self) -> str:
+        return self.network.hedge_budget.format_stats()
+
+    def format_stream_stats(self) -> str:
+        return self.network.format_stream_stats()
+
+    def format_cascade_stats(self) -> str:
+        return self.cascade_stats.format_stats()
+
+    def _build_rule_engine(self) -> RuleEngine:
+        return RuleEngine(self.classification_rules if self.rule_engine_enabled else [], self.categories)
+
+    def format_rule_stats(self) -> str:
+        return self.rule_engine.format_stats()
+
+    def uses_cascade(self) -> bool:
+        """网络API模式下是否先用 Ollama 识别，只把没有把握的文件升级到网络模型"""
+        return self.cascade_enabled and self.api_type == "network"
+
+    def format_connection_stats(self) -> str:
+        if self.api_type == "network":
+            return self.network.session.format_stats()
+        return self.ollama.session.format_stats()
+
+    def prepare_file(self, file_path: str) -> Dict[str, Any]:
+        """检查文件并生成发送给AI的图像（解码、缩放、抽帧）
+
+        命中预分类规则时不解码，image/base64 为None，rule_response 中是规则给出的结果。
+        """
+        prepared = self.check_file(file_path)
+        if prepared["success"] and prepared["rule_response"] is None:
+            prepared = self.decode_file(prepared)
+        return prepared
+
+    def check_file(self, file_path: str) -> Dict[str, Any]:
+        """解码前的检查：文件是否存在、是否已处理过（按路径和内容指纹）、是否命中预分类规则"""
+        prepared = {
             "success": False,
             "file_path": file_path,
-            "category": None,
-            "error": None,
-            "ai_result": None
+            "is_video": False,
+            "image": None,
+            "base64": None,
+            "rule_response": None,
+            "file_hash": None,
+            "error": None
         }
 
-        try:
-            if not os.path.exists(file_path):
-                result["error"] = "文件不存在"
-                return result
+        if not os.path.exists(file_path):
+            prepared["error"] = "文件不存在"
+            return prepared
 
-            if self.db.is_file_processed(file_path):
-                result["error"] = "文件已处理过"
-                return result
+        # 内容指纹同时用于本次运行中的重复文件判断（见 ProcessingEngine._pipeline_check）
+        prepared["file_hash"] = self.db.compute_file_hash(file_path)
+        if self.db.is_file_processed(file_path, prepared["file_hash"]):
+            prepared["error"] = "文件已处理过"
+            return prepared
 
-            is_video = self.scanner.is_video_file(file_path)
-            img, base64_img = self.processor.process_media(
-                file_path, 
-                is_video=is_video,
-                frame_count=self.video_frame_count,
-                frame_mode=self.video_frame_mode
-            )
+        is_video = self.scanner.is_video_file(file_path)
+        prepared["success"] = True
+        prepared["is_video"] = is_video
+        rule_response = self.rule_engine.classify(file_path, is_video)
+        if rule_response is not None:
+            print(f"规则预分类: {os.path.basename(file_path)} -> {rule_response['category']}（{rule_response['rule']}）")
+            prepared["rule_response"] = rule_response
+        return prepared
 
-            if not img or not base64_img:
-                result["error"] = "图像处理失败"
-                return result
+    def decode_file(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """解码、缩放、抽帧，生成发送给AI的图像（check_file 通过后调用）"""
+        is_video = prepared["is_video"]
+        img, base64_img = self.processor.process_media(
+            prepared["file_path"], 
+            is_video=is_video,
+            frame_count=self.video_frame_count,
+            frame_mode=self.video_frame_mode
+        )
 
-            # Use the appropriate AI client based on api_type
-            if self.api_type == "network":
-                if is_video:
-                    custom_structured_output = self.video_structured_output_prompt
-                    current_rename_prompt = self.video_rename_prompt
-                else:
-                    custom_structured_output = self.image_structured_output_prompt
-                    current_rename_prompt = self.rename_prompt
-                
-                if custom_structured_output:
-                    structured_output_prompt = custom_structured_output
-                elif self.rename_enabled:
-                    structured_output_prompt = """- 只返回JSON格式，格式如下：{"category": "类别名称", "description": "简短描述"}
+        if not img or not base64_img:
+            prepared["success"] = False
+            prepared["error"] = "图像处理失败"
+            return prepared
+
+        prepared["image"] = img
+        prepared["base64"] = base64_img
+        return prepared
+
+    def uses_builtin_output_format(self, is_video: bool) -> bool:
+        """是否使用内置的输出格式（没有自定义结构化输出提示词），只有内置格式才加输出约束"""
+        if is_video:
+            return not self.video_structured_output_prompt
+        return not self.image_structured_output_prompt
+
+    def get_prompts(self, is_video: bool) -> Tuple[str, Optional[str]]:
+        """返回结构化输出提示词和重命名提示词（未启用重命名时为None），只做查找"""
+        return self._prompt_variants[(is_video, self.rename_enabled)]
+
+    def _build_prompt_variants(self) -> None:
+        """预先生成 图片/视频 × 是否重命名 四种提示词组合，设置变化时重新生成"""
+        self._prompt_variants = {
+            (is_video, rename_enabled): self._build_prompts(is_video, rename_enabled)
+            for is_video in (False, True)
+            for rename_enabled in (False, True)
+        }
+
+    def _build_prompts(self, is_video: bool, rename_enabled: bool) -> Tuple[str, Optional[str]]:
+        if is_video:
+            custom_structured_output = self.video_structured_output_prompt
+            current_rename_prompt = self.video_rename_prompt
+        else:
+            custom_structured_output = self.image_structured_output_prompt
+            current_rename_prompt = self.rename_prompt
+        
+        if custom_structured_output:
+            structured_output_prompt = custom_structured_output
+        elif rename_enabled:
+            structured_output_prompt = """- 只返回JSON格式，格式如下：{"category": "类别名称", "description": "简短描述"}
 - 类别必须且只能从指定列表中选择。
 - 描述要简洁明了，突出图片核心内容。
 - 不要包含任何其他文字或标点符号。
 - 不要使用markdown代码块格式（不要使用```标记）。
 - 直接返回纯JSON文本，不要任何格式化。"""
-                else:
-                    structured_output_prompt = """- 只返回JSON格式，格式如下：{"category": "类别名称"}
+        else:
+            structured_output_prompt = """- 只返回JSON格式，格式如下：{"category": "类别名称"}
 - 类别必须且只能从指定列表中选择。
 - 不要包含任何其他文字或标点符号。
 - 不要使用markdown代码块格式（不要使用```标记）。
 - 直接返回纯JSON文本，不要任何格式化。"""
-                ai_response = self.network.analyze_image(base64_img, is_video, structured_output_prompt, current_rename_prompt)
+        if not rename_enabled:
+            current_rename_prompt = None
+        return structured_output_prompt, current_rename_prompt
+
+    def cascade_first_stage(self, base64_img: str, is_video: bool) -> Optional[Dict[str, Any]]:
+        """两级识别的第一级：用 Ollama（本地小模型）识别
+
+        结果是有效JSON中的类别且不是兜底类别时直接采用；识别失败、回答无法解析、
+        可信程度低或落入兜底类别时返回None，由调用方升级到网络模型。
+        """
+        structured_output_prompt, current_rename_prompt = self.get_prompts(is_video)
+        start = time.monotonic()
+        try:
+            response = self.ollama.analyze_image(base64_img, is_video, structured_output_prompt, current_rename_prompt)
+        except Exception as e:
+            response = {"success": False, "error": str(e)}
+        accepted = not needs_escalation(response, self.categories[-1])
+        self.cascade_stats.record_local(time.monotonic() - start, accepted)
+        return response if accepted else None
+
+    def classify(self, base64_img: str, is_video: bool) -> Optional[Dict[str, Any]]:
+        """使用当前配置的AI客户端识别图像"""
+        if self.uses_cascade():
+            response = self.cascade_first_stage(base64_img, is_video)
+            if response is not None:
+                return response
+        structured_output_prompt, current_rename_prompt = self.get_prompts(is_video)
+        if self.api_type == "network":
+            start = time.monotonic()
+            response = self.network.analyze_image(
+                base64_img,
+                is_video,
+                structured_output_prompt,
+                current_rename_prompt,
+                self.uses_builtin_output_format(is_video)
+            )
+            if self.uses_cascade():
+                self.cascade_stats.record_remote(time.monotonic() - start, (response or {}).get("usage_tokens"))
+            return response
+        return self.ollama.analyze_image(base64_img, is_video, structured_output_prompt, current_rename_prompt)
+
+    def build_batch_request(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """已准备好的文件对应的网络API请求体（离线批处理任务使用）"""
+        is_video = prepared["is_video"]
+        structured_output_prompt, current_rename_prompt = self.get_prompts(is_video)
+        return self.network.build_request_body(
+            prepared["base64"],
+            is_video,
+            structured_output_prompt,
+            current_rename_prompt,
+            self.uses_builtin_output_format(is_video)
+        )
+
+    def classify_batch(self, prepared_list: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """批量识别多个已准备好的文件，返回与输入顺序一致的识别结果
+
+        网络API下图片按联系表大小拼图识别（启用时），否则与视频一样按批量大小
+        合并为多图请求；未启用批量的类型和 Ollama 逐个识别。
+        启用两级识别时先逐个用 Ollama 识别，只把需要升级的文件合并发给网络模型。
+        """
+        responses: List[Optional[Dict[str, Any]]] = [None] * len(prepared_list)
+        if self.api_type != "network":
+            for index, prepared in enumerate(prepared_list):
+                responses[index] = self.classify(prepared["base64"], prepared["is_video"])
+            return responses
+
+        pending = list(range(len(prepared_list)))
+        cascade = self.uses_cascade()
+        if cascade:
+            for index in pending:
+                responses[index] = self.cascade_first_stage(prepared_list[index]["base64"], prepared_list[index]["is_video"])
+            pending = [index for index in pending if responses[index] is None]
+
+        for is_video in (False, True):
+            indexes = [i for i in pending if prepared_list[i]["is_video"] == is_video]
+            use_contact_sheet = not is_video and self.contact_sheet_size > 1
+            group_size = self.contact_sheet_size if use_contact_sheet else self.network_batch_size
+            structured_output_prompt, current_rename_prompt = self.get_prompts(is_video)
+            constrained_output = self.uses_builtin_output_format(is_video)
+            if group_size <= 1:
+                for index in indexes:
+                    start = time.monotonic()
+                    responses[index] = self.network.analyze_image(
+                        prepared_list[index]["base64"],
+                        is_video,
+                        structured_output_prompt,
+                        current_rename_prompt,
+                        constrained_output
+                    )
+                    if cascade:
+                        self.cascade_stats.record_remote(
+                            time.monotonic() - start, (responses[index] or {}).get("usage_tokens")
+                        )
+                continue
+
+            for start in range(0, len(indexes), group_size):
+                group = indexes[start:start + group_size]
+                base64_images = [prepared_list[i]["base64"] for i in group]
+                sent_at = time.monotonic()
+                if use_contact_sheet and len(group) > 1:
+                    sheet = self.processor.create_contact_sheet([prepared_list[i]["image"] for i in group])
+                    group_responses = self.network.analyze_contact_sheet(
+                        self.processor.image_to_base64(sheet),
+                        base64_images,
+                        structured_output_prompt,
+                        current_rename_prompt,
+                        constrained_output
+                    )
+                else:
+                    group_responses = self.network.analyze_images_batch(
+                        base64_images, is_video, structured_output_prompt, current_rename_prompt, constrained_output
+                    )
+                if cascade:
+                    # 合并请求的耗时按文件数平均计入
+                    elapsed = (time.monotonic() - sent_at) / len(group)
+                    for _ in group:
+                        self.cascade_stats.record_remote(elapsed)
+                for index, response in zip(group, group_responses):
+                    responses[index] = response
+        return responses
+
+    def process_batch(
+        self,
+        file_paths: List[str],
+        target_dir: str,
+        on_prepared: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """批量处理多个文件：逐个准备图像，合并为批量请求识别，再逐个移动文件
+
+        on_prepared 在每个文件的图像准备好后调用（例如用于界面预览）。
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        prepared_list = []
+        for file_path in file_paths:
+            try:
+                prepared = self.prepare_file(file_path)
+            except Exception as e:
+                prepared = {"success": False, "file_path": file_path, "error": str(e)}
+            if prepared["success"] and prepared["rule_response"] is not None:
+                results[file_path] = self.finalize_file(file_path, target_dir, prepared["rule_response"])
+            elif prepared["success"]:
+                prepared_list.append(prepared)
+                if on_prepared:
+                    on_prepared(prepared)
             else:
-                ai_response = self.ollama.analyze_image(base64_img)
+                results[file_path] = {
+                    "success": False,
+                    "file_path": file_path,
+                    "category": None,
+                    "error": prepared["error"],
+                    "ai_result": None
+                }
+
+        if prepared_list:
+            try:
+                ai_responses = self.classify_batch(prepared_list)
+            except Exception as e:
+                print(f"批量识别时发生异常: {e}")
+                ai_responses = [{"success": False, "error": str(e)}] * len(prepared_list)
+            for prepared, ai_response in zip(prepared_list, ai_responses):
+                results[prepared["file_path"]] = self.finalize_file(prepared["file_path"], target_dir, ai_response)
+
+        return [results[file_path] for file_path in file_paths]
+
+    def finalize_file(
+        self,
+        file_path: str,
+        target_dir: str,
+        ai_response: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """根据AI识别结果移动/复制文件并写入数据库"""
+        result = {
+            "success": False,
+            "file_path": file_path,
+            "category": None,
+            "error": None,
+            "ai_result": None
+        }
 
+        try:
             if not ai_response or not ai_response.get("success"):
                 result["error"] = ai_response.get("error", "AI识别失败") if ai_response else "AI识别失败"
                 return result
@@ -302,30 +676,15 @@ class MediaClassifier:
             category = ai_response.get("category", "其他")
             raw_response = ai_response.get("raw_response", "")
             
-            # Extract description from JSON response if rename is enabled
+            # 启用重命名时使用客户端解析出的描述（客户端与类别一起解析，无需再次解析JSON）
             description = None
-            if self.rename_enabled and ai_response.get("success"):
-                try:
-                    import json
-                    response_text = ai_response.get("raw_response", "")
-                    if response_text:
-                        # 清理响应文本，移除markdown代码块标记
-                        cleaned_text = self._clean_json_response(response_text)
-                        
-                        # 尝试解析JSON
-                        parsed = json.loads(cleaned_text)
-                        description = parsed.get("description", "")
-                        if description:
-                            print(f"成功解析JSON描述: {description}")
-                except json.JSONDecodeError as e:
-                    print(f"JSON解析失败: {e}")
-                    print(f"原始响应内容: {response_text[:500]}...")
-                    # 如果JSON解析失败，尝试从响应中提取描述
-                    description = self._extract_description_from_text(response_text)
-                except Exception as e:
-                    print(f"处理响应时发生异常: {e}")
-                    print(f"原始响应内容: {response_text[:500]}...")
-                    description = self._extract_description_from_text(response_text)
+            if self.rename_enabled:
+                if "description" in ai_response:
+                    description = ai_response["description"]
+                elif raw_response:
+                    description = get_response_parser(self.categories).parse(raw_response)["description"]
+                if description:
+                    print(f"解析到描述: {description}")
             
             # Build rename_info if description is available
             rename_info = None
@@ -377,69 +736,49 @@ class MediaClassifier:
 
         return result
 
-    def _clean_json_response(self, text: str) -> str:
-        """清理JSON响应，移除markdown代码块标记和其他干扰"""
-        try:
-            import re
-            
-            # 移除markdown代码块标记 ```json ... ```
-            text = re.sub(r'```json\s*', '', text)
-            text = re.sub(r'```\s*$', '', text)
-            
-            # 移除其他markdown代码块标记 ``` ... ```
-            text = re.sub(r'```\s*', '', text)
-            
-            # 移除开头和结尾的空白字符
-            text = text.strip()
-            
-            # 移除可能的前导和尾随引号（如果整个JSON被包裹在引号中）
-            if text.startswith('"') and text.endswith('"'):
-                text = text[1:-1]
-            
-            return text
-        except Exception as e:
-            print(f"清理JSON响应时发生异常: {e}")
-            return text
+    def process_single_file(
+        self, 
+        file_path: str, 
+        target_dir: str,
+        on_prepared: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """处理单个文件：准备图像、识别、移动文件；命中预分类规则时跳过解码和识别
 
-    def _extract_description_from_text(self, text: str) -> str:
-        """从非JSON格式的文本中提取描述"""
+        on_prepared 在图像准备好后调用（例如用于界面预览）。
+        """
         try:
-            import re
-            
-            # 首先尝试清理文本
-            cleaned_text = self._clean_json_response(text)
-            
-            # 尝试直接从清理后的文本中提取JSON
-            try:
-                import json
-                parsed = json.loads(cleaned_text)
-                description = parsed.get("description", "")
-                if description:
-                    print(f"从清理后的文本中成功提取JSON描述: {description}")
-                    return description[:20]
-            except:
-                pass
-            
-            # 尝试提取引号中的内容
-            matches = re.findall(r'["\']([^"\']+)["\']', cleaned_text)
-            if matches:
-                # 返回第一个匹配项，且长度不超过20个字符
-                for match in matches:
-                    if len(match) <= 30 and match not in self.categories:
-                        return match[:20]
-            
-            # 如果没有找到，尝试提取中文描述
-            # 查找连续的中文字符
-            chinese_matches = re.findall(r'[\u4e00-\u9fa5]{2,10}', cleaned_text)
-            if chinese_matches:
-                return chinese_matches[0][:20]
-            
-            # 如果还是没有，返回前20个非空字符
-            cleaned = ''.join(char for char in cleaned_text if not char.isspace())
-            return cleaned[:20] if cleaned else ""
+            prepared = self.prepare_file(file_path)
+            if not prepared["success"]:
+                return {
+                    "success": False,
+                    "file_path": file_path,
+                    "category": None,
+                    "error": prepared["error"],
+                    "ai_result": None
+                }
+
+            if prepared["rule_response"] is not None:
+                ai_response = prepared["rule_response"]
+            else:
+                if on_prepared:
+                    on_prepared(prepared)
+                ai_response = self.classify(prepared["base64"], prepared["is_video"])
         except Exception as e:
-            print(f"提取描述时发生异常: {e}")
-            return ""
+            error_msg = str(e)
+            print(f"处理文件时发生异常: {file_path}, 错误: {error_msg}")
+            
+            # Export error file if enabled
+            if self.error_export_enabled:
+                self._export_error_file(file_path, error_msg)
+            return {
+                "success": False,
+                "file_path": file_path,
+                "category": None,
+                "error": error_msg,
+                "ai_result": None
+            }
+
+        return self.finalize_file(file_path, target_dir, ai_response)
 
     def _export_error_file(self, file_path: str, error_msg: str):
         """导出错误文件到指定目录"""
@@ -0,0 +1,122 @@
+import itertools
+import threading
+import time
+from concurrent.futures import Executor, Future, wait, FIRST_COMPLETED
+from typing import Optional, Callable, Any, Iterable, Iterator
+
+_NO_ITEM = object()
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 自适应并发限制器
+
+    请求成功且延迟正常时并发上限加性增长（每完成约一个窗口的请求 +1），
+    遇到 429 / 5xx / 超时时乘性减小，从而自动收敛到服务商的实际承载能力。
+    """
+
+    # 触发乘性减小的错误类型
+    OVERLOAD_ERRORS = ("rate_limit", "server", "timeout")
+
+    def __init__(
+        self,
+        initial_limit: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        on_change: Optional[Callable[[int, int, str], None]] = None
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.backoff_ratio = backoff_ratio
+        # 延迟超过基线的该倍数时视为排队拥塞，不再增长
+        self.latency_tolerance = latency_tolerance
+        self.on_change = on_change
+        self._limit = float(min(max(int(initial_limit), self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """阻塞直到在途请求数低于当前上限"""
+        with self._cond:
+            acquired = self._cond.wait_for(lambda: self._in_flight < int(self._limit), timeout)
+            if acquired:
+                self._in_flight += 1
+            return acquired
+
+    def release(self, latency: float, outcome: str = "success") -> None:
+        """释放槽位并根据本次请求的延迟和结果调整上限
+
+        outcome 取值: success / rate_limit / server / timeout / client / network
+        """
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            old_limit = int(self._limit)
+            reason = ""
+
+            if outcome == "success":
+                if self._baseline_latency is None:
+                    self._baseline_latency = latency
+                if latency <= self._baseline_latency * self.latency_tolerance:
+                    self._limit = min(self.max_limit, self._limit + 1.0 / max(self._limit, 1.0))
+                    reason = "延迟正常"
+                # 基线延迟：变快时较快跟随，变慢时缓慢跟随
+                alpha = 0.2 if latency < self._baseline_latency else 0.05
+                self._baseline_latency = self._baseline_latency * (1 - alpha) + latency * alpha
+            elif outcome in self.OVERLOAD_ERRORS:
+                now = time.time()
+                # 同一拥塞窗口内的多个失败只减小一次
+                cooldown = max(1.0, self._baseline_latency or 1.0)
+                if now - self._last_decrease >= cooldown:
+                    self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                    self._last_decrease = now
+                    reason = {"rate_limit": "HTTP 429", "server": "服务端错误", "timeout": "请求超时"}[outcome]
+
+            new_limit = int(self._limit)
+            self._cond.notify_all()
+
+        if new_limit != old_limit and self.on_change:
+            try:
+                self.on_change(old_limit, new_limit, reason)
+            except Exception as e:
+                print(f"并发上限变更回调失败: {e}")
+
+
+def run_bounded(
+    executor: Executor,
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    window: int,
+    should_stop: Callable[[], bool] = lambda: False
+) -> Iterator[Future]:
+    """滑动窗口提交任务：最多保持 window 个任务在途，完成一个再提交一个，按完成顺序产出 Future
+
+    不会一次性为所有文件创建 Future，内存占用与任务总数无关；should_stop 为真时不再提交新任务，
+    先产出已完成的任务，再取消尚未开始的任务并产出已经开始、无法取消的任务（调用方等待其结果并记录）。
+    """
+    items = iter(items)
+    pending = set()
+    for item in itertools.islice(items, max(1, window)):
+        pending.add(executor.submit(func, item))
+    while pending:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        if should_stop():
+            # 已完成的任务可能已经移动了文件，结果必须交给调用方记录
+            yield from done
+            yield from [future for future in pending if not future.cancel()]
+            return
+        for future in done:
+            yield future
+            next_item = next(items, _NO_ITEM)
+            if next_item is not _NO_ITEM:
+                pending.add(executor.submit(func, next_item))
@@ -7,8 +7,21 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import DB_PATH
 
+# 运行状态
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+
+# 运行中每个文件的状态
+FILE_PENDING = "pending"
+FILE_IN_FLIGHT = "in_flight"
+FILE_DONE = "done"
+FILE_FAILED = "failed"
+
 
 class Database:
+    # IN 查询每块的参数个数（低于旧版 SQLite 的 999 个参数上限）
+    QUERY_CHUNK_SIZE = 900
+
     def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
         self._init_database()
@@ -35,10 +48,51 @@ class Database:
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_file_hash ON processed_files(file_hash)
             ''')
+            # 运行检查点：每次运行的待处理列表和每个文件的状态，中断后据此继续
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source_dir TEXT NOT NULL,
+                    target_dir TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    settings_key TEXT NOT NULL DEFAULT '',
+                    total INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS run_files (
+                    run_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    file_size INTEGER,
+                    file_mtime_ns INTEGER,
+                    started_ns INTEGER,
+                    dest_path TEXT,
+                    error TEXT,
+                    PRIMARY KEY (run_id, file_path)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_run_files_state ON run_files(run_id, state, position)
+            ''')
+            # 旧版本创建的检查点表缺少的列
+            self._add_missing_columns(cursor, "runs", {"settings_key": "TEXT NOT NULL DEFAULT ''"})
+            self._add_missing_columns(cursor, "run_files", {"started_ns": "INTEGER"})
             conn.commit()
 
     @staticmethod
-    def _compute_file_hash(file_path: str) -> str:
+    def _add_missing_columns(cursor, table: str, columns: Dict[str, str]) -> None:
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+    @staticmethod
+    def compute_file_hash(file_path: str) -> str:
         hash_obj = hashlib.md5()
         try:
             with open(file_path, 'rb') as f:
@@ -48,8 +102,10 @@ class Database:
         except Exception:
             return ""
 
-    def is_file_processed(self, file_path: str) -> bool:
-        file_hash = self._compute_file_hash(file_path)
+    def is_file_processed(self, file_path: str, file_hash: Optional[str] = None) -> bool:
+        """按路径或内容指纹（MD5）判断是否已处理过；file_hash 为已计算好的指纹，避免重复读取文件"""
+        if file_hash is None:
+            file_hash = self.compute_file_hash(file_path)
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -64,7 +120,7 @@ class Database:
         category: str, 
         ai_result: str = ""
     ) -> None:
-        file_hash = self._compute_file_hash(file_path)
+        file_hash = self.compute_file_hash(file_path)
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -78,16 +134,24 @@ class Database:
         if not file_paths:
             return []
         
-        placeholders = ', '.join(['?'] * len(file_paths))
+        processed = self.get_processed_paths(file_paths)
+        return [fp for fp in file_paths if fp not in processed]
+
+    def get_processed_paths(self, file_paths: List[str]) -> set:
+        """返回 file_paths 中已有处理记录的路径"""
+        # SQLite 对一条语句的参数个数有上限，按块查询
+        processed = set()
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f'''
-                SELECT file_path FROM processed_files 
-                WHERE file_path IN ({placeholders})
-            ''', file_paths)
-            processed = {row[0] for row in cursor.fetchall()}
-        
-        return [fp for fp in file_paths if fp not in processed]
+            for start in range(0, len(file_paths), self.QUERY_CHUNK_SIZE):
+                chunk = file_paths[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ', '.join(['?'] * len(chunk))
+                cursor.execute(f'''
+                    SELECT file_path FROM processed_files 
+                    WHERE file_path IN ({placeholders})
+                ''', chunk)
+                processed.update(row[0] for row in cursor.fetchall())
+        return processed
 
     def get_all_processed_files(self) -> List[Dict[str, Any]]:
         with self._get_connection() as conn:
@@ -101,6 +165,9 @@ class Database:
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM processed_files')
+            # 清空记录后旧的检查点不再有效，下次运行重新扫描
+            cursor.execute('DELETE FROM run_files')
+            cursor.execute('DELETE FROM runs')
             conn.commit()
 
     def clear_invalid_records(self) -> int:
@@ -115,8 +182,117 @@ class Database:
                     invalid_ids.append(record_id)
             
             if invalid_ids:
-                placeholders = ', '.join(['?'] * len(invalid_ids))
-                cursor.execute(f'DELETE FROM processed_files WHERE id IN ({placeholders})', invalid_ids)
+                for start in range(0, len(invalid_ids), self.QUERY_CHUNK_SIZE):
+                    chunk = invalid_ids[start:start + self.QUERY_CHUNK_SIZE]
+                    placeholders = ', '.join(['?'] * len(chunk))
+                    cursor.execute(f'DELETE FROM processed_files WHERE id IN ({placeholders})', chunk)
                 conn.commit()
             
             return len(invalid_ids)
+
+    def create_run(self, source_dir: str, target_dir: str, file_paths: List[str], settings_key: str = "") -> int:
+        """记录一次运行及其待处理列表（按处理顺序），返回运行ID；settings_key 标识影响待处理列表和目标位置的设置"""
+        now = datetime.now()
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO runs (source_dir, target_dir, status, settings_key, total, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (source_dir, target_dir, RUN_RUNNING, settings_key, len(file_paths), now, now))
+            run_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT OR IGNORE INTO run_files (run_id, position, file_path, state)
+                VALUES (?, ?, ?, ?)
+            ''', ((run_id, position, file_path, FILE_PENDING) for position, file_path in enumerate(file_paths)))
+            conn.commit()
+            return run_id
+
+    def get_open_run(self, source_dir: str, target_dir: str, settings_key: str = "") -> Optional[Dict[str, Any]]:
+        """返回同一源目录、目标目录和设置最近一次未完成的运行"""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM runs
+                WHERE source_dir = ? AND target_dir = ? AND settings_key = ? AND status = ?
+                ORDER BY id DESC LIMIT 1
+            ''', (source_dir, target_dir, settings_key, RUN_RUNNING))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def add_run_files(self, run_id: int, file_paths: List[str]) -> None:
+        """把文件追加到运行的待处理列表末尾（继续运行时加入新增的文件）"""
+        if not file_paths:
+            return
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(MAX(position), -1) FROM run_files WHERE run_id = ?', (run_id,))
+            start = cursor.fetchone()[0] + 1
+            cursor.executemany('''
+                INSERT OR IGNORE INTO run_files (run_id, position, file_path, state)
+                VALUES (?, ?, ?, ?)
+            ''', ((run_id, start + offset, file_path, FILE_PENDING) for offset, file_path in enumerate(file_paths)))
+            cursor.execute('''
+                UPDATE runs SET total = (SELECT COUNT(*) FROM run_files WHERE run_id = ?), updated_at = ?
+                WHERE id = ?
+            ''', (run_id, datetime.now(), run_id))
+            conn.commit()
+
+    def get_run_file_paths(self, run_id: int) -> set:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT file_path FROM run_files WHERE run_id = ?', (run_id,))
+            return {row[0] for row in cursor.fetchall()}
+
+    def get_run_files(self, run_id: int, states: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """按处理顺序返回运行中的文件，可按状态过滤"""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if states:
+                placeholders = ', '.join(['?'] * len(states))
+                cursor.execute(f'''
+                    SELECT * FROM run_files WHERE run_id = ? AND state IN ({placeholders})
+                    ORDER BY position
+                ''', (run_id, *states))
+            else:
+                cursor.execute('SELECT * FROM run_files WHERE run_id = ? ORDER BY position', (run_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def mark_run_files_in_flight(self, run_id: int, entries: List[tuple]) -> None:
+        """标记开始处理的文件；entries 为 (file_path, file_size, file_mtime_ns, started_ns)，用于中断后查找已写出的文件"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE run_files SET state = ?, file_size = ?, file_mtime_ns = ?, started_ns = ?
+                WHERE run_id = ? AND file_path = ?
+            ''', (
+                (FILE_IN_FLIGHT, size, mtime_ns, started_ns, run_id, file_path)
+                for file_path, size, mtime_ns, started_ns in entries
+            ))
+            conn.commit()
+
+    def update_run_files(self, run_id: int, updates: List[tuple]) -> None:
+        """批量更新文件状态；updates 为 (file_path, state, dest_path, error)"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE run_files SET state = ?, dest_path = ?, error = ?
+                WHERE run_id = ? AND file_path = ?
+            ''', ((state, dest_path, error, run_id, file_path) for file_path, state, dest_path, error in updates))
+            cursor.execute('UPDATE runs SET updated_at = ? WHERE id = ?', (datetime.now(), run_id))
+            conn.commit()
+
+    def get_run_counts(self, run_id: int) -> Dict[str, int]:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT state, COUNT(*) FROM run_files WHERE run_id = ? GROUP BY state
+            ''', (run_id,))
+            return dict(cursor.fetchall())
+
+    def finish_run(self, run_id: int, status: str = RUN_COMPLETED) -> None:
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE runs SET status = ?, updated_at = ? WHERE id = ?', (status, datetime.now(), run_id))
+            conn.commit()
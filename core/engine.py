@@ -0,0 +1,795 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Callable, Set
+from concurrent.futures import ThreadPoolExecutor
+from .classifier import MediaClassifier
+from .file_scanner import FileScanner
+from .database import Database
+from .async_engine import AsyncInferenceEngine, HTTPX_AVAILABLE
+from .batch_job import BatchJob, OpenAIBatchBackend, LocalBatchBackend, job_dir_for
+from .pipeline import Stage, StagedPipeline
+from .concurrency import run_bounded
+from .scheduler import SCHEDULING_POLICIES, POLICY_PATH, order_files
+from .checkpoint import RunCheckpoint
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    DEFAULT_MAX_CONCURRENT, DEFAULT_VIDEO_FRAME_COUNT, 
+    DEFAULT_OPERATION_MODE, DEFAULT_TIME_SOURCE, DEFAULT_FOLDER_STRUCTURE,
+    DEFAULT_VIDEO_FRAME_MODE,
+    DEFAULT_API_TYPE, DEFAULT_NETWORK_API_MAX_CONCURRENT,
+    DEFAULT_NETWORK_API_MODEL_LIMITS,
+    DEFAULT_RENAME_ENABLED, DEFAULT_RENAME_PROMPT, DEFAULT_VIDEO_RENAME_PROMPT,
+    DEFAULT_RENAME_INCLUDE_ORIGINAL_NAME, DEFAULT_RENAME_DATE_TYPE,
+    DEFAULT_RENAME_DATE_FORMAT,
+    DEFAULT_RETRY_ENABLED, DEFAULT_RETRY_COUNT, DEFAULT_RETRY_DELAY,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_ERROR_EXPORT_ENABLED, DEFAULT_ERROR_EXPORT_FOLDER,
+    DEFAULT_ASYNC_ENGINE_ENABLED, DEFAULT_ASYNC_MAX_IN_FLIGHT,
+    DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED, DEFAULT_ADAPTIVE_CONCURRENCY_MIN,
+    DEFAULT_ADAPTIVE_CONCURRENCY_MAX,
+    DEFAULT_NETWORK_API_ROUTING, DEFAULT_MODEL_STATS_LOG_INTERVAL,
+    DEFAULT_HEDGE_ENABLED, DEFAULT_HEDGE_BUDGET_PERCENT,
+    DEFAULT_NETWORK_BATCH_SIZE, DEFAULT_CONTACT_SHEET_SIZE, DEFAULT_NETWORK_STREAM_ENABLED,
+    DEFAULT_STRUCTURED_OUTPUT_ENABLED, DEFAULT_CASCADE_ENABLED,
+    DEFAULT_RULE_ENGINE_ENABLED, DEFAULT_CLASSIFICATION_RULES,
+    DEFAULT_BATCH_JOB_ENABLED, DEFAULT_BATCH_JOB_BACKEND, DEFAULT_BATCH_JOB_DIR,
+    DEFAULT_BATCH_JOB_SHARD_SIZE, DEFAULT_BATCH_JOB_SHARD_MAX_MB, DEFAULT_BATCH_JOB_POLL_INTERVAL,
+    DEFAULT_PIPELINE_ENABLED, DEFAULT_PIPELINE_IO_WORKERS, DEFAULT_PIPELINE_DECODE_WORKERS,
+    DEFAULT_SCHEDULING_POLICY, DEFAULT_CHECKPOINT_ENABLED, DEFAULT_CHECKPOINT_RESCAN,
+    DEFAULT_OLLAMA_KEEP_ALIVE, DEFAULT_OLLAMA_NUM_PREDICT, DEFAULT_OLLAMA_NUM_PARALLEL,
+    DEFAULT_OLLAMA_URLS
+)
+
+# 停止时尚未开始处理的文件的错误信息
+STOPPED_ERROR = "已停止"
+
+
+def _ignore(*args) -> None:
+    pass
+
+
+def get_max_concurrent(settings: dict) -> int:
+    """按 API 类型确定线程池大小（Ollama 模式下运行时还会按服务端并行数调整）"""
+    if settings.get("api_type", DEFAULT_API_TYPE) == "network":
+        max_concurrent = settings.get("network_api_max_concurrent", DEFAULT_NETWORK_API_MAX_CONCURRENT)
+        if settings.get("adaptive_concurrency_enabled", DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED):
+            # 线程池按自适应上限的最大值创建，实际在途请求数由限制器控制
+            max_concurrent = max(max_concurrent, settings.get("adaptive_concurrency_max", DEFAULT_ADAPTIVE_CONCURRENCY_MAX))
+        return max_concurrent
+    return settings.get("max_concurrent", DEFAULT_MAX_CONCURRENT)
+
+
+def prepare_ollama(classifier: MediaClassifier, num_parallel: int, log: Callable[[str], None]) -> int:
+    """预热 Ollama 模型并按服务端并行数设置连接池大小，返回并行数"""
+    ollama = classifier.ollama
+    log(f"预热 Ollama 模型: {ollama.model}")
+    if ollama.warm_up():
+        log(f"模型已加载（保留时间 {ollama.keep_alive}）")
+    else:
+        log("警告: 模型预热失败，首批请求可能较慢")
+
+    parallel, source = ollama.discover_parallelism(num_parallel)
+    ollama.set_pool_size(parallel)
+    log(f"Ollama 服务端并行数: {parallel}（{source}）")
+    if ollama.endpoints is not None:
+        log("Ollama 端点池:\n" + ollama.format_endpoint_stats())
+    return parallel
+
+
+def create_classifier(settings: dict) -> MediaClassifier:
+    """按设置创建分类器"""
+    api_type = settings.get("api_type", DEFAULT_API_TYPE)
+    return MediaClassifier(
+        api_type=api_type,
+        ollama_url=settings.get("ollama_url"),
+        ollama_model=settings.get("ollama_model"),
+        ollama_keep_alive=settings.get("ollama_keep_alive", DEFAULT_OLLAMA_KEEP_ALIVE),
+        ollama_num_predict=settings.get("ollama_num_predict", DEFAULT_OLLAMA_NUM_PREDICT),
+        ollama_urls=settings.get("ollama_urls", DEFAULT_OLLAMA_URLS),
+        network_api_url=settings.get("network_api_url"),
+        network_api_key=settings.get("network_api_key"),
+        network_api_model=settings.get("network_api_model"),
+        network_api_models=settings.get("available_network_models"),
+        network_api_round_robin=settings.get("network_api_round_robin", True),
+        network_api_routing=settings.get("network_api_routing", DEFAULT_NETWORK_API_ROUTING),
+        hedge_enabled=settings.get("hedge_enabled", DEFAULT_HEDGE_ENABLED),
+        hedge_budget_percent=settings.get("hedge_budget_percent", DEFAULT_HEDGE_BUDGET_PERCENT),
+        network_stream_enabled=settings.get("network_stream_enabled", DEFAULT_NETWORK_STREAM_ENABLED),
+        structured_output_enabled=settings.get("structured_output_enabled", DEFAULT_STRUCTURED_OUTPUT_ENABLED),
+        cascade_enabled=settings.get("cascade_enabled", DEFAULT_CASCADE_ENABLED),
+        rule_engine_enabled=settings.get("rule_engine_enabled", DEFAULT_RULE_ENGINE_ENABLED),
+        classification_rules=settings.get("classification_rules", DEFAULT_CLASSIFICATION_RULES),
+        network_api_model_max_concurrent=settings.get("network_api_model_max_concurrent", 2),
+        network_api_max_concurrent=settings.get("network_api_max_concurrent", DEFAULT_NETWORK_API_MAX_CONCURRENT),
+        network_api_model_limits=settings.get("network_api_model_limits", DEFAULT_NETWORK_API_MODEL_LIMITS),
+        max_concurrent=settings.get("max_concurrent", DEFAULT_MAX_CONCURRENT),
+        network_batch_size=settings.get("network_batch_size", DEFAULT_NETWORK_BATCH_SIZE),
+        contact_sheet_size=settings.get("contact_sheet_size", DEFAULT_CONTACT_SHEET_SIZE),
+        adaptive_concurrency_enabled=settings.get("adaptive_concurrency_enabled", DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED) and api_type == "network",
+        adaptive_concurrency_min=settings.get("adaptive_concurrency_min", DEFAULT_ADAPTIVE_CONCURRENCY_MIN),
+        adaptive_concurrency_max=settings.get("adaptive_concurrency_max", DEFAULT_ADAPTIVE_CONCURRENCY_MAX),
+        categories=settings.get("categories"),
+        prompt_template=settings.get("prompt"),
+        video_prompt_template=settings.get("video_prompt"),
+        image_structured_output_prompt=settings.get("image_structured_output_prompt", ""),
+        video_structured_output_prompt=settings.get("video_structured_output_prompt", ""),
+        operation_mode=settings.get("operation_mode", DEFAULT_OPERATION_MODE),
+        video_frame_count=settings.get("video_frame_count", DEFAULT_VIDEO_FRAME_COUNT),
+        video_frame_mode=settings.get("video_frame_mode", DEFAULT_VIDEO_FRAME_MODE),
+        time_source=settings.get("time_source", DEFAULT_TIME_SOURCE),
+        folder_structure=settings.get("folder_structure", DEFAULT_FOLDER_STRUCTURE),
+        # Rename settings
+        rename_enabled=settings.get("rename_enabled", DEFAULT_RENAME_ENABLED),
+        rename_prompt=settings.get("rename_prompt", DEFAULT_RENAME_PROMPT),
+        video_rename_prompt=settings.get("video_rename_prompt", DEFAULT_VIDEO_RENAME_PROMPT),
+        rename_include_original=settings.get("rename_include_original_name", DEFAULT_RENAME_INCLUDE_ORIGINAL_NAME),
+        rename_date_type=settings.get("rename_date_type", DEFAULT_RENAME_DATE_TYPE),
+        rename_date_format=settings.get("rename_date_format", DEFAULT_RENAME_DATE_FORMAT),
+        # Network retry and error export settings
+        retry_enabled=settings.get("retry_enabled", DEFAULT_RETRY_ENABLED),
+        retry_count=settings.get("retry_count", DEFAULT_RETRY_COUNT),
+        retry_delay=settings.get("retry_delay", DEFAULT_RETRY_DELAY),
+        request_timeout=settings.get("request_timeout", DEFAULT_REQUEST_TIMEOUT),
+        error_export_enabled=settings.get("error_export_enabled", DEFAULT_ERROR_EXPORT_ENABLED),
+        error_export_folder=settings.get("error_export_folder", DEFAULT_ERROR_EXPORT_FOLDER)
+    )
+
+
+class ProcessingEngine:
+    """一次整理任务的调度：扫描、检查点、选择执行方式（线程池/批量/异步/流水线/离线批处理）并汇总统计
+
+    不依赖 Qt，界面（ui/worker.py）和命令行（cli.py）都通过回调接收日志、进度、单个文件的结果和预览图像。
+    run() 在调用线程中阻塞执行，pause()/resume()/stop() 可以从其他线程调用。
+    """
+
+    def __init__(
+        self, 
+        source_dir: str, 
+        target_dir: str, 
+        recursive: bool = True,
+        settings: dict = None,
+        on_log: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        on_file: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_preview: Optional[Callable[[Any], None]] = None,
+        classifier: Optional[MediaClassifier] = None
+    ):
+        self._log = on_log or _ignore
+        self._on_progress = on_progress or _ignore
+        self._on_file = on_file or _ignore
+        self._on_preview = on_preview or _ignore
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.recursive = recursive
+        self.settings = settings or {}
+        self._is_running = True
+        self._is_paused = False
+        self._progress_lock = threading.Lock()
+        self._processed_count = 0
+        self._succeeded_count = 0
+        self._failed_count = 0
+        self._total = 0
+        self._started_at = time.time()
+        self._checkpoint = None
+        # 流水线模式下本次运行中每个内容指纹第一次出现的文件，用于跳过内容相同的重复文件
+        self._content_owners: Dict[str, str] = {}
+        self._content_lock = threading.Lock()
+        self._last_stats_log = time.time()
+        
+        # API Configuration
+        self.api_type = self.settings.get("api_type", DEFAULT_API_TYPE)
+        self.ollama_num_parallel = self.settings.get("ollama_num_parallel", DEFAULT_OLLAMA_NUM_PARALLEL)
+        self.model_stats_log_interval = self.settings.get("model_stats_log_interval", DEFAULT_MODEL_STATS_LOG_INTERVAL)
+        self.hedge_enabled = self.settings.get("hedge_enabled", DEFAULT_HEDGE_ENABLED)
+        self.network_stream_enabled = self.settings.get("network_stream_enabled", DEFAULT_NETWORK_STREAM_ENABLED)
+        self.network_batch_size = self.settings.get("network_batch_size", DEFAULT_NETWORK_BATCH_SIZE)
+        self.contact_sheet_size = self.settings.get("contact_sheet_size", DEFAULT_CONTACT_SHEET_SIZE)
+        
+        # Staged pipeline settings
+        self.pipeline_enabled = self.settings.get("pipeline_enabled", DEFAULT_PIPELINE_ENABLED)
+        self.pipeline_io_workers = self.settings.get("pipeline_io_workers", DEFAULT_PIPELINE_IO_WORKERS)
+        self.pipeline_decode_workers = (
+            self.settings.get("pipeline_decode_workers", DEFAULT_PIPELINE_DECODE_WORKERS) or os.cpu_count() or 4
+        )
+        
+        # Scheduling policy (processing order)
+        self.scheduling_policy = self.settings.get("scheduling_policy", DEFAULT_SCHEDULING_POLICY)
+        if self.scheduling_policy not in SCHEDULING_POLICIES:
+            self.scheduling_policy = POLICY_PATH
+        
+        # Offline batch job settings (network API only)
+        self.batch_job_enabled = self.settings.get("batch_job_enabled", DEFAULT_BATCH_JOB_ENABLED)
+        self.batch_job_backend = self.settings.get("batch_job_backend", DEFAULT_BATCH_JOB_BACKEND)
+        self.batch_job_dir = self.settings.get("batch_job_dir", DEFAULT_BATCH_JOB_DIR) or DEFAULT_BATCH_JOB_DIR
+        self.batch_job_shard_size = self.settings.get("batch_job_shard_size", DEFAULT_BATCH_JOB_SHARD_SIZE)
+        self.batch_job_shard_max_mb = self.settings.get("batch_job_shard_max_mb", DEFAULT_BATCH_JOB_SHARD_MAX_MB)
+        self.batch_job_poll_interval = self.settings.get("batch_job_poll_interval", DEFAULT_BATCH_JOB_POLL_INTERVAL)
+        
+        # Async engine settings (network API only)
+        self.async_engine_enabled = self.settings.get("async_engine_enabled", DEFAULT_ASYNC_ENGINE_ENABLED)
+        self.async_max_in_flight = self.settings.get("async_max_in_flight", DEFAULT_ASYNC_MAX_IN_FLIGHT)
+        
+        self.max_concurrent = get_max_concurrent(self.settings)
+        self.operation_mode = self.settings.get("operation_mode", DEFAULT_OPERATION_MODE)
+        self.checkpoint_enabled = self.settings.get("checkpoint_enabled", DEFAULT_CHECKPOINT_ENABLED)
+        self.checkpoint_rescan = self.settings.get("checkpoint_rescan", DEFAULT_CHECKPOINT_RESCAN)
+        self.process_images = self.settings.get("process_images", True)
+        self.process_videos = self.settings.get("process_videos", True)
+        
+        # 任务服务中多个任务共用同一个分类器（共享连接池、并发和速率限制）
+        self.base_classifier = classifier if classifier is not None else create_classifier(self.settings)
+        if classifier is None and self.base_classifier.network.concurrency_limiter:
+            self.base_classifier.network.concurrency_limiter.on_change = self._on_concurrency_limit_changed
+        self.scanner = FileScanner()
+        self.db = Database()
+
+    def _process_single_file(self, file_path: str) -> Dict[str, Any]:
+        if not self._is_running:
+            return {"success": False, "file_path": file_path, "error": STOPPED_ERROR}
+
+        while self._is_paused and self._is_running:
+            time.sleep(0.1)
+
+        if not self._is_running:
+            return {"success": False, "file_path": file_path, "error": STOPPED_ERROR}
+
+        try:
+            self._log(f"处理: {os.path.basename(file_path)}")
+            self._checkpoint_started([file_path])
+
+            # 预览使用识别时已解码的图像，不再单独解码一次
+            return self.base_classifier.process_single_file(
+                file_path,
+                self.target_dir,
+                on_prepared=lambda prepared: self._on_preview(prepared["image"])
+            )
+
+        except Exception as e:
+            error_msg = str(e)
+            self._log(f"  错误: 处理异常 - {error_msg}")
+            return {
+                "success": False,
+                "file_path": file_path,
+                "error": error_msg
+            }
+
+    def _process_batch(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        while self._is_paused and self._is_running:
+            time.sleep(0.1)
+
+        if not self._is_running:
+            return [{"success": False, "file_path": file_path, "error": STOPPED_ERROR} for file_path in file_paths]
+
+        try:
+            self._log(f"批量处理 {len(file_paths)} 个文件: {os.path.basename(file_paths[0])} 等")
+            self._checkpoint_started(file_paths)
+            return self.base_classifier.process_batch(
+                file_paths,
+                self.target_dir,
+                on_prepared=lambda prepared: self._on_preview(prepared["image"])
+            )
+        except Exception as e:
+            error_msg = str(e)
+            self._log(f"  错误: 批量处理异常 - {error_msg}")
+            return [{"success": False, "file_path": file_path, "error": error_msg} for file_path in file_paths]
+
+    def _on_concurrency_limit_changed(self, old_limit: int, new_limit: int, reason: str) -> None:
+        arrow = "↑" if new_limit > old_limit else "↓"
+        self._log(f"{arrow} 自适应并发上限: {old_limit} -> {new_limit} ({reason})")
+
+    def _checkpoint_started(self, file_paths: List[str]) -> None:
+        if self._checkpoint is not None:
+            self._checkpoint.started(file_paths)
+
+    def _handle_result(self, result: Dict[str, Any], total: int) -> None:
+        self._on_file(result)
+        # 停止时未开始的文件保持待处理状态，下次从检查点继续
+        if self._checkpoint is not None and result.get("error") != STOPPED_ERROR:
+            self._checkpoint.finished(result)
+
+        self._progress_lock.acquire()
+        self._processed_count += 1
+        if result["success"]:
+            self._succeeded_count += 1
+        elif result.get("error") != STOPPED_ERROR:
+            self._failed_count += 1
+        current = self._processed_count
+        self._progress_lock.release()
+
+        self._on_progress(current, total)
+        self._maybe_log_model_stats()
+
+        if result.get("skipped"):
+            self._log(f"- 已处理过: {os.path.basename(result['file_path'])}")
+        elif result["success"]:
+            self._log(
+                f"✓ 分类完成: {result['category']} - {os.path.basename(result['file_path'])}"
+            )
+        else:
+            self._log(
+                f"✗ 失败: {result.get('error', '未知错误')} - {os.path.basename(result['file_path'])}"
+            )
+
+    def _maybe_log_model_stats(self, force: bool = False) -> None:
+        """定期在日志面板输出各模型的实时统计"""
+        if self.api_type != "network":
+            return
+        self._progress_lock.acquire()
+        now = time.time()
+        due = force or now - self._last_stats_log >= self.model_stats_log_interval
+        if due:
+            self._last_stats_log = now
+        self._progress_lock.release()
+        if due:
+            self._log("模型统计:\n" + self.base_classifier.format_model_stats())
+
+    def _prepare_ollama(self, set_concurrency: bool = True) -> None:
+        """预热 Ollama 模型，并按服务端并行数设置线程池大小
+
+        两级识别时 Ollama 只是第一级，线程池大小仍按网络API并发数设置（set_concurrency=False）。
+        """
+        parallel = prepare_ollama(self.base_classifier, self.ollama_num_parallel, self._log)
+        if set_concurrency:
+            self.max_concurrent = parallel
+
+    def _pipeline_check(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        self._checkpoint_started([task["file_path"]])
+        prepared = self.base_classifier.check_file(task["file_path"])
+        if not prepared["success"]:
+            task["result"] = {"success": False, "file_path": task["file_path"], "error": prepared["error"]}
+            return task
+        # 数据库只记录已完成的文件，内容相同的文件同时在流水线中时按本次运行的指纹去重
+        duplicate_of = self._claim_content(prepared["file_hash"], task["file_path"])
+        if duplicate_of is not None:
+            task["result"] = {
+                "success": False,
+                "file_path": task["file_path"],
+                "error": f"与 {os.path.basename(duplicate_of)} 内容相同，已跳过"
+            }
+            return task
+        task["prepared"] = prepared
+        # 命中预分类规则的文件跳过解码和识别，直接移动
+        task["ai_response"] = prepared["rule_response"]
+        return task
+
+    def _claim_content(self, file_hash: Optional[str], file_path: str) -> Optional[str]:
+        """登记文件的内容指纹，本次运行中已有内容相同的文件时返回该文件路径"""
+        if not file_hash:
+            return None
+        with self._content_lock:
+            owner = self._content_owners.setdefault(file_hash, file_path)
+        return owner if owner != file_path else None
+
+    def _pipeline_decode(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        if task["ai_response"] is not None:
+            return task
+        prepared = self.base_classifier.decode_file(task["prepared"])
+        if not prepared["success"]:
+            task["result"] = {"success": False, "file_path": task["file_path"], "error": prepared["error"]}
+            return task
+        self._on_preview(prepared["image"])
+        return task
+
+    def _pipeline_infer(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        while self._is_paused and self._is_running:
+            time.sleep(0.1)
+        if task["ai_response"] is None:
+            prepared = task["prepared"]
+            self._log(f"处理: {os.path.basename(task['file_path'])}")
+            task["ai_response"] = self.base_classifier.classify(prepared["base64"], prepared["is_video"])
+        # 识别后不再需要图像，尽早释放
+        task["prepared"] = None
+        return task
+
+    def _pipeline_move(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        task["result"] = self.base_classifier.finalize_file(task["file_path"], self.target_dir, task["ai_response"])
+        return task
+
+    def _run_pipeline(self, files: List[str], total: int) -> None:
+        """分阶段流水线：磁盘、CPU、网络各自的线程池同时工作，有界队列防止解码结果堆积"""
+        def on_error(task: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+            self._log(f"  错误: 处理异常 - {error}")
+            task["prepared"] = None
+            task["result"] = {"success": False, "file_path": task["file_path"], "error": str(error)}
+            return task
+
+        pipeline = StagedPipeline(
+            [
+                Stage("检查", self._pipeline_check, self.pipeline_io_workers),
+                Stage("解码", self._pipeline_decode, self.pipeline_decode_workers),
+                Stage("识别", self._pipeline_infer, self.max_concurrent),
+                Stage("移动/入库", self._pipeline_move, self.pipeline_io_workers)
+            ],
+            finished=lambda task: task.get("result") is not None,
+            on_error=on_error,
+            should_stop=lambda: not self._is_running
+        )
+        self._log(
+            f"流水线模式: 检查/移动 {self.pipeline_io_workers} 线程，解码 {self.pipeline_decode_workers} 线程，"
+            f"识别 {self.max_concurrent} 线程"
+        )
+        tasks = ({"file_path": file_path, "result": None} for file_path in files)
+        for task in pipeline.run(tasks):
+            self._handle_result(task["result"], total)
+        self._log("流水线统计:\n" + pipeline.format_stats())
+
+    def _run_batch_job(self, files: List[str], total: int) -> None:
+        """离线批处理：写出 JSONL 分片并提交，等待完成后入库；停止后再次运行同一目录会从上次的阶段继续"""
+        network = self.base_classifier.network
+        if self.batch_job_backend == "local":
+            backend = LocalBatchBackend(network, self.settings.get("network_api_max_concurrent", DEFAULT_NETWORK_API_MAX_CONCURRENT))
+        else:
+            backend = OpenAIBatchBackend(network)
+        job_dir = job_dir_for(self.batch_job_dir, self.source_dir, self.target_dir)
+        job = BatchJob(
+            job_dir, self.base_classifier, self.target_dir, backend, self.batch_job_shard_size, log=self._log,
+            shard_max_bytes=int(self.batch_job_shard_max_mb * 1024 * 1024)
+        )
+        self._log(f"离线批处理任务: {job_dir}（{backend.name}）")
+        # 之前的分片中已处理过的文件不在扫描结果中，但入库时也会报告
+        total = len(set(files) | job.pending_files())
+        self._progress_lock.acquire()
+        self._total = total
+        self._progress_lock.release()
+        job.run(
+            files,
+            poll_interval=self.batch_job_poll_interval,
+            on_result=lambda result: self._handle_result(result, total),
+            should_stop=lambda: not self._is_running
+        )
+
+    def _use_async_engine(self) -> bool:
+        if self.api_type != "network" or not self.async_engine_enabled:
+            return False
+        if not HTTPX_AVAILABLE:
+            self._log("未安装 httpx，异步推理引擎不可用，改用线程池模式")
+            return False
+        return True
+
+    async def _process_file_async(
+        self,
+        engine: AsyncInferenceEngine,
+        executor: ThreadPoolExecutor,
+        file_path: str,
+        finalizing: Set[asyncio.Task]
+    ) -> Dict[str, Any]:
+        """异步处理单个文件；进入移动/复制阶段时把当前任务加入 finalizing，停止时这些任务不会被取消"""
+        while self._is_paused and self._is_running:
+            await asyncio.sleep(0.1)
+
+        if not self._is_running:
+            return {"success": False, "file_path": file_path, "error": STOPPED_ERROR}
+
+        loop = asyncio.get_running_loop()
+        try:
+            self._log(f"处理: {os.path.basename(file_path)}")
+            await loop.run_in_executor(executor, self._checkpoint_started, [file_path])
+
+            # 解码/抽帧和文件移动在线程池中执行，事件循环只负责网络请求
+            prepared = await loop.run_in_executor(executor, self.base_classifier.prepare_file, file_path)
+            if not prepared["success"]:
+                return {"success": False, "file_path": file_path, "error": prepared["error"]}
+            if prepared["rule_response"] is not None:
+                finalizing.add(asyncio.current_task())
+                return await loop.run_in_executor(
+                    executor, self.base_classifier.finalize_file, file_path, self.target_dir, prepared["rule_response"]
+                )
+            self._on_preview(prepared["image"])
+
+            is_video = prepared["is_video"]
+            ai_response = None
+            if self.base_classifier.uses_cascade():
+                # 第一级的 Ollama 请求是同步的，放到线程池中执行
+                ai_response = await loop.run_in_executor(
+                    executor, self.base_classifier.cascade_first_stage, prepared["base64"], is_video
+                )
+            if ai_response is None:
+                structured_output_prompt, rename_prompt = self.base_classifier.get_prompts(is_video)
+                sent_at = time.monotonic()
+                ai_response = await engine.analyze_image(
+                    prepared["base64"],
+                    is_video,
+                    structured_output_prompt,
+                    rename_prompt,
+                    self.base_classifier.uses_builtin_output_format(is_video)
+                )
+                if self.base_classifier.uses_cascade():
+                    self.base_classifier.cascade_stats.record_remote(
+                        time.monotonic() - sent_at, (ai_response or {}).get("usage_tokens")
+                    )
+            del prepared
+
+            finalizing.add(asyncio.current_task())
+            return await loop.run_in_executor(
+                executor, self.base_classifier.finalize_file, file_path, self.target_dir, ai_response
+            )
+        except Exception as e:
+            error_msg = str(e)
+            self._log(f"  错误: 处理异常 - {error_msg}")
+            return {
+                "success": False,
+                "file_path": file_path,
+                "error": error_msg
+            }
+
+    async def _run_async(self, files: List[str], total: int) -> None:
+        engine = AsyncInferenceEngine(self.base_classifier.network, self.async_max_in_flight)
+        self._log(
+            f"异步推理引擎: 最大在途请求 {engine.max_in_flight}，"
+            f"HTTP/2 {'已启用' if engine.http2 else '未启用'}"
+        )
+        in_flight = asyncio.Semaphore(engine.max_in_flight)
+        tasks = set()
+        # 已进入移动/复制阶段的任务：线程池中的文件操作无法取消，停止时等待它们完成并记录结果
+        finalizing: Set[asyncio.Task] = set()
+
+        def on_done(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            finalizing.discard(task)
+            in_flight.release()
+            if task.cancelled():
+                return
+            try:
+                self._handle_result(task.result(), total)
+            except Exception as e:
+                self._log(f"✗ 处理异常: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+            async with engine:
+                for file_path in files:
+                    await in_flight.acquire()
+                    if not self._is_running:
+                        in_flight.release()
+                        break
+                    task = asyncio.create_task(self._process_file_async(engine, executor, file_path, finalizing))
+                    tasks.add(task)
+                    task.add_done_callback(on_done)
+
+                # 停止后只取消还在解码或等待推理的任务，已在移动/复制的任务等待完成
+                while tasks:
+                    if not self._is_running:
+                        for task in tasks - finalizing:
+                            task.cancel()
+                    await asyncio.wait(set(tasks), timeout=0.1)
+
+    def run(self) -> Dict[str, Any]:
+        """执行整理任务并返回汇总（见 get_summary）；出错时保存检查点后抛出异常"""
+        self._started_at = time.time()
+        try:
+            self._log(f"开始扫描目录: {self.source_dir}")
+            rule_engine = self.base_classifier.rule_engine
+            if rule_engine.enabled:
+                self._log(f"规则预分类: {len(rule_engine.rules)} 条规则")
+            for ignored in rule_engine.ignored:
+                self._log(f"  忽略规则: {ignored}")
+            if self.api_type == "ollama":
+                self._prepare_ollama()
+            elif self.base_classifier.uses_cascade():
+                self._log("两级识别: 先用 Ollama 识别，没有把握时再请求网络模型")
+                self._prepare_ollama(set_concurrency=False)
+            batch_size = 1
+            if self.api_type == "network":
+                batch_size = max(self.network_batch_size, self.contact_sheet_size)
+                if self.network_batch_size > 1:
+                    self._log(f"批量模式: 每次请求最多 {self.network_batch_size} 张图片")
+                if self.contact_sheet_size > 1:
+                    self._log(f"联系表模式: 每 {self.contact_sheet_size} 张图片拼成一张缩略图联系表识别")
+            if batch_size > 1:
+                if self.async_engine_enabled:
+                    self._log("批量模式使用线程池发送请求，异步推理引擎不生效")
+                if self.pipeline_enabled:
+                    self._log("批量模式按批处理文件，流水线模式不生效")
+            use_async = batch_size <= 1 and self._use_async_engine()
+            limiter = self.base_classifier.network.concurrency_limiter
+            if limiter:
+                self._log(
+                    f"自适应并发已启用: 初始上限 {limiter.limit}，范围 {limiter.min_limit}-{limiter.max_limit}"
+                )
+            else:
+                self._log(f"最大并发数: {self.max_concurrent}")
+            
+            unprocessed = self.plan()
+            total = len(unprocessed)
+            if total == 0:
+                return self.get_summary()
+
+            self._last_stats_log = time.time()
+            if self.api_type == "network" and self.batch_job_enabled:
+                self._run_batch_job(unprocessed, total)
+            elif use_async:
+                asyncio.run(self._run_async(unprocessed, total))
+            elif self.pipeline_enabled and batch_size <= 1:
+                self._run_pipeline(unprocessed, total)
+            else:
+                # 滑动窗口提交：在途任务数有上限，停止时取消尚未开始的任务
+                with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+                    if batch_size > 1:
+                        jobs = (unprocessed[i:i + batch_size] for i in range(0, total, batch_size))
+                        futures = run_bounded(
+                            executor, self._process_batch, jobs, self.max_concurrent * 2, lambda: not self._is_running
+                        )
+                    else:
+                        futures = run_bounded(
+                            executor, self._process_single_file, unprocessed, self.max_concurrent * 2,
+                            lambda: not self._is_running
+                        )
+
+                    for future in futures:
+                        try:
+                            results = future.result()
+                            for result in results if batch_size > 1 else [results]:
+                                self._handle_result(result, total)
+                        except Exception as e:
+                            self._log(f"✗ 处理异常: {str(e)}")
+
+                self._log(f"连接复用统计: {self.base_classifier.format_connection_stats()}")
+                if limiter:
+                    self._log(f"自适应并发最终上限: {limiter.limit}")
+
+            self._maybe_log_model_stats(force=True)
+            if self.api_type == "network" and self.hedge_enabled:
+                self._log(f"对冲请求统计: {self.base_classifier.format_hedge_stats()}")
+            if self.api_type == "network" and self.network_stream_enabled:
+                self._log(f"流式响应统计: {self.base_classifier.format_stream_stats()}")
+            if self.base_classifier.uses_cascade():
+                self._log(f"两级识别统计: {self.base_classifier.format_cascade_stats()}")
+            if self.base_classifier.rule_engine.enabled:
+                self._log(f"规则预分类统计: {self.base_classifier.format_rule_stats()}")
+            if self.api_type == "ollama" and self.base_classifier.ollama.endpoints is not None:
+                self._log("Ollama 端点统计:\n" + self.base_classifier.ollama.format_endpoint_stats())
+            self._close_checkpoint()
+            self._log("处理完成")
+            return self.get_summary()
+
+        except Exception:
+            self._close_checkpoint()
+            raise
+
+    def plan(self) -> List[str]:
+        """确定本次要处理的文件（按处理顺序）：有未完成的运行时从检查点继续，否则扫描源目录并创建检查点"""
+        # 离线批处理任务有自己的阶段记录，不使用运行检查点
+        use_checkpoint = self.checkpoint_enabled and not (self.api_type == "network" and self.batch_job_enabled)
+        checkpoint = self._resume_checkpoint() if use_checkpoint else None
+        if checkpoint is not None:
+            # 从检查点继续时跳过扫描、无效记录清理和已处理查询；开启重新扫描时才把中断后新增的文件追加到末尾
+            if self.checkpoint_rescan:
+                added = checkpoint.merge(self._scan_unprocessed() or [])
+                if added:
+                    self._log(f"  中断后新增 {len(added)} 个文件，加入检查点")
+            unprocessed = checkpoint.pending
+            if not unprocessed:
+                checkpoint.complete()
+                checkpoint = None
+        else:
+            unprocessed = self._scan_unprocessed()
+            if unprocessed is None:
+                return []
+        self._total = len(unprocessed)
+        self._processed_count = 0
+
+        if not unprocessed:
+            self._log("所有文件都已处理过！")
+            self._log("提示：如果想重新处理这些文件，可以手动删除数据库或使用重新处理功能")
+            return []
+
+        if use_checkpoint and checkpoint is None:
+            checkpoint = RunCheckpoint.create(
+                self.db, self.source_dir, self.target_dir, unprocessed, self._checkpoint_key()
+            )
+        self._checkpoint = checkpoint
+        return unprocessed
+
+    def process_file(self, file_path: str) -> Dict[str, Any]:
+        """处理 plan() 返回的单个文件并记录结果（检查点、进度、日志），供外部调度（任务服务）使用"""
+        result = self._process_single_file(file_path)
+        self._handle_result(result, self._total)
+        return result
+
+    def finish(self) -> Dict[str, Any]:
+        """外部调度处理完（或停止）后调用：保存检查点并返回汇总"""
+        self._close_checkpoint()
+        return self.get_summary()
+
+    def get_summary(self) -> Dict[str, Any]:
+        """本次运行的汇总：待处理数、已处理数、成功/失败数、是否被停止、耗时（秒）"""
+        self._progress_lock.acquire()
+        summary = {
+            "total": self._total,
+            "processed": self._processed_count,
+            "succeeded": self._succeeded_count,
+            "failed": self._failed_count,
+            "stopped": not self._is_running,
+            "elapsed": time.time() - self._started_at
+        }
+        self._progress_lock.release()
+        return summary
+
+    def _scan_unprocessed(self) -> Optional[List[str]]:
+        """扫描源目录并排除已处理的文件，按调度策略排序；没有符合条件的文件时返回None"""
+        invalid_count = self.db.clear_invalid_records()
+        if invalid_count > 0:
+            self._log(f"清理了 {invalid_count} 条无效的已处理记录")
+        
+        image_files, video_files = self.scanner.scan_directory(
+            self.source_dir, 
+            self.recursive
+        )
+        
+        all_files = []
+        if self.process_images:
+            all_files.extend(image_files)
+        if self.process_videos:
+            all_files.extend(video_files)
+        
+        if not all_files:
+            if not self.process_images and not self.process_videos:
+                self._log("图片和视频处理都已关闭，请在设置中开启")
+            else:
+                self._log("未找到符合条件的媒体文件")
+            return None
+
+        unprocessed = self.db.get_unprocessed_files(all_files)
+        
+        self._log(f"找到 {len(all_files)} 个文件，其中 {len(unprocessed)} 个未处理")
+        if len(unprocessed) > 1 and self.scheduling_policy != POLICY_PATH:
+            unprocessed = order_files(unprocessed, self.scheduling_policy, self.scanner.is_video_file)
+            self._log(f"处理顺序: {SCHEDULING_POLICIES[self.scheduling_policy]}")
+        return unprocessed
+
+    def _checkpoint_key(self) -> str:
+        """影响待处理列表和目标位置的设置，改变后不再继续之前的运行"""
+        return json.dumps({
+            "recursive": self.recursive,
+            "process_images": self.process_images,
+            "process_videos": self.process_videos,
+            "operation_mode": self.operation_mode,
+            "folder_structure": self.settings.get("folder_structure", DEFAULT_FOLDER_STRUCTURE),
+            "time_source": self.settings.get("time_source", DEFAULT_TIME_SOURCE)
+        }, sort_keys=True)
+
+    def _resume_checkpoint(self) -> Optional[RunCheckpoint]:
+        """同一目录、相同设置有未完成的运行时加载检查点并核对中断时正在处理的文件"""
+        checkpoint = RunCheckpoint.resume(
+            self.db, self.source_dir, self.target_dir, self.operation_mode, self._checkpoint_key()
+        )
+        if checkpoint is None:
+            return None
+        reconciled = checkpoint.reconciled
+        self._log(f"从检查点继续上次中断的运行: 剩余 {len(checkpoint.pending)} 个文件")
+        if reconciled["in_flight"]:
+            self._log(
+                f"  中断时正在处理 {reconciled['in_flight']} 个: 已入库 {reconciled['recorded']}，"
+                f"已写入目标目录 {reconciled['written']}，其余重新处理"
+            )
+        if reconciled["missing"]:
+            self._log(f"  源文件已不存在: {reconciled['missing']} 个")
+        return checkpoint
+
+    def _close_checkpoint(self) -> None:
+        """写入缓存的状态；全部处理完时结束本次运行，否则保留检查点供下次继续"""
+        checkpoint, self._checkpoint = self._checkpoint, None
+        if checkpoint is None:
+            return
+        if checkpoint.complete():
+            self._log(f"运行检查点: {checkpoint.format_counts()}")
+        else:
+            self._log(
+                f"运行检查点已保存（{checkpoint.format_counts()}），下次运行同一目录时从中断处继续"
+            )
+
+    def pause(self):
+        self._is_paused = True
+        self._log("已暂停")
+
+    def resume(self):
+        self._is_paused = False
+        self._log("继续处理")
+
+    def stop(self):
+        self._is_running = False
+        self._is_paused = False
+        self._log("正在停止...")
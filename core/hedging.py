@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, Any
+
+
+class HedgeBudget:
+    """对冲请求预算
+
+    每个普通请求积累 ratio 个额度，发送一个对冲请求消耗 1 个额度，
+    保证对冲产生的额外请求不超过普通请求数的 ratio 比例（例如 5%）。
+    """
+
+    def __init__(self, ratio: float = 0.05, max_credits: float = 10.0):
+        self.ratio = max(0.0, ratio)
+        self.max_credits = max_credits
+        self.credits = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.credits = min(self.max_credits, self.credits + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.credits < 1.0:
+                return False
+            self.credits -= 1.0
+            self.hedged += 1
+            return True
+
+    def refund(self) -> None:
+        """对冲请求最终没有发出（例如没有可用的其他模型）时归还额度"""
+        with self._lock:
+            self.credits = min(self.max_credits, self.credits + 1.0)
+            self.hedged = max(0, self.hedged - 1)
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": self.hedged / self.requests if self.requests else 0.0
+            }
+
+    def format_stats(self) -> str:
+        stats = self.get_stats()
+        return (
+            f"请求 {stats['requests']} 次，对冲 {stats['hedged']} 次"
+            f"（{stats['hedge_rate'] * 100:.1f}%），对冲请求先返回 {stats['hedge_wins']} 次"
+        )
@@ -0,0 +1,198 @@
+import socket
+import threading
+from typing import Dict, Any, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# 当前线程正在发送的请求的取消令牌（连接池取出连接时绑定到令牌）
+_current = threading.local()
+
+
+class CancelToken:
+    """可以从其他线程取消的请求
+
+    请求从连接池取出连接时绑定到令牌，连接放回连接池时解除绑定；cancel() 关闭仍绑定的连接的 socket，
+    阻塞在等待响应或读取流式响应的线程立即以连接错误结束，并释放连接、并发槽位和速率额度。
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            connection = self._connection
+        if connection is not None:
+            _shutdown(connection)
+
+    def _attach(self, connection) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._connection = connection
+                return
+        _shutdown(connection)
+
+    def _detach(self, connection) -> None:
+        with self._lock:
+            if self._connection is connection:
+                self._connection = None
+
+
+def _shutdown(connection) -> None:
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _ConnectionCountingAdapter(HTTPAdapter):
+    """每次真正建立TCP连接（包括断线重连）时回调计数，并把取出的连接绑定到当前请求的取消令牌"""
+
+    def __init__(self, on_connect, **kwargs):
+        self._on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        on_connect = self._on_connect
+
+        def counting_pool(base_pool):
+            class CountingConnection(base_pool.ConnectionCls):
+                def connect(self):
+                    on_connect()
+                    return super().connect()
+
+            class CountingPool(base_pool):
+                ConnectionCls = CountingConnection
+
+                def _get_conn(self, timeout=None):
+                    conn = super()._get_conn(timeout)
+                    token = getattr(_current, "token", None)
+                    conn._cancel_token = token
+                    if token is not None:
+                        token._attach(conn)
+                    return conn
+
+                def _put_conn(self, conn):
+                    token = getattr(conn, "_cancel_token", None)
+                    if token is not None:
+                        token._detach(conn)
+                        conn._cancel_token = None
+                    return super()._put_conn(conn)
+
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting_pool(HTTPConnectionPool),
+            "https": counting_pool(HTTPSConnectionPool)
+        }
+
+
+class PooledSession:
+    """线程安全的HTTP连接池会话，保持长连接并统计连接复用情况"""
+
+    def __init__(self, pool_size: int = 10):
+        self.pool_size = max(1, int(pool_size or 1))
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._connection_count = 0
+        self._session = self._create_session(self.pool_size)
+        # 每个会话上正在进行的请求数；调整大小后旧会话在最后一个请求结束时关闭
+        self._users: Dict[requests.Session, int] = {}
+
+    def _count_connection(self) -> None:
+        with self._lock:
+            self._connection_count += 1
+
+    def _create_session(self, pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = _ConnectionCountingAdapter(
+            self._count_connection,
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def set_pool_size(self, pool_size: int) -> None:
+        """调整连接池大小（与最大并发数保持一致）"""
+        pool_size = max(1, int(pool_size or 1))
+        with self._lock:
+            if pool_size == self.pool_size:
+                return
+            old_session = self._session
+            self._session = self._create_session(pool_size)
+            self.pool_size = pool_size
+            # 其他线程可能正在使用旧会话，等它们结束后再关闭
+            close_now = not self._users.get(old_session)
+        if close_now:
+            old_session.close()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        cancel_token: Optional[CancelToken] = None,
+        **kwargs
+    ) -> requests.Response:
+        """发送请求；传入 cancel_token 时可以从其他线程调用 cancel_token.cancel() 中止"""
+        if cancel_token is not None and cancel_token.cancelled:
+            raise requests.exceptions.ConnectionError("请求已取消")
+        with self._lock:
+            self._request_count += 1
+            session = self._session
+            self._users[session] = self._users.get(session, 0) + 1
+        _current.token = cancel_token
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            _current.token = None
+            with self._lock:
+                self._users[session] -= 1
+                retired = not self._users[session] and session is not self._session
+                if not self._users[session]:
+                    del self._users[session]
+            if retired:
+                # 流式响应此时可能还在读取：关闭只释放空闲连接，正在使用的连接读完后直接断开
+                session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回请求数、新建连接数和连接复用率"""
+        with self._lock:
+            requests_count = self._request_count
+            connections = self._connection_count
+        reused = max(0, requests_count - connections)
+        return {
+            "pool_size": self.pool_size,
+            "requests": requests_count,
+            "connections": connections,
+            "reused": reused,
+            "reuse_rate": reused / requests_count if requests_count else 0.0
+        }
+
+    def format_stats(self) -> str:
+        stats = self.get_stats()
+        return (
+            f"请求 {stats['requests']} 次，新建连接 {stats['connections']} 个，"
+            f"复用 {stats['reused']} 次 (复用率 {stats['reuse_rate']:.0%}，连接池 {stats['pool_size']})"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._session.close()
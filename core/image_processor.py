@@ -1,13 +1,13 @@
 import os
 import io
 import base64
-from typing import Optional, Tuple
-from PIL import Image
+from typing import Optional, Tuple, List
+from PIL import Image, ImageDraw, ImageFont
 import cv2
 import numpy as np
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MAX_IMAGE_SIZE, DEFAULT_VIDEO_FRAME_COUNT, DEFAULT_VIDEO_FRAME_MODE
+from config import MAX_IMAGE_SIZE, DEFAULT_VIDEO_FRAME_COUNT, DEFAULT_VIDEO_FRAME_MODE, DEFAULT_CONTACT_SHEET_TILE_SIZE
 
 
 class ImageProcessor:
@@ -108,21 +108,11 @@ class ImageProcessor:
             if not frames:
                 return None
             
-            if len(frames) == 1:
-                frame_rgb = cv2.cvtColor(frames[0], cv2.COLOR_BGR2RGB)
+            frames_rgb = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+            if len(frames_rgb) == 1:
+                frame_rgb = frames_rgb[0]
             else:
-                h, w = frames[0].shape[:2]
-                cols = min(len(frames), 2)
-                rows = (len(frames) + cols - 1) // cols
-                grid = np.zeros((h * rows, w * cols, 3), dtype=np.uint8)
-                
-                for i, frame in enumerate(frames):
-                    row = i // cols
-                    col = i % cols
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    grid[row * h:(row + 1) * h, col * w:(col + 1) * w] = frame_rgb
-                
-                frame_rgb = grid
+                frame_rgb = self.tile_grid(frames_rgb, min(len(frames_rgb), 2))
             
             img = Image.fromarray(frame_rgb)
             
@@ -136,6 +126,57 @@ class ImageProcessor:
             if cap:
                 cap.release()
 
+    @staticmethod
+    def tile_grid(tiles: List[np.ndarray], cols: int) -> np.ndarray:
+        """把尺寸相同的RGB图像按行优先排列成网格，空位填黑色"""
+        h, w = tiles[0].shape[:2]
+        rows = (len(tiles) + cols - 1) // cols
+        grid = np.zeros((h * rows, w * cols, 3), dtype=np.uint8)
+        
+        for i, tile in enumerate(tiles):
+            row = i // cols
+            col = i % cols
+            grid[row * h:(row + 1) * h, col * w:(col + 1) * w] = tile
+        
+        return grid
+
+    def create_contact_sheet(
+        self,
+        images: List[Image.Image],
+        tile_size: int = DEFAULT_CONTACT_SHEET_TILE_SIZE
+    ) -> Image.Image:
+        """把多张图片缩成缩略图拼成一张联系表，每个格子左上角标注从1开始的编号"""
+        try:
+            resample_method = Image.Resampling.LANCZOS
+        except AttributeError:
+            resample_method = Image.LANCZOS
+        try:
+            font = ImageFont.load_default(size=max(12, tile_size // 8))
+        except TypeError:
+            # Pillow < 10.1 的默认字体不支持指定大小
+            font = ImageFont.load_default()
+        
+        tiles = []
+        for number, image in enumerate(images, 1):
+            thumb = image.convert('RGB')
+            thumb.thumbnail((tile_size, tile_size), resample_method)
+            tile = Image.new('RGB', (tile_size, tile_size), (0, 0, 0))
+            tile.paste(thumb, ((tile_size - thumb.width) // 2, (tile_size - thumb.height) // 2))
+            
+            draw = ImageDraw.Draw(tile)
+            label = str(number)
+            left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+            padding = 4
+            draw.rectangle(
+                (0, 0, right - left + padding * 2, bottom - top + padding * 2),
+                fill=(255, 255, 0)
+            )
+            draw.text((padding - left, padding - top), label, fill=(0, 0, 0), font=font)
+            tiles.append(np.array(tile))
+        
+        cols = int(np.ceil(np.sqrt(len(tiles))))
+        return Image.fromarray(self.tile_grid(tiles, cols))
+
     def process_media(
         self, 
         file_path: str, 
@@ -0,0 +1,503 @@
+import os
+import hmac
+import json
+import time
+import shutil
+import tempfile
+import itertools
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from .engine import ProcessingEngine, create_classifier, get_max_concurrent, prepare_ollama
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_API_TYPE, DEFAULT_OLLAMA_NUM_PARALLEL
+
+# 任务状态
+JOB_QUEUED = "queued"        # 已提交，正在扫描或加载检查点
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"
+
+FINISHED_STATES = (JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED)
+
+
+class JobConflictError(ValueError):
+    """同一源目录和目标目录已有未结束的任务"""
+
+
+class Job:
+    """一个整理任务：源目录、目标目录、待派发的文件和每个文件的结果
+
+    每个文件的结果逐行写入 results_path（JSONL），内存中只保留条数和稀疏的行偏移索引，
+    几十万个文件的任务也不会让内存持续增长。
+    """
+
+    # 每隔多少条结果记录一次文件偏移，分页读取时从最近的偏移开始
+    RESULT_INDEX_STRIDE = 1000
+
+    def __init__(self, job_id: str, source_dir: str, target_dir: str, recursive: bool, max_logs: int = 200):
+        self.id = job_id
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.recursive = recursive
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.engine: Optional[ProcessingEngine] = None
+        self.pending: deque = deque()
+        self.in_flight = 0
+        self.scheduled = False
+        self.results_path: Optional[str] = None
+        self.result_count = 0
+        self._result_offsets: List[int] = [0]
+        self._results_file = None
+        self.logs: deque = deque(maxlen=max_logs)
+        self.summary: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def log(self, message: str) -> None:
+        self.logs.append(message)
+
+    def add_result(self, result: Dict[str, Any]) -> None:
+        line = json.dumps({
+            "file_path": result["file_path"],
+            "success": result["success"],
+            "category": result.get("category"),
+            "moved_to": result.get("moved_to"),
+            "error": result.get("error")
+        }, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._results_file is None:
+                self._results_file = open(self.results_path, "ab")
+            self._results_file.write(line.encode("utf-8"))
+            # 立即刷新，读取时只读已计数的行
+            self._results_file.flush()
+            self.result_count += 1
+            if self.result_count % self.RESULT_INDEX_STRIDE == 0:
+                self._result_offsets.append(self._results_file.tell())
+
+    def get_results(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            end = min(self.result_count, offset + limit)
+            if offset >= end:
+                return []
+            block = offset // self.RESULT_INDEX_STRIDE
+            position = self._result_offsets[block]
+        skip = offset - block * self.RESULT_INDEX_STRIDE
+        results = []
+        try:
+            with open(self.results_path, "rb") as f:
+                f.seek(position)
+                for index, line in enumerate(f):
+                    if index < skip:
+                        continue
+                    results.append(json.loads(line))
+                    if len(results) >= end - offset:
+                        break
+        except FileNotFoundError:
+            # 任务刚被移出列表，结果文件已删除
+            return []
+        return results
+
+    def close_results(self, remove: bool = False) -> None:
+        """关闭结果文件；remove 为 True 时同时删除（任务被移出列表后不再可查询）"""
+        with self._lock:
+            if self._results_file is not None:
+                self._results_file.close()
+                self._results_file = None
+            if remove and self.results_path and os.path.exists(self.results_path):
+                os.remove(self.results_path)
+
+    def to_dict(self, include_logs: bool = False) -> Dict[str, Any]:
+        engine = self.engine
+        progress = self.summary or (engine.get_summary() if engine else None)
+        data = {
+            "id": self.id,
+            "source": self.source_dir,
+            "target": self.target_dir,
+            "recursive": self.recursive,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "total": progress["total"] if progress else 0,
+            "processed": progress["processed"] if progress else 0,
+            "succeeded": progress["succeeded"] if progress else 0,
+            "failed": progress["failed"] if progress else 0,
+            "pending": len(self.pending),
+            "in_flight": self.in_flight,
+            "results": self.result_count
+        }
+        if include_logs:
+            data["logs"] = list(self.logs)
+        return data
+
+
+class FairScheduler:
+    """多个任务共用一个推理线程池时的派发顺序
+
+    每次从有待处理文件的任务中选在途文件最少的一个（相同时轮流），每个任务得到相同份额的并发，
+    大任务不会让后提交的小任务一直等待。
+    """
+
+    def __init__(self):
+        self._jobs: List[Job] = []
+        self._cursor = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def add(self, job: Job, files: List[str]) -> None:
+        with self._condition:
+            job.pending.extend(files)
+            self._jobs.append(job)
+            self._condition.notify_all()
+
+    def next_task(self) -> Optional[Tuple[Job, str]]:
+        """阻塞直到有可派发的文件，关闭后返回None"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                count = len(self._jobs)
+                ordered = [self._jobs[(self._cursor + i) % count] for i in range(count)]
+                candidates = [job for job in ordered if job.pending]
+                if candidates:
+                    job = min(candidates, key=lambda candidate: candidate.in_flight)
+                    self._cursor = (self._jobs.index(job) + 1) % count
+                    job.in_flight += 1
+                    return job, job.pending.popleft()
+                self._condition.wait()
+
+    def task_done(self, job: Job) -> bool:
+        """文件处理完后调用，返回任务是否已经没有待处理和在途的文件（此时从调度中移除）"""
+        with self._condition:
+            job.in_flight -= 1
+            return self._remove_if_idle(job)
+
+    def cancel(self, job: Job) -> bool:
+        """丢弃任务尚未派发的文件，返回任务是否已经没有在途文件"""
+        with self._condition:
+            job.pending.clear()
+            return self._remove_if_idle(job)
+
+    def _remove_if_idle(self, job: Job) -> bool:
+        if job.pending or job.in_flight:
+            return False
+        if job in self._jobs:
+            self._jobs.remove(job)
+            self._cursor = 0
+        return True
+
+    def in_flight(self) -> int:
+        with self._condition:
+            return sum(job.in_flight for job in self._jobs)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class JobManager:
+    """任务服务的核心：所有任务共用一个分类器（连接池、并发和速率限制）和一个推理线程池"""
+
+    def __init__(
+        self,
+        settings: dict,
+        log: Callable[[str], None] = print,
+        max_finished_jobs: int = 100,
+        results_dir: Optional[str] = None
+    ):
+        self.settings = settings
+        self.log = log
+        self.max_finished_jobs = max_finished_jobs
+        # 每个任务的结果文件所在目录，未指定时使用临时目录并在 shutdown() 时删除
+        self._owns_results_dir = results_dir is None
+        self.results_dir = results_dir or tempfile.mkdtemp(prefix="ai_pick_job_results_")
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.classifier = create_classifier(settings)
+        self.workers = get_max_concurrent(settings)
+        num_parallel = settings.get("ollama_num_parallel", DEFAULT_OLLAMA_NUM_PARALLEL)
+        if settings.get("api_type", DEFAULT_API_TYPE) == "ollama":
+            self.workers = prepare_ollama(self.classifier, num_parallel, log)
+        elif self.classifier.uses_cascade():
+            prepare_ollama(self.classifier, num_parallel, log)
+        self.scheduler = FairScheduler()
+        self.jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True, name=f"job-worker-{n}")
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        log(f"推理线程池: {self.workers} 个线程，所有任务共用")
+
+    def submit(self, source_dir: str, target_dir: Optional[str] = None, recursive: bool = True) -> Job:
+        """提交任务，扫描（或加载检查点）在后台进行
+
+        源目录不存在时抛出 ValueError，同一源目录和目标目录已有未结束的任务时抛出 JobConflictError
+        """
+        if not source_dir or not os.path.isdir(source_dir):
+            raise ValueError(f"源目录不存在: {source_dir}")
+        source_dir = os.path.abspath(source_dir)
+        target_dir = os.path.abspath(target_dir) if target_dir else source_dir
+        job = Job(None, source_dir, target_dir, recursive)
+        job.engine = ProcessingEngine(
+            source_dir,
+            target_dir,
+            recursive,
+            self.settings,
+            on_log=job.log,
+            on_file=job.add_result,
+            classifier=self.classifier
+        )
+        with self._lock:
+            # 已取消但仍有在途文件的任务也算未结束（两个任务会共用同一个检查点）
+            for other in self.jobs.values():
+                if other.finished_at is None and (other.source_dir, other.target_dir) == (source_dir, target_dir):
+                    raise JobConflictError(f"相同目录的任务正在运行: {other.id}")
+            job.id = str(next(self._ids))
+            job.results_path = os.path.join(self.results_dir, f"job_{job.id}.jsonl")
+            self.jobs[job.id] = job
+            self._prune_finished()
+        threading.Thread(target=self._plan, args=(job,), daemon=True, name=f"job-plan-{job.id}").start()
+        self.log(f"任务 {job.id} 已提交: {source_dir} -> {target_dir}")
+        return job
+
+    def _plan(self, job: Job) -> None:
+        try:
+            files = job.engine.plan()
+        except Exception as e:
+            self._finish(job, JOB_FAILED, str(e))
+            return
+        with self._lock:
+            cancelled = job.status == JOB_CANCELLED
+            if not cancelled and files:
+                # 在锁内加入调度，避免与 cancel() 交错
+                job.status = JOB_RUNNING
+                job.scheduled = True
+                self.scheduler.add(job, files)
+        if cancelled or not files:
+            self._finish(job, JOB_CANCELLED if cancelled else JOB_COMPLETED)
+            return
+        self.log(f"任务 {job.id}: {len(files)} 个文件待处理")
+
+    def _worker(self) -> None:
+        while True:
+            task = self.scheduler.next_task()
+            if task is None:
+                return
+            job, file_path = task
+            try:
+                job.engine.process_file(file_path)
+            except Exception as e:
+                job.log(f"✗ 处理异常: {e}")
+            if self.scheduler.task_done(job):
+                self._finish(job, JOB_CANCELLED if job.status == JOB_CANCELLED else JOB_COMPLETED)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            if job.finished_at is not None:
+                return
+            job.finished_at = time.time()
+        try:
+            job.summary = job.engine.finish()
+        except Exception as e:
+            error = error or str(e)
+            status = JOB_FAILED
+        job.close_results()
+        # 已结束的任务只保留汇总，释放引擎（文件列表、内容去重表等）
+        job.engine = None
+        job.status = status
+        job.error = error
+        self.log(f"任务 {job.id} {status}: {json.dumps(job.to_dict(), ensure_ascii=False)}")
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务：不再派发新文件，在途文件处理完后结束；检查点保留，重新提交同一目录时继续"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES or job.finished_at is not None:
+                return job
+            job.status = JOB_CANCELLED
+            scheduled = job.scheduled
+            engine = job.engine
+        engine.stop()
+        # 仍在扫描的任务由 _plan 结束；已在调度中且没有在途文件时立即结束，否则由最后一个在途文件结束
+        if scheduled and self.scheduler.cancel(job):
+            self._finish(job, JOB_CANCELLED)
+        return job
+
+    def _prune_finished(self) -> None:
+        """只保留最近 max_finished_jobs 个已结束的任务"""
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job.id]
+            job.close_results(remove=True)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "in_flight": self.scheduler.in_flight(), "jobs": counts}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            self.cancel(job.id)
+        self.scheduler.close()
+        for thread in self._threads:
+            thread.join()
+        for job in jobs:
+            if job.finished_at is None and job.engine is not None:
+                self._finish(job, JOB_CANCELLED)
+        if self._owns_results_dir:
+            for job in jobs:
+                job.close_results()
+            shutil.rmtree(self.results_dir, ignore_errors=True)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """任务服务的 HTTP 接口（JSON）
+
+    GET  /jobs                  任务列表
+    POST /jobs                  提交任务 {"source": "...", "target": "...", "recursive": true}
+    GET  /jobs/<id>             任务进度（含最近的日志）
+    GET  /jobs/<id>/results     每个文件的结果，支持 ?offset=0&limit=500
+    POST /jobs/<id>/cancel      取消任务（DELETE /jobs/<id> 相同）
+    GET  /stats                 推理线程池和各状态的任务数
+    """
+
+    manager: JobManager = None
+    token: Optional[str] = None
+    max_results_per_page = 1000
+
+    def log_message(self, format: str, *args) -> None:
+        # 不逐条输出请求日志
+        pass
+
+    def _send_json(self, status: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def _authorized(self) -> bool:
+        if not self.token:
+            return True
+        if hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            return True
+        self._send_error(401, "未授权")
+        return False
+
+    def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        url = urlparse(self.path)
+        return [part for part in url.path.split("/") if part], parse_qs(url.query)
+
+    def _get_job(self, job_id: str) -> Optional[Job]:
+        job = self.manager.get_job(job_id)
+        if job is None:
+            self._send_error(404, f"任务不存在: {job_id}")
+        return job
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        parts, query = self._route()
+        if parts == ["jobs"]:
+            self._send_json(200, {"jobs": self.manager.list_jobs()})
+        elif parts == ["stats"]:
+            self._send_json(200, self.manager.get_stats())
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._get_job(parts[1])
+            if job is not None:
+                self._send_json(200, job.to_dict(include_logs=True))
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "results":
+            job = self._get_job(parts[1])
+            if job is None:
+                return
+            try:
+                offset = max(0, int(query.get("offset", ["0"])[0]))
+                limit = min(self.max_results_per_page, max(1, int(query.get("limit", ["500"])[0])))
+            except ValueError:
+                self._send_error(400, "offset 和 limit 必须是整数")
+                return
+            results = job.get_results(offset, limit)
+            self._send_json(200, {"offset": offset, "count": len(results), "total": job.result_count, "results": results})
+        else:
+            self._send_error(404, "接口不存在")
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        parts, _ = self._route()
+        if parts == ["jobs"]:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("请求体必须是 JSON 对象")
+                job = self.manager.submit(
+                    payload.get("source"),
+                    payload.get("target"),
+                    bool(payload.get("recursive", True))
+                )
+            except JobConflictError as e:
+                self._send_error(409, str(e))
+                return
+            except ValueError as e:
+                self._send_error(400, str(e))
+                return
+            self._send_json(201, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            self._cancel(parts[1])
+        else:
+            self._send_error(404, "接口不存在")
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            return
+        parts, _ = self._route()
+        if len(parts) == 2 and parts[0] == "jobs":
+            self._cancel(parts[1])
+        else:
+            self._send_error(404, "接口不存在")
+
+    def _cancel(self, job_id: str) -> None:
+        job = self.manager.cancel(job_id)
+        if job is None:
+            self._send_error(404, f"任务不存在: {job_id}")
+        else:
+            self._send_json(200, job.to_dict())
+
+
+def create_server(manager: JobManager, host: str, port: int, token: Optional[str] = None) -> ThreadingHTTPServer:
+    """创建 HTTP 服务（调用 serve_forever() 开始处理请求）"""
+    handler = type("BoundJobRequestHandler", (JobRequestHandler,), {"manager": manager, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,110 @@
+import threading
+import time
+from typing import Optional, Dict, List, Callable
+
+
+class ModelSlotAllocator:
+    """按模型的并发槽位分配器
+
+    选择模型和占用槽位在同一把锁内完成，所有模型都满时线程阻塞在条件变量上，
+    直到有槽位释放才被唤醒，不再固定休眠轮询，也不会超出单模型并发上限。
+    """
+
+    # 熔断冷却结束不会触发通知，等待时定期重新检查
+    RECHECK_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        models: List[str],
+        max_per_model: int = 2,
+        is_routable: Optional[Callable[[str], bool]] = None,
+        on_acquire: Optional[Callable[[str], None]] = None,
+        choose: Optional[Callable[[List[str], Dict[str, int]], str]] = None
+    ):
+        self._cond = threading.Condition()
+        self.models = list(models)
+        self.max_per_model = max(1, int(max_per_model))
+        self.active: Dict[str, int] = {model: 0 for model in self.models}
+        # 模型是否可参与分配（例如未熔断）
+        self.is_routable = is_routable or (lambda model: True)
+        # 模型被选中后的回调（例如占用熔断器的半开探测名额）
+        self.on_acquire = on_acquire
+        # 从有空闲槽位的模型中选择一个，默认选活跃请求最少的
+        self.choose = choose or (lambda free, active: min(free, key=lambda m: active.get(m, 0)))
+
+    def set_models(self, models: List[str]) -> None:
+        with self._cond:
+            self.models = list(models)
+            # 保留现有模型的计数，已移除但仍有在途请求的模型在释放时清理
+            self.active = {
+                model: count for model, count in self.active.items()
+                if model in self.models or count > 0
+            }
+            for model in self.models:
+                self.active.setdefault(model, 0)
+            self._cond.notify_all()
+
+    def set_max_per_model(self, max_per_model: int) -> None:
+        with self._cond:
+            self.max_per_model = max(1, int(max_per_model))
+            self._cond.notify_all()
+
+    def _select(self, exclude: Optional[set]) -> Optional[str]:
+        """在锁内选择一个有空闲槽位的可用模型，全部已满时返回None"""
+        pool = [model for model in self.models if not exclude or model not in exclude] or self.models
+        # 全部熔断时仍然分配，避免任务永久阻塞
+        healthy = [model for model in pool if self.is_routable(model)] or pool
+        free = [model for model in healthy if self.active.get(model, 0) < self.max_per_model]
+        if not free:
+            return None
+        return self.choose(free, self.active)
+
+    def _take(self, model: str) -> str:
+        self.active[model] = self.active.get(model, 0) + 1
+        if self.on_acquire:
+            self.on_acquire(model)
+        return model
+
+    def try_acquire(self, exclude: Optional[set] = None) -> Optional[str]:
+        with self._cond:
+            model = self._select(exclude)
+            return self._take(model) if model is not None else None
+
+    def acquire(self, exclude: Optional[set] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """阻塞直到某个模型有空闲槽位并原子地占用它，超时返回None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                model = self._select(exclude)
+                if model is not None:
+                    return self._take(model)
+                wait_time = self.RECHECK_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait_time = min(wait_time, remaining)
+                self._cond.wait(wait_time)
+
+    def force_acquire(self, model: str) -> str:
+        """不受上限约束地占用槽位（单模型模式只计数，由全局并发数控制）"""
+        with self._cond:
+            self.active[model] = self.active.get(model, 0) + 1
+            return model
+
+    def release(self, model: str) -> int:
+        """释放槽位，返回该模型剩余的在途请求数"""
+        with self._cond:
+            remaining = 0
+            if model in self.active:
+                self.active[model] = max(0, self.active[model] - 1)
+                remaining = self.active[model]
+                if remaining == 0 and model not in self.models:
+                    del self.active[model]
+            # 等待者的排除条件各不相同，全部唤醒各自重新选择
+            self._cond.notify_all()
+            return remaining
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self.active)
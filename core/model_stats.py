@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, List, Any
+
+# 模型路由策略
+ROUTING_LEAST_LOADED = "least_loaded"    # 活跃请求最少
+ROUTING_LEAST_LATENCY = "least_latency"  # 预期完成时间最短
+ROUTING_P2C = "p2c"                      # 随机取两个，选预期完成时间较短的
+ROUTING_POLICIES = (ROUTING_LEAST_LOADED, ROUTING_LEAST_LATENCY, ROUTING_P2C)
+
+
+class _ModelRecord:
+    def __init__(self, sample_size: int):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.completed = 0
+        self.failed = 0
+        self.finished_at = deque()
+        self.samples = deque(maxlen=sample_size)
+
+
+class ModelStats:
+    """按模型的在线统计
+
+    记录 EWMA 延迟、EWMA 错误率、最近时间窗口内的吞吐量，以及最近若干次成功请求
+    的延迟样本（用于计算分位数），供路由时估算各模型的预期完成时间。
+    """
+
+    def __init__(self, alpha: float = 0.2, window_seconds: float = 60.0, sample_size: int = 200):
+        self.alpha = alpha
+        self.window_seconds = window_seconds
+        self.sample_size = sample_size
+        self._records: Dict[str, _ModelRecord] = {}
+        self._lock = threading.Lock()
+
+    def _get_record(self, model: str) -> _ModelRecord:
+        record = self._records.get(model)
+        if record is None:
+            record = _ModelRecord(self.sample_size)
+            self._records[model] = record
+        return record
+
+    def _trim(self, record: _ModelRecord, now: float) -> None:
+        while record.finished_at and now - record.finished_at[0] > self.window_seconds:
+            record.finished_at.popleft()
+
+    def record(self, model: str, latency: float, success: bool) -> None:
+        """记录一次请求的延迟和结果"""
+        now = time.monotonic()
+        with self._lock:
+            record = self._get_record(model)
+            record.error_rate = record.error_rate * (1 - self.alpha) + (0.0 if success else 1.0) * self.alpha
+            if success:
+                record.completed += 1
+                record.finished_at.append(now)
+                record.samples.append(latency)
+                if record.latency is None:
+                    record.latency = latency
+                else:
+                    record.latency = record.latency * (1 - self.alpha) + latency * self.alpha
+            else:
+                record.failed += 1
+            self._trim(record, now)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """最近成功请求延迟的 q 分位数（0-1），样本不足时返回None"""
+        with self._lock:
+            record = self._records.get(model)
+            if record is None or len(record.samples) < 10:
+                return None
+            ordered = sorted(record.samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def expected_latency(self, model: str, active: int = 0) -> float:
+        """预期完成时间：EWMA 延迟 ×（排队数+1）÷ 成功率；没有数据的模型返回0，优先试探"""
+        with self._lock:
+            record = self._records.get(model)
+            if record is None or record.latency is None:
+                return 0.0
+            success_rate = max(0.05, 1.0 - record.error_rate)
+            return record.latency * (active + 1) / success_rate
+
+    def choose(self, candidates: List[str], active: Dict[str, int], policy: str = ROUTING_LEAST_LATENCY) -> str:
+        """按路由策略从候选模型中选择一个"""
+        if policy == ROUTING_LEAST_LOADED or len(candidates) == 1:
+            return min(candidates, key=lambda m: active.get(m, 0))
+        if policy == ROUTING_P2C and len(candidates) > 2:
+            candidates = random.sample(candidates, 2)
+        return min(
+            candidates,
+            key=lambda m: (self.expected_latency(m, active.get(m, 0)), active.get(m, 0))
+        )
+
+    def snapshot(self, model: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            record = self._get_record(model)
+            self._trim(record, now)
+            return {
+                "latency": record.latency,
+                "error_rate": record.error_rate,
+                "throughput": len(record.finished_at) / self.window_seconds,
+                "completed": record.completed,
+                "failed": record.failed
+            }
+
+    def format_stats(self, models: List[str], active: Optional[Dict[str, int]] = None) -> str:
+        """格式化为日志文本，每个模型一行"""
+        active = active or {}
+        lines = []
+        for model in models:
+            stats = self.snapshot(model)
+            latency = f"{stats['latency']:.1f}s" if stats["latency"] is not None else "-"
+            lines.append(
+                f"  {model}: 延迟 {latency}, 错误率 {stats['error_rate'] * 100:.0f}%, "
+                f"吞吐 {stats['throughput'] * 60:.1f}/分钟, 在途 {active.get(model, 0)}, "
+                f"成功 {stats['completed']}, 失败 {stats['failed']}"
+            )
+        return "\n".join(lines)
@@ -1,7 +1,8 @@
-import requests
 import json
+import re
 import time
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, List, Callable
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,7 +15,31 @@ from config import (
     DEFAULT_RETRY_ENABLED,
     DEFAULT_RETRY_COUNT,
     DEFAULT_RETRY_DELAY,
-    DEFAULT_REQUEST_TIMEOUT
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_NETWORK_API_MAX_CONCURRENT,
+    DEFAULT_RETRY_MAX_DELAY,
+    DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+    DEFAULT_CIRCUIT_BREAKER_COOLDOWN,
+    DEFAULT_NETWORK_API_ROUTING,
+    DEFAULT_HEDGE_ENABLED,
+    DEFAULT_HEDGE_BUDGET_PERCENT,
+    DEFAULT_NETWORK_STREAM_ENABLED,
+    DEFAULT_STRUCTURED_OUTPUT_ENABLED
+)
+from .http_session import PooledSession, CancelToken
+from .concurrency import AdaptiveConcurrencyLimiter
+from .rate_limiter import ModelRateLimiter
+from .retry_policy import CircuitBreaker, compute_backoff, is_retryable, parse_retry_after
+from .model_slots import ModelSlotAllocator
+from .model_stats import ModelStats
+from .hedging import HedgeBudget
+from .streaming import StreamAccumulator, StreamedResponse
+from .prompt_builder import PromptBuilder
+from .response_parser import get_response_parser, CONFIDENCE_HIGH
+from .output_schema import (
+    item_schema, indexed_schema, build_response_format, estimate_max_tokens, is_response_format_error,
+    payload_format_level,
+    UNCONSTRAINED_MAX_TOKENS, FORMAT_JSON_SCHEMA, FORMAT_JSON_OBJECT, FORMAT_NONE
 )
 
 
@@ -36,31 +61,105 @@ class NetworkClient:
         # Round robin settings
         round_robin: bool = True,
         # Model concurrency settings
-        model_max_concurrent: int = 2
+        model_max_concurrent: int = 2,
+        # Connection pool settings
+        pool_size: int = DEFAULT_NETWORK_API_MAX_CONCURRENT,
+        # Per-model RPM/TPM budgets
+        model_limits: Dict[str, Dict[str, Any]] = None,
+        # Backoff and circuit breaker settings
+        retry_max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+        circuit_breaker_threshold: int = DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+        circuit_breaker_cooldown: float = DEFAULT_CIRCUIT_BREAKER_COOLDOWN,
+        # Routing policy: least_loaded / least_latency / p2c
+        routing: str = DEFAULT_NETWORK_API_ROUTING,
+        # Hedged request settings
+        hedge_enabled: bool = DEFAULT_HEDGE_ENABLED,
+        hedge_budget_percent: float = DEFAULT_HEDGE_BUDGET_PERCENT,
+        # 流式响应：回答完整后提前断开
+        stream_enabled: bool = DEFAULT_NETWORK_STREAM_ENABLED,
+        # 输出约束：response_format 限定类别枚举，并按输出结构确定 max_tokens
+        structured_output_enabled: bool = DEFAULT_STRUCTURED_OUTPUT_ENABLED
     ):
         self.url = url.rstrip('/')
         self.api_key = api_key
         self.model = model
         self.models = models or [model]  # 多个模型列表
-        self.current_model_index = 0  # 当前模型索引
         self.round_robin = round_robin  # 是否启用轮询
-        self.categories = categories or CATEGORIES
-        self.prompt_template = prompt_template or DEFAULT_PROMPT
-        self.video_prompt_template = video_prompt_template or DEFAULT_VIDEO_PROMPT
+        self.routing = routing  # 多模型路由策略
+        # 按模型的延迟/错误率/吞吐量统计
+        self.model_stats = ModelStats()
+        # 提示词和输出约束按分类列表/模板预计算，每次请求只做查找
+        self.prompts = PromptBuilder(
+            categories or CATEGORIES,
+            prompt_template or DEFAULT_PROMPT,
+            video_prompt_template or DEFAULT_VIDEO_PROMPT
+        )
         # Retry settings
         self.retry_enabled = retry_enabled
         self.retry_count = retry_count
         self.retry_delay = retry_delay
         self.request_timeout = request_timeout
-        # Model concurrency settings
-        self.model_max_concurrent = model_max_concurrent  # 每个模型最大并发数
-        # 模型活跃请求计数
-        self.model_active_requests = {model: 0 for model in self.models}
+        self.retry_max_delay = retry_max_delay  # 指数退避的最大等待时间
+        # 每个模型一个熔断器，连续失败的模型暂时移出轮询
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_cooldown = circuit_breaker_cooldown
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        # 按模型的并发槽位：选择模型和占用槽位原子完成，满载时阻塞等待释放
+        self.slots = ModelSlotAllocator(
+            self.models,
+            max_per_model=model_max_concurrent,
+            is_routable=lambda m: self._get_breaker(m).is_available(),
+            on_acquire=lambda m: self._get_breaker(m).allow_request(),
+            choose=lambda free, active: self.model_stats.choose(free, active, self.routing)
+        )
         # 总请求计数
         self.total_request_count = 0
         # 线程锁，确保轮询时的线程安全
         import threading
         self.lock = threading.Lock()
+        # 共享的连接池会话，复用TCP/TLS连接
+        self.session = PooledSession(pool_size)
+        # AIMD自适应并发限制器（默认关闭）
+        self.concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+        # 按模型的 RPM/TPM 令牌桶
+        self.rate_limiter = ModelRateLimiter(model_limits)
+        # 对冲请求：超过模型 P95 延迟仍未返回时，向另一个模型发送副本
+        self.hedge_enabled = hedge_enabled
+        self.hedge_budget = HedgeBudget(hedge_budget_percent / 100.0)
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        # 流式响应：边接收边解析，出现完整的JSON（或只需要类别时出现类别）即断开连接
+        self.stream_enabled = stream_enabled
+        self.stream_requests = 0
+        self.stream_early_stops = 0
+        # 输出约束：每个模型支持的 response_format 级别（服务端拒绝时逐级降低），
+        # 以及回答被 max_tokens 截断过（例如思考模型）而不再限制 max_tokens 的模型
+        self.structured_output_enabled = structured_output_enabled
+        self._format_levels: Dict[str, int] = {}
+        self._uncapped_models = set()
+
+    @property
+    def categories(self) -> List[str]:
+        return self.prompts.categories
+
+    @categories.setter
+    def categories(self, categories: List[str]) -> None:
+        self.prompts.categories = categories
+
+    @property
+    def prompt_template(self) -> str:
+        return self.prompts.prompt_template
+
+    @prompt_template.setter
+    def prompt_template(self, template: str) -> None:
+        self.prompts.prompt_template = template
+
+    @property
+    def video_prompt_template(self) -> str:
+        return self.prompts.video_prompt_template
+
+    @video_prompt_template.setter
+    def video_prompt_template(self, template: str) -> None:
+        self.prompts.video_prompt_template = template
 
     def set_model(self, model: str) -> None:
         self.model = model
@@ -74,52 +173,60 @@ class NetworkClient:
     def set_api_key(self, api_key: str) -> None:
         self.api_key = api_key
 
+    def set_pool_size(self, pool_size: int) -> None:
+        """设置连接池大小（与全局最大并发数一致）"""
+        self.session.set_pool_size(pool_size)
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        return self.session.get_stats()
+
+    @property
+    def model_max_concurrent(self) -> int:
+        """每个模型最大并发数"""
+        return self.slots.max_per_model
+
+    @model_max_concurrent.setter
+    def model_max_concurrent(self, value: int) -> None:
+        self.slots.set_max_per_model(value)
+
+    @property
+    def model_active_requests(self) -> Dict[str, int]:
+        """模型活跃请求计数（快照）"""
+        return self.slots.snapshot()
+
     def set_models(self, models: List[str]) -> None:
-        """设置模型列表"""
+        """设置模型列表（保留现有模型的活跃请求计数）"""
         self.models = models or [self.model]
-        self.current_model_index = 0
-        # 更新模型活跃请求计数
-        new_active_requests = {model: 0 for model in self.models}
-        # 保留现有模型的计数
-        for model in new_active_requests:
-            if model in self.model_active_requests:
-                new_active_requests[model] = self.model_active_requests[model]
-        self.model_active_requests = new_active_requests
-
-    def get_next_model(self) -> str:
-        """获取下一个模型（轮询+随机+负载均衡）"""
-        import random
-        import time
-        if not self.round_robin or len(self.models) <= 1:
-            return self.model
-        
-        max_wait_attempts = 5
-        wait_time = 1
-        
-        for attempt in range(max_wait_attempts):
-            with self.lock:
-                # 首先尝试选择活跃请求数低于最大值的模型
-                available_models = [
-                    model for model in self.models 
-                    if self.model_active_requests.get(model, 0) < self.model_max_concurrent
-                ]
-                
-                if available_models:
-                    # 优先选择活跃请求数最少的模型
-                    available_models.sort(key=lambda m: self.model_active_requests.get(m, 0))
-                    return available_models[0]
-            
-            # 如果所有模型都达到最大并发，等待一段时间再重试
-            if attempt < max_wait_attempts - 1:
-                print(f"所有模型都达到最大并发数 ({self.model_max_concurrent})，等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                wait_time *= 2  # 指数退避
-        
-        # 如果等待后仍然没有可用模型，使用轮询选择
+        self.slots.set_models(self.models)
+
+    def format_model_stats(self) -> str:
+        return self.model_stats.format_stats(self.models, self.model_active_requests)
+
+    def _get_breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.circuit_breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(self.circuit_breaker_threshold, self.circuit_breaker_cooldown)
+            self.circuit_breakers[model] = breaker
+        return breaker
+
+    def _uses_slot_limit(self) -> bool:
+        """只有多模型轮询时才按模型限制并发；单模型时由全局并发数控制"""
+        return self.round_robin and len(self.models) > 1
+
+    def acquire_model(self, exclude: Optional[set] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """选择一个模型并占用其并发槽位（轮询+负载均衡，跳过熔断中的模型）
+
+        所有模型都达到最大并发数时阻塞，直到有槽位释放；超时返回None。
+        """
+        if self._uses_slot_limit():
+            model = self.slots.acquire(exclude, timeout)
+            if model is None:
+                return None
+        else:
+            model = self.slots.force_acquire(self.model)
         with self.lock:
-            model = self.models[self.current_model_index]
-            self.current_model_index = (self.current_model_index + 1) % len(self.models)
-            return model
+            self.total_request_count += 1
+        return model
 
     def is_available(self) -> bool:
         if not self.api_key:
@@ -141,28 +248,657 @@ class NetworkClient:
                 "max_tokens": 10
             }
             
-            response = requests.post(self.url, json=payload, headers=headers, timeout=10)
+            response = self.session.post(self.url, json=payload, headers=headers, timeout=10)
             return response.status_code == 200
         except Exception as e:
             print(f"网络连接失败: {str(e)}")
             return False
 
     def _build_prompt(self, is_video: bool = False, structured_output_prompt: str = "", rename_prompt: str = None) -> str:
-        categories_str = "、".join(self.categories)
-        
-        if is_video:
-            template = self.video_prompt_template
+        return self.prompts.build(is_video, structured_output_prompt, rename_prompt)
+
+    def _build_headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+    def output_constraints(
+        self,
+        with_description: bool,
+        count: int = 0,
+        nullable: bool = False,
+        constrained: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """本次请求的输出约束（JSON Schema 和 max_tokens）；count 大于0时为按编号返回的多项结果"""
+        if not self.structured_output_enabled or not constrained:
+            return None
+        return self.prompts.cached(
+            ("output", with_description, count, nullable),
+            lambda: self._build_output_constraints(with_description, count, nullable)
+        )
+
+    def _build_output_constraints(self, with_description: bool, count: int, nullable: bool) -> Dict[str, Any]:
+        if count:
+            schema = indexed_schema(self.categories, with_description, nullable)
         else:
-            template = self.prompt_template
+            schema = item_schema(self.categories, with_description)
+        return {
+            "schema": schema,
+            "max_tokens": estimate_max_tokens(self.categories, with_description, max(1, count)),
+            # 各约束级别的 response_format 也只生成一次
+            "formats": {
+                level: build_response_format(schema, level)
+                for level in (FORMAT_JSON_SCHEMA, FORMAT_JSON_OBJECT)
+            }
+        }
+
+    def _apply_output_constraints(self, payload: Dict[str, Any], output: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not output:
+            return payload
+        model = payload["model"]
+        with self.lock:
+            capped = model not in self._uncapped_models
+            level = self._format_levels.get(model, FORMAT_JSON_SCHEMA)
+        if capped:
+            payload["max_tokens"] = output["max_tokens"]
+        if level > FORMAT_NONE:
+            payload["response_format"] = output["formats"][level]
+        return payload
+
+    def _relax_output_constraints(self, model: str, response) -> bool:
+        """服务端拒绝 response_format 或回答被 max_tokens 截断时放宽该模型的约束，返回是否需要重新发送
+
+        多个线程同时收到同一模型的 400 时，只有发送时的级别仍是当前级别才降低一级，不会跳过 JSON 模式。
+        """
+        if response.status_code == 400:
+            # 其他原因的 400（图片过大、提示词错误等）按普通的不可重试错误处理，不影响后续请求的约束
+            if not is_response_format_error(response.text):
+                return False
+            sent_level = getattr(response, "format_level", FORMAT_JSON_SCHEMA)
+            with self.lock:
+                level = self._format_levels.get(model, FORMAT_JSON_SCHEMA)
+                relaxed = level == sent_level and level > FORMAT_NONE
+                if relaxed:
+                    self._format_levels[model] = level - 1
+            if relaxed:
+                fallback = "JSON 模式" if level - 1 == FORMAT_JSON_OBJECT else "提示词约束"
+                print(f"模型 {model} 不接受当前的 response_format (HTTP 400)，改用{fallback}重新请求")
+            # 其他线程已经降低过级别时按当前级别重新发送
+            return relaxed or level < sent_level
+        if response.status_code != 200:
+            return False
+        try:
+            finish_reason = response.json().get("choices", [{}])[0].get("finish_reason")
+        except ValueError:
+            return False
+        if finish_reason != "length":
+            return False
+        with self.lock:
+            if model in self._uncapped_models:
+                return False
+            self._uncapped_models.add(model)
+        print(f"模型 {model} 的回答超出 max_tokens 被截断（可能是思考模型），不再限制 max_tokens 重新请求")
+        return True
+
+    def _build_payload(
+        self,
+        model: str,
+        base64_image: str,
+        prompt: str,
+        output: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        return self._apply_output_constraints({
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{base64_image}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": UNCONSTRAINED_MAX_TOKENS,
+            "temperature": 0.3
+        }, output)
+
+    def _parse_response(self, result: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """解析成功（HTTP 200）的响应体"""
+        ai_response = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
         
-        prompt = template.replace("{categories}", categories_str)
+        # 打印AI返回的原始响应（用于调试）
+        print(f"AI返回结果 (模型: {model}):")
+        print(f"  原始响应: {ai_response[:200]}..." if len(ai_response) > 200 else f"  原始响应: {ai_response}")
         
-        if rename_prompt:
-            prompt = prompt + "\n\n" + rename_prompt
-            
-        return prompt + f"\n\n{structured_output_prompt}"
+        parsed = get_response_parser(self.categories).parse(ai_response)
+        return {
+            "success": True,
+            "category": parsed["category"],
+            "description": parsed["description"],
+            "confidence": parsed["confidence"],
+            "raw_response": ai_response,
+            "usage_tokens": self.get_usage_tokens(result)
+        }
+
+    def _build_batch_output_prompt(self, count: int, with_description: bool) -> str:
+        """批量请求的结构化输出要求：按图片编号返回JSON数组（放在 items 字段中）"""
+        if with_description:
+            item_format = '{"index": 图片编号, "category": "类别名称", "description": "简短描述"}'
+        else:
+            item_format = '{"index": 图片编号, "category": "类别名称"}'
+        return f"""- 下面依次给出 {count} 张图片，编号为 1 到 {count}，请分别对每张图片单独判断。
+- 只返回JSON，items 数组中每张图片一项，格式如下：{{"items": [{item_format}, ...]}}
+- 数组必须包含全部 {count} 张图片，index 与图片编号一一对应。
+- 类别必须且只能从指定列表中选择。
+- 不要包含任何其他文字，不要使用markdown代码块格式（不要使用```标记）。"""
+
+    def _build_batch_payload(
+        self,
+        model: str,
+        base64_images: List[str],
+        prompt: str,
+        output: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        content = [{"type": "text", "text": prompt}]
+        for index, base64_image in enumerate(base64_images, 1):
+            content.append({"type": "text", "text": f"图片 {index}:"})
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_image}"
+                }
+            })
+        return self._apply_output_constraints({
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "max_tokens": UNCONSTRAINED_MAX_TOKENS,
+            "temperature": 0.3
+        }, output)
+
+    def parse_indexed_categories(self, text: str, count: int) -> List[Optional[Dict[str, Any]]]:
+        """解析按编号（从1开始）返回的类别数组，缺失、重复或类别无效的项为None"""
+        items: List[Optional[Dict[str, Any]]] = [None] * count
+        parser = get_response_parser(self.categories)
+        cleaned = text.replace("```json", "").replace("```", "").strip()
+        entries = None
+        start, end = cleaned.find("["), cleaned.rfind("]")
+        if start != -1 and end > start:
+            try:
+                entries = json.loads(cleaned[start:end + 1])
+            except ValueError:
+                entries = None
+        if not isinstance(entries, list):
+            # 数组整体无法解析（例如被截断）时逐个提取其中完整的对象
+            entries = []
+            for match in re.finditer(r"\{[^{}]*\}", cleaned):
+                try:
+                    entries.append(json.loads(match.group(0)))
+                except ValueError:
+                    continue
+
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get("index", position + 1)) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < count or items[index] is not None:
+                continue
+            category = parser.normalize_category(entry.get("category"))
+            if category is None:
+                continue
+            item = {"category": category}
+            if entry.get("description"):
+                item["description"] = str(entry["description"])
+            items[index] = item
+        return items
+
+    def _parse_batch_response(self, result: Dict[str, Any], model: str, count: int) -> Dict[str, Any]:
+        ai_response = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+        print(f"AI批量返回结果 (模型: {model}, {count} 张):")
+        print(f"  原始响应: {ai_response[:200]}..." if len(ai_response) > 200 else f"  原始响应: {ai_response}")
+        return {
+            "success": True,
+            "items": self.parse_indexed_categories(ai_response, count),
+            "raw_response": ai_response,
+            "usage_tokens": self.get_usage_tokens(result)
+        }
+
+    def analyze_images_batch(
+        self,
+        base64_images: List[str],
+        is_video: bool = False,
+        structured_output_prompt: str = "",
+        rename_prompt: str = None,
+        constrained_output: bool = True
+    ) -> List[Dict[str, Any]]:
+        """一次请求识别多张图片，返回与输入顺序一致的结果列表
+
+        批量请求失败，或其中某些图片的结果缺失/无效时，这些图片单独重新请求。
+        constrained_output 只影响单独重新请求时是否使用输出约束（批量请求的输出格式总是内置的）。
+        """
+        count = len(base64_images)
+        if count == 1:
+            return [self.analyze_image(
+                base64_images[0], is_video, structured_output_prompt, rename_prompt, constrained_output
+            )]
+
+        prompt = self._build_prompt(
+            is_video, self._build_batch_output_prompt(count, bool(rename_prompt)), rename_prompt
+        )
+        output = self.output_constraints(bool(rename_prompt), count)
+        response = self._request(
+            lambda model: self._build_batch_payload(model, base64_images, prompt, output),
+            lambda result, model: self._parse_batch_response(result, model, count),
+            output=output
+        )
+        return self._resolve_indexed_results(
+            "批量请求", response, base64_images, is_video, structured_output_prompt, rename_prompt, constrained_output
+        )
+
+    def _build_contact_sheet_output_prompt(self, count: int, with_description: bool) -> str:
+        """联系表请求的结构化输出要求：按缩略图编号返回JSON数组（放在 items 字段中），不确定的返回null"""
+        if with_description:
+            item_format = '{"index": 编号, "category": "类别名称", "description": "简短描述"}'
+        else:
+            item_format = '{"index": 编号, "category": "类别名称"}'
+        return f"""- 这张图片是由 {count} 张独立照片的缩略图拼成的联系表，每张缩略图左上角的黄色标签是它的编号（1 到 {count}），请分别对每张缩略图单独判断。
+- 只返回JSON，items 数组中每张缩略图一项，格式如下：{{"items": [{item_format}, ...]}}
+- 数组必须包含全部 {count} 张缩略图，index 与编号一一对应。
+- 类别必须且只能从指定列表中选择；缩略图太小或无法确定类别时 category 填 null。
+- 不要包含任何其他文字，不要使用markdown代码块格式（不要使用```标记）。"""
+
+    def analyze_contact_sheet(
+        self,
+        sheet_base64: str,
+        base64_images: List[str],
+        structured_output_prompt: str = "",
+        rename_prompt: str = None,
+        constrained_output: bool = True
+    ) -> List[Dict[str, Any]]:
+        """用一张联系表（多张缩略图拼图）识别多张图片，返回与输入顺序一致的结果列表
+
+        模型无法确定或结果无效的缩略图，用原图单独重新请求。
+        """
+        count = len(base64_images)
+        prompt = self._build_prompt(
+            False, self._build_contact_sheet_output_prompt(count, bool(rename_prompt)), rename_prompt
+        )
+        output = self.output_constraints(bool(rename_prompt), count, nullable=True)
+        response = self._request(
+            lambda model: self._build_payload(model, sheet_base64, prompt, output),
+            lambda result, model: self._parse_batch_response(result, model, count),
+            output=output
+        )
+        return self._resolve_indexed_results(
+            "联系表请求", response, base64_images, False, structured_output_prompt, rename_prompt, constrained_output
+        )
+
+    def _resolve_indexed_results(
+        self,
+        label: str,
+        response: Dict[str, Any],
+        base64_images: List[str],
+        is_video: bool,
+        structured_output_prompt: str,
+        rename_prompt: Optional[str],
+        constrained_output: bool = True
+    ) -> List[Dict[str, Any]]:
+        """把按编号返回的结果展开为逐张结果，缺失或无效的图片单独重新请求"""
+        count = len(base64_images)
+        items = response["items"] if response.get("success") else [None] * count
+
+        missing = sum(1 for item in items if item is None)
+        if not response.get("success"):
+            print(f"{label} {count} 张失败 ({response.get('error')})，改为逐张单独请求")
+        elif missing:
+            print(f"{label} {count} 张，其中 {missing} 张结果缺失或无法确定，改为单独请求")
+
+        results = []
+        for base64_image, item in zip(base64_images, items):
+            if item is None:
+                results.append(self.analyze_image(
+                    base64_image, is_video, structured_output_prompt, rename_prompt, constrained_output
+                ))
+            else:
+                results.append({
+                    "success": True,
+                    "category": item["category"],
+                    "description": item.get("description"),
+                    "confidence": CONFIDENCE_HIGH,
+                    "raw_response": json.dumps(item, ensure_ascii=False)
+                })
+        return results
 
-    def analyze_image(self, base64_image: str, is_video: bool = False, structured_output_prompt: str = "", rename_prompt: str = None) -> Optional[Dict[str, Any]]:
+    def try_acquire_model(self, exclude: Optional[set] = None) -> Optional[str]:
+        """非阻塞地选择一个模型并占用其并发槽位，所有模型都已满时返回None"""
+        if self._uses_slot_limit():
+            model = self.slots.try_acquire(exclude)
+            if model is None:
+                return None
+        else:
+            model = self.slots.force_acquire(self.model)
+        with self.lock:
+            self.total_request_count += 1
+        return model
+
+    def release_model(self, model: str) -> None:
+        """释放模型的并发槽位"""
+        if self.slots.release(model) == 0:
+            # 半开探测请求可能没有记录结果就结束了（对冲中被取消），模型没有在途请求时释放探测名额
+            self._get_breaker(model).release_probe()
+
+    @staticmethod
+    def classify_status(status_code: int) -> str:
+        """将HTTP状态码归类为错误类型"""
+        if status_code == 200:
+            return "success"
+        if status_code == 429:
+            return "rate_limit"
+        if status_code >= 500:
+            return "server"
+        if status_code in (408, 504):
+            return "timeout"
+        return "client"
+
+    @staticmethod
+    def classify_exception(error: Exception) -> str:
+        """将请求异常归类为错误类型（兼容 requests 和 httpx 的异常）"""
+        if "timeout" in type(error).__name__.lower():
+            return "timeout"
+        return "network"
+
+    def enable_adaptive_concurrency(
+        self,
+        initial_limit: int,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        on_change=None
+    ) -> AdaptiveConcurrencyLimiter:
+        """启用AIMD自适应并发控制，连接池大小随上限放大"""
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=initial_limit,
+            min_limit=min_limit,
+            max_limit=max_limit,
+            on_change=on_change
+        )
+        self.session.set_pool_size(max(self.session.pool_size, max_limit))
+        return self.concurrency_limiter
+
+    @staticmethod
+    def get_usage_tokens(response_json: Dict[str, Any]) -> Optional[int]:
+        """从响应的 usage 字段读取本次请求消耗的总token数"""
+        usage = response_json.get("usage") or {}
+        total_tokens = usage.get("total_tokens")
+        if total_tokens is None and ("prompt_tokens" in usage or "completion_tokens" in usage):
+            total_tokens = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        return total_tokens
+
+    def set_model_limits(self, model_limits: Dict[str, Dict[str, Any]]) -> None:
+        """设置每个模型的 RPM/TPM 预算"""
+        self.rate_limiter.set_limits(model_limits)
+
+    def _post(
+        self,
+        payload: Dict[str, Any],
+        stop_on_category: bool = False,
+        cancel_token: Optional[CancelToken] = None
+    ):
+        """发送一次请求：先按模型的 RPM/TPM 预算预留额度，再受自适应并发上限约束"""
+        model = payload.get("model", self.model)
+        reserved_tokens = self.rate_limiter.acquire(model)
+        used_tokens = None
+        try:
+            response = self._send(payload, stop_on_category, cancel_token)
+            # 记录发送时的约束级别，放宽约束时据此判断是否已被其他线程降低过
+            response.format_level = payload_format_level(payload)
+            if response.status_code == 200:
+                used_tokens = self.get_usage_tokens(response.json())
+            return response
+        finally:
+            self.rate_limiter.record_usage(model, reserved_tokens, used_tokens)
+
+    def _send(
+        self,
+        payload: Dict[str, Any],
+        stop_on_category: bool = False,
+        cancel_token: Optional[CancelToken] = None
+    ):
+        """发送一次请求并记录模型的延迟和结果；启用自适应并发时受其上限约束"""
+        model = payload.get("model", self.model)
+        limiter = self.concurrency_limiter
+        if limiter is not None:
+            limiter.acquire()
+        stream = self.stream_enabled
+        start_time = time.time()
+        outcome = "network"
+        try:
+            response = self.session.post(
+                self.url,
+                json=self.with_stream_options(payload) if stream else payload,
+                headers=self._build_headers(),
+                timeout=self.request_timeout,
+                stream=stream,
+                cancel_token=cancel_token
+            )
+            outcome = self.classify_status(response.status_code)
+            if stream and response.status_code == 200:
+                return self._read_stream(response, stop_on_category)
+            return response
+        except Exception as e:
+            # 被取消的对冲请求只释放上限，不调整，也不计入延迟统计
+            outcome = "cancelled" if cancel_token is not None and cancel_token.cancelled else self.classify_exception(e)
+            raise
+        finally:
+            latency = time.time() - start_time
+            if outcome != "cancelled":
+                self.model_stats.record(model, latency, outcome == "success")
+            if limiter is not None:
+                limiter.release(latency, outcome)
+
+    def with_stream_options(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """启用流式响应时在请求中加入 stream 参数（并要求最后返回 usage）"""
+        if not self.stream_enabled:
+            return payload
+        return {**payload, "stream": True, "stream_options": {"include_usage": True}}
+
+    def new_stream_accumulator(self, stop_on_category: bool) -> StreamAccumulator:
+        return StreamAccumulator(self.categories, stop_on_category)
+
+    def record_stream(self, accumulator: StreamAccumulator) -> None:
+        with self.lock:
+            self.stream_requests += 1
+            if accumulator.early_stopped:
+                self.stream_early_stops += 1
+
+    def _read_stream(self, response, stop_on_category: bool) -> StreamedResponse:
+        """逐行读取 SSE 流，回答完整后立即关闭连接，不再等待模型生成剩余内容"""
+        accumulator = self.new_stream_accumulator(stop_on_category)
+        try:
+            for line in response.iter_lines(decode_unicode=False):
+                if line and accumulator.feed_line(line.decode("utf-8", errors="replace")):
+                    break
+        finally:
+            # 提前结束时未读完的连接无法复用，直接关闭
+            response.close()
+        self.record_stream(accumulator)
+        return StreamedResponse(
+            response.status_code, response.headers, accumulator.to_result(), accumulator.early_stopped
+        )
+
+    def format_stream_stats(self) -> str:
+        with self.lock:
+            return f"流式请求 {self.stream_requests} 次，回答完整后提前断开 {self.stream_early_stops} 次"
+
+    # 对冲等待时间取模型最近成功请求延迟的该分位数
+    HEDGE_PERCENTILE = 0.95
+
+    def set_hedging(self, enabled: bool, budget_percent: float = None) -> None:
+        self.hedge_enabled = enabled
+        if budget_percent is not None:
+            self.hedge_budget.ratio = max(0.0, budget_percent / 100.0)
+
+    def get_hedge_delay(self, model: str) -> Optional[float]:
+        """返回发送对冲请求前的等待秒数；未启用、只有一个模型或样本不足时返回None"""
+        if not self.hedge_enabled or not self._uses_slot_limit():
+            return None
+        return self.model_stats.percentile(model, self.HEDGE_PERCENTILE)
+
+    def try_acquire_hedge_model(self, model: str) -> Optional[str]:
+        """在预算允许时为对冲请求占用另一个模型的槽位，不阻塞"""
+        if not self.hedge_budget.try_spend():
+            return None
+        hedge_model = self.try_acquire_model(exclude={model})
+        if hedge_model is not None and hedge_model != model:
+            return hedge_model
+        if hedge_model is not None:
+            self.release_model(hedge_model)
+        self.hedge_budget.refund()
+        return None
+
+    def _post_hedged(
+        self,
+        model: str,
+        build_payload: Callable[[str], Dict[str, Any]],
+        stop_on_category: bool = False
+    ):
+        """发送请求，超过该模型 P95 延迟仍未返回时向另一个模型发送对冲请求
+
+        返回 (实际应答的模型, response)。调用方返回后持有应答模型的槽位；
+        另一个请求通过取消令牌关闭连接立即结束，其槽位、并发上限和速率额度随之释放。
+        """
+        payload = build_payload(model)
+        self.hedge_budget.record_request()
+        delay = self.get_hedge_delay(model)
+        if delay is None:
+            return model, self._post(payload, stop_on_category)
+
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=max(4, self.session.pool_size * 2))
+        primary_token = CancelToken()
+        primary = self._hedge_executor.submit(self._post, payload, stop_on_category, primary_token)
+        done, _ = wait([primary], timeout=delay)
+        hedge_model = None if done else self.try_acquire_hedge_model(model)
+        if hedge_model is None:
+            return model, primary.result()
+
+        print(f"模型 {model} 超过 P95 延迟 {delay:.1f} 秒未返回，向模型 {hedge_model} 发送对冲请求")
+        hedge_token = CancelToken()
+        hedge = self._hedge_executor.submit(self._post, build_payload(hedge_model), stop_on_category, hedge_token)
+        owners = {primary: model, hedge: hedge_model}
+        tokens = {primary: primary_token, hedge: hedge_token}
+        winner = None
+        pending = set(owners)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result().status_code == 200:
+                    winner = future
+                    break
+        # 两个请求都失败时按原请求的结果处理
+        winner = winner or primary
+        if winner is hedge:
+            self.hedge_budget.record_win()
+            print(f"对冲请求先返回 (模型: {hedge_model})")
+        for future, owner in owners.items():
+            if future is not winner:
+                tokens[future].cancel()
+                future.add_done_callback(lambda _, m=owner: self.release_model(m))
+        return owners[winner], winner.result()
+
+    def record_success(self, model: str) -> None:
+        if self._get_breaker(model).record_success():
+            print(f"模型 {model} 已恢复，重新加入轮询")
+
+    def plan_retry(
+        self,
+        model: str,
+        attempt: int,
+        max_attempts: int,
+        error_type: str,
+        retry_after: Optional[float] = None
+    ) -> Optional[float]:
+        """记录一次失败，返回重试前需要等待的秒数；不可重试或已无重试次数时返回None"""
+        # 限流说明服务繁忙而不是模型故障，不计入熔断，但要释放半开状态的探测名额
+        if error_type == "rate_limit":
+            self._get_breaker(model).release_probe()
+        else:
+            breaker = self._get_breaker(model)
+            if breaker.record_failure():
+                print(f"模型 {model} 连续失败 {breaker.consecutive_failures} 次，暂停使用 {breaker.cooldown:.0f} 秒")
+        if attempt >= max_attempts - 1 or not is_retryable(error_type):
+            return None
+        return compute_backoff(attempt, self.retry_delay, self.retry_max_delay, retry_after)
+
+    def _acquire_retry_model(self, failed_model: str) -> str:
+        """为重试选择模型（优先换一个模型）并占用其并发槽位"""
+        model = self.acquire_model(exclude={failed_model})
+        if model != failed_model:
+            print(f"切换到模型 {model} 重试")
+        return model
+
+    def analyze_image(
+        self,
+        base64_image: str,
+        is_video: bool = False,
+        structured_output_prompt: str = "",
+        rename_prompt: str = None,
+        constrained_output: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """识别单张图片；constrained_output 为False（使用自定义输出格式提示词）时不加输出约束"""
+        prompt = self._build_prompt(is_video, structured_output_prompt, rename_prompt)
+        output = self.output_constraints(bool(rename_prompt), constrained=constrained_output)
+        return self._request(
+            lambda model: self._build_payload(model, base64_image, prompt, output),
+            self._parse_response,
+            # 不需要描述时，流式响应中出现类别即可结束
+            stop_on_category=not rename_prompt,
+            output=output
+        )
+
+    def build_request_body(
+        self,
+        base64_image: str,
+        is_video: bool = False,
+        structured_output_prompt: str = "",
+        rename_prompt: str = None,
+        constrained_output: bool = True
+    ) -> Dict[str, Any]:
+        """单张图片识别请求的请求体（使用首选模型），用于离线批处理任务的 JSONL 文件"""
+        prompt = self._build_prompt(is_video, structured_output_prompt, rename_prompt)
+        output = self.output_constraints(bool(rename_prompt), constrained=constrained_output)
+        return self._build_payload(self.model, base64_image, prompt, output)
+
+    def parse_response_body(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """解析离线批处理结果中的响应体（与同步请求成功时的结果格式相同）"""
+        return self._parse_response(body, body.get("model") or self.model)
+
+    def _request(
+        self,
+        build_payload: Callable[[str], Dict[str, Any]],
+        parse: Callable[[Dict[str, Any], str], Dict[str, Any]],
+        stop_on_category: bool = False,
+        output: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """选择模型发送请求（含重试、换模型和对冲），成功时用 parse 解析响应体
+
+        使用输出约束（output）时，服务端拒绝 response_format 或回答被截断会放宽约束后立即重发一次。
+        """
         if not self.api_key:
             return {
                 "success": False,
@@ -171,109 +907,47 @@ class NetworkClient:
         
         max_attempts = self.retry_count + 1 if self.retry_enabled else 1
         
-        # 获取轮询模型
-        current_model = self.get_next_model()
-        
-        # 增加总请求计数和模型活跃请求计数
-        with self.lock:
-            self.total_request_count += 1
-            self.model_active_requests[current_model] = self.model_active_requests.get(current_model, 0) + 1
+        # 获取轮询模型并占用其并发槽位
+        current_model = self.acquire_model()
         
         print(f"网络API请求 (总次数: {self.total_request_count}) 使用模型: {current_model}")
         
         try:
             for attempt in range(max_attempts):
+                retry_after = None
                 try:
-                    prompt = self._build_prompt(is_video, structured_output_prompt, rename_prompt)
-                    
-                    headers = {
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {self.api_key}"
-                    }
-                    
-                    payload = {
-                        "model": current_model,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": prompt
-                                    },
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/jpeg;base64,{base64_image}"
-                                        }
-                                    }
-                                ]
-                            }
-                        ],
-                        "max_tokens": 4096,
-                        "temperature": 0.3
-                    }
-
-                    response = requests.post(
-                        self.url,
-                        json=payload,
-                        headers=headers,
-                        timeout=self.request_timeout
-                    )
+                    current_model, response = self._post_hedged(current_model, build_payload, stop_on_category)
+                    if output and self._relax_output_constraints(current_model, response):
+                        current_model, response = self._post_hedged(current_model, build_payload, stop_on_category)
 
                     if response.status_code == 200:
-                        result = response.json()
-                        ai_response = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-                        
-                        # 打印AI返回的原始响应（用于调试）
-                        print(f"AI返回结果 (模型: {current_model}):")
-                        print(f"  原始响应: {ai_response[:200]}..." if len(ai_response) > 200 else f"  原始响应: {ai_response}")
-                        
-                        category = self._extract_category(ai_response)
-                        return {
-                            "success": True,
-                            "category": category,
-                            "raw_response": ai_response
-                        }
-                    else:
-                        # 网络错误，可能需要重试
-                        error_msg = f"HTTP {response.status_code}: {response.text}"
-                        if attempt < max_attempts - 1:
-                            print(f"尝试 {attempt + 1}/{max_attempts} 失败: {error_msg}")
-                            print(f"等待 {self.retry_delay} 秒后重试...")
-                            time.sleep(self.retry_delay)
-                            continue
-                        return {
-                            "success": False,
-                            "error": error_msg
-                        }
+                        self.record_success(current_model)
+                        return parse(response.json(), current_model)
+                    error_msg = f"HTTP {response.status_code}: {response.text}"
+                    error_info = {
+                        "status_code": response.status_code,
+                        "error_type": self.classify_status(response.status_code)
+                    }
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
                 except Exception as e:
                     error_msg = str(e)
-                    if attempt < max_attempts - 1:
-                        print(f"尝试 {attempt + 1}/{max_attempts} 失败: {error_msg}")
-                        print(f"等待 {self.retry_delay} 秒后重试...")
-                        time.sleep(self.retry_delay)
-                        continue
+                    error_info = {"error_type": self.classify_exception(e)}
+
+                delay = self.plan_retry(current_model, attempt, max_attempts, error_info["error_type"], retry_after)
+                if delay is None:
                     return {
                         "success": False,
-                        "error": error_msg
+                        "error": error_msg,
+                        **error_info
                     }
+                print(f"尝试 {attempt + 1}/{max_attempts} 失败 ({error_info['error_type']}): {error_msg}")
+                print(f"等待 {delay:.1f} 秒后重试...")
+                # 等待期间释放模型槽位，重试时优先换一个模型
+                failed_model, current_model = current_model, None
+                self.release_model(failed_model)
+                time.sleep(delay)
+                current_model = self._acquire_retry_model(failed_model)
         finally:
             # 减少模型活跃请求计数（请求完全结束后减少）
-            with self.lock:
-                if current_model in self.model_active_requests:
-                    self.model_active_requests[current_model] = max(0, self.model_active_requests[current_model] - 1)
-
-    def _extract_category(self, ai_response: str) -> str:
-        response_lower = ai_response.lower()
-        
-        for category in self.categories:
-            if category in ai_response:
-                return category
-        
-        for category in self.categories:
-            category_lower = category.lower()
-            if category_lower in response_lower:
-                return category
-        
-        return self.categories[-1]
+            if current_model:
+                self.release_model(current_model)
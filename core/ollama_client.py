@@ -1,10 +1,18 @@
-import requests
-import json
-from typing import Optional, Dict, Any, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DEFAULT_OLLAMA_URL, DEFAULT_OLLAMA_MODEL, CATEGORIES, DEFAULT_PROMPT
+from config import (
+    DEFAULT_OLLAMA_URL, DEFAULT_OLLAMA_MODEL, CATEGORIES, DEFAULT_PROMPT, DEFAULT_VIDEO_PROMPT,
+    DEFAULT_MAX_CONCURRENT, DEFAULT_OLLAMA_KEEP_ALIVE, DEFAULT_OLLAMA_NUM_PREDICT
+)
+from .http_session import PooledSession
+from .ollama_pool import OllamaEndpointPool
+from .prompt_builder import PromptBuilder
+from .output_schema import item_schema
+from .response_parser import get_response_parser
 
 
 class OllamaClient:
@@ -13,12 +21,90 @@ class OllamaClient:
         url: str = DEFAULT_OLLAMA_URL, 
         model: str = DEFAULT_OLLAMA_MODEL,
         categories: List[str] = None,
-        prompt_template: str = None
+        prompt_template: str = None,
+        pool_size: int = DEFAULT_MAX_CONCURRENT,
+        video_prompt_template: str = None,
+        # 模型在显存中的保留时间（如 "30m"、"-1" 表示常驻），避免批次间被卸载
+        keep_alive: str = DEFAULT_OLLAMA_KEEP_ALIVE,
+        # 单次生成的最大token数，结构化输出只需要很短的回答
+        num_predict: int = DEFAULT_OLLAMA_NUM_PREDICT,
+        # 多个服务地址（为空时只使用 url）
+        urls: List[str] = None
     ):
-        self.url = url.rstrip('/')
+        # 单个服务地址；多个地址列表为空时回退到它
+        self.base_url = url.rstrip('/')
+        self.url = self.base_url
+        self.urls: List[str] = [self.url]
+        # 多个服务地址时的端点池（单个地址时为None）
+        self.endpoints: Optional[OllamaEndpointPool] = None
         self.model = model
-        self.categories = categories or CATEGORIES
-        self.prompt_template = prompt_template or DEFAULT_PROMPT
+        # 提示词和输出格式按分类列表/模板预计算，每次请求只做查找
+        self.prompts = PromptBuilder(
+            categories or CATEGORIES,
+            prompt_template or DEFAULT_PROMPT,
+            video_prompt_template or DEFAULT_VIDEO_PROMPT
+        )
+        self.keep_alive = keep_alive
+        self.num_predict = num_predict
+        # 服务端不支持 JSON Schema 格式约束（Ollama < 0.5）时退回 "json"
+        self._schema_format_supported = True
+        # 共享的连接池会话，复用TCP连接
+        self.session = PooledSession(pool_size)
+        self.set_urls(urls)
+
+    @property
+    def categories(self) -> List[str]:
+        return self.prompts.categories
+
+    @categories.setter
+    def categories(self, categories: List[str]) -> None:
+        self.prompts.categories = categories
+
+    @property
+    def prompt_template(self) -> str:
+        return self.prompts.prompt_template
+
+    @prompt_template.setter
+    def prompt_template(self, template: str) -> None:
+        self.prompts.prompt_template = template
+
+    @property
+    def video_prompt_template(self) -> str:
+        return self.prompts.video_prompt_template
+
+    @video_prompt_template.setter
+    def video_prompt_template(self, template: str) -> None:
+        self.prompts.video_prompt_template = template
+
+    def set_urls(self, urls: Optional[List[str]], base_url: Optional[str] = None) -> None:
+        """设置服务地址列表，多个地址时按端点池分配请求；列表为空时只用 base_url"""
+        if base_url:
+            self.base_url = base_url.strip().rstrip('/')
+        cleaned = []
+        for url in urls or []:
+            url = url.strip().rstrip('/')
+            if url and url not in cleaned:
+                cleaned.append(url)
+        if not cleaned:
+            cleaned = [self.base_url]
+        self.urls = cleaned
+        self.url = cleaned[0]
+        if len(cleaned) > 1:
+            self.endpoints = OllamaEndpointPool(cleaned, self._check_endpoint, self.session.pool_size)
+        else:
+            self.endpoints = None
+
+    def _check_endpoint(self, url: str) -> bool:
+        try:
+            response = self.session.get(f"{url}/api/tags", timeout=5)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    def format_endpoint_stats(self) -> str:
+        if self.endpoints is None:
+            return ""
+        return self.endpoints.format_stats()
 
     def set_model(self, model: str) -> None:
         self.model = model
@@ -29,16 +115,22 @@ class OllamaClient:
     def set_categories(self, categories: List[str]) -> None:
         self.categories = categories
 
+    def set_pool_size(self, pool_size: int) -> None:
+        self.session.set_pool_size(pool_size)
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        return self.session.get_stats()
+
     def is_available(self) -> bool:
         try:
-            response = requests.get(f"{self.url}/api/tags", timeout=10)
+            response = self.session.get(f"{self.url}/api/tags", timeout=10)
             return response.status_code == 200
         except Exception:
             return False
 
     def get_available_models(self) -> List[str]:
         try:
-            response = requests.get(f"{self.url}/api/tags", timeout=10)
+            response = self.session.get(f"{self.url}/api/tags", timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 models = []
@@ -49,58 +141,195 @@ class OllamaClient:
             pass
         return []
 
-    def _build_prompt(self) -> str:
-        categories_str = "、".join(self.categories)
-        return self.prompt_template.format(categories=categories_str)
+    def _build_prompt(self, is_video: bool = False, structured_output_prompt: str = "", rename_prompt: str = None) -> str:
+        return self.prompts.build(is_video, structured_output_prompt, rename_prompt)
 
-    def analyze_image(self, base64_image: str) -> Optional[Dict[str, Any]]:
-        try:
-            payload = {
-                "model": self.model,
-                "prompt": self._build_prompt(),
-                "images": [base64_image],
-                "stream": False,
-                "options": {
-                    "temperature": 0.3
+    def _build_format(self, with_description: bool) -> Any:
+        """输出格式约束：类别限定为枚举的 JSON Schema；旧版本服务端只约束为 JSON"""
+        if not self._schema_format_supported:
+            return "json"
+        return self.prompts.cached(
+            ("format", with_description),
+            lambda: item_schema(self.categories, with_description)
+        )
+
+    def _build_payload(self, base64_image: str, prompt: str, with_description: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt,
+                    "images": [base64_image]
                 }
+            ],
+            "stream": False,
+            "format": self._build_format(with_description),
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": self.num_predict
             }
+        }
 
-            response = requests.post(
-                f"{self.url}/api/generate",
-                json=payload,
-                timeout=120
-            )
+    def warm_up(self, timeout: int = 300) -> bool:
+        """预先加载模型到显存（空消息的 chat 请求只加载模型不生成），避免首批请求承担加载时间
 
-            if response.status_code == 200:
-                result = response.json()
-                ai_response = result.get("response", "").strip()
-                category = self._extract_category(ai_response)
+        多个服务地址时逐个预热，至少一个成功即返回True。
+        """
+        warmed = False
+        for url in self.urls:
+            try:
+                response = self.session.post(
+                    f"{url}/api/chat",
+                    json={"model": self.model, "messages": [], "keep_alive": self.keep_alive},
+                    timeout=timeout
+                )
+                if response.status_code == 200:
+                    warmed = True
+                else:
+                    print(f"Ollama 模型预热失败 ({url}): HTTP {response.status_code}")
+            except Exception as e:
+                print(f"Ollama 模型预热失败 ({url}): {e}")
+        return warmed
+
+    def probe_parallelism(self, url: str = None, max_parallel: int = 8) -> Optional[int]:
+        """探测服务端同时处理的请求数（OLLAMA_NUM_PARALLEL）
+
+        先测一个极短文本请求的耗时，再同时发出 max_parallel 个相同请求：
+        服务端每轮最多并行处理 N 个，总耗时约为 ceil(max_parallel / N) 轮。
+        """
+        url = url or self.url
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": "1"}],
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"num_predict": 1}
+        }
+
+        def timed_request() -> Optional[float]:
+            start_time = time.time()
+            try:
+                response = self.session.post(f"{url}/api/chat", json=payload, timeout=120)
+            except Exception:
+                return None
+            return time.time() - start_time if response.status_code == 200 else None
+
+        single = timed_request()
+        if not single:
+            return None
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            start_time = time.time()
+            results = list(executor.map(lambda _: timed_request(), range(max_parallel)))
+            elapsed = time.time() - start_time
+        if any(result is None for result in results):
+            return None
+        rounds = max(1, round(elapsed / single))
+        return max(1, min(max_parallel, -(-max_parallel // rounds)))
+
+    def discover_parallelism(self, configured: int = 0) -> Tuple[int, str]:
+        """确定服务端并行数，返回 (并行数, 来源)：设置 > 环境变量 OLLAMA_NUM_PARALLEL > 探测
+
+        多个服务地址时先做健康检查，再为每个可用端点分别确定并行数作为其并发上限，
+        返回所有可用端点的并行数之和。
+        """
+        if self.endpoints is None:
+            return self._discover_endpoint_parallelism(self.url, configured)
+
+        self.endpoints.check_health()
+        total = 0
+        sources = set()
+        for url in self.urls:
+            if not self.endpoints.endpoints[url].healthy:
+                continue
+            parallel, source = self._discover_endpoint_parallelism(url, configured)
+            self.endpoints.set_limit(url, parallel)
+            total += parallel
+            sources.add(source)
+        if total == 0:
+            return self.session.pool_size, "默认"
+        return total, "、".join(sorted(sources))
+
+    def _discover_endpoint_parallelism(self, url: str, configured: int) -> Tuple[int, str]:
+        if configured and configured > 0:
+            return configured, "设置"
+        env_value = os.environ.get("OLLAMA_NUM_PARALLEL", "")
+        if env_value.isdigit() and int(env_value) > 0:
+            return int(env_value), "环境变量 OLLAMA_NUM_PARALLEL"
+        probed = self.probe_parallelism(url)
+        if probed:
+            return probed, "探测"
+        return self.session.pool_size, "默认"
+
+    def _acquire_endpoint(self, exclude: set) -> Optional[str]:
+        if self.endpoints is None:
+            return self.url
+        return self.endpoints.acquire(exclude)
+
+    def _release_endpoint(self, url: str, success: bool) -> None:
+        if self.endpoints is not None:
+            self.endpoints.release(url, success)
+
+    def _post_chat(self, url: str, payload: Dict[str, Any], with_description: bool):
+        response = self.session.post(
+            f"{url}/api/chat",
+            json=payload,
+            timeout=120
+        )
+        if response.status_code == 400 and self._schema_format_supported and "format" in response.text:
+            print("Ollama 服务端不支持 JSON Schema 格式约束，改用 JSON 模式")
+            self._schema_format_supported = False
+            payload["format"] = self._build_format(with_description)
+            response = self.session.post(f"{url}/api/chat", json=payload, timeout=120)
+        return response
+
+    def analyze_image(
+        self,
+        base64_image: str,
+        is_video: bool = False,
+        structured_output_prompt: str = "",
+        rename_prompt: str = None
+    ) -> Optional[Dict[str, Any]]:
+        prompt = self._build_prompt(is_video, structured_output_prompt, rename_prompt)
+        with_description = bool(rename_prompt)
+        payload = self._build_payload(base64_image, prompt, with_description)
+
+        tried = set()
+        while True:
+            url = self._acquire_endpoint(tried)
+            if url is None:
                 return {
-                    "success": True,
-                    "category": category,
-                    "raw_response": ai_response
+                    "success": False,
+                    "error": "没有可用的 Ollama 服务"
                 }
-            else:
+
+            # 连接失败或 5xx 计为端点故障，换一个端点重试
+            endpoint_ok = False
+            try:
+                response = self._post_chat(url, payload, with_description)
+                endpoint_ok = response.status_code < 500
+                if response.status_code == 200:
+                    result = response.json()
+                    ai_response = result.get("message", {}).get("content", "").strip()
+                    parsed = get_response_parser(self.categories).parse(ai_response)
+                    return {
+                        "success": True,
+                        "category": parsed["category"],
+                        "description": parsed["description"],
+                        "confidence": parsed["confidence"],
+                        "raw_response": ai_response
+                    }
+                error = f"HTTP {response.status_code}"
+            except Exception as e:
+                error = str(e)
+            finally:
+                self._release_endpoint(url, endpoint_ok)
+
+            tried.add(url)
+            if endpoint_ok or self.endpoints is None or len(tried) >= len(self.urls):
                 return {
                     "success": False,
-                    "error": f"HTTP {response.status_code}"
+                    "error": error
                 }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e)
-            }
-
-    def _extract_category(self, ai_response: str) -> str:
-        response_lower = ai_response.lower()
-        
-        for category in self.categories:
-            if category in ai_response:
-                return category
-        
-        for category in self.categories:
-            category_lower = category.lower()
-            if category_lower in response_lower:
-                return category
-        
-        return self.categories[-1]
+            print(f"Ollama 服务 {url} 请求失败 ({error})，改用其他服务")
@@ -0,0 +1,160 @@
+import threading
+import time
+from typing import Optional, Dict, List, Callable
+
+
+class _Endpoint:
+    def __init__(self, url: str, limit: int):
+        self.url = url
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.completed = 0
+        self.failed = 0
+
+
+class OllamaEndpointPool:
+    """多个 Ollama 服务地址组成的端点池
+
+    每个端点有独立的并发上限，请求分配给负载（在途数/上限）最低的健康端点，
+    全部已满时阻塞等待释放。连续失败的端点被移出，之后定期用 /api/tags
+    检查健康状态，恢复后重新加入。
+    """
+
+    # 没有可用端点时，两次立即重新检查之间的最短间隔（秒）
+    URGENT_RECHECK_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        urls: List[str],
+        health_check: Callable[[str], bool],
+        limit_per_endpoint: int = 1,
+        failure_threshold: int = 2,
+        recheck_interval: float = 30.0
+    ):
+        self._cond = threading.Condition()
+        self.endpoints: Dict[str, _Endpoint] = {
+            url: _Endpoint(url, limit_per_endpoint) for url in urls
+        }
+        # 健康检查函数：传入服务地址，返回是否可用
+        self.health_check = health_check
+        self.failure_threshold = failure_threshold
+        self.recheck_interval = recheck_interval
+        self._last_recheck = time.monotonic()
+        self._rechecking = False
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self.endpoints)
+
+    def set_limit(self, url: str, limit: int) -> None:
+        with self._cond:
+            if url in self.endpoints:
+                self.endpoints[url].limit = max(1, int(limit))
+                self._cond.notify_all()
+
+    def check_health(self) -> None:
+        """检查所有端点，移出不可用的、重新加入已恢复的"""
+        results = {url: self.health_check(url) for url in self.urls}
+        with self._cond:
+            for url, healthy in results.items():
+                endpoint = self.endpoints.get(url)
+                if endpoint is None:
+                    continue
+                if healthy and not endpoint.healthy:
+                    print(f"Ollama 服务 {url} 已恢复，重新加入端点池")
+                elif not healthy and endpoint.healthy:
+                    print(f"Ollama 服务 {url} 健康检查失败，移出端点池")
+                endpoint.healthy = healthy
+                if healthy:
+                    endpoint.consecutive_failures = 0
+            self._last_recheck = time.monotonic()
+            self._cond.notify_all()
+
+    def _maybe_recheck(self, urgent: bool = False) -> bool:
+        """有端点被移出时按间隔重新检查（同一时间只有一个线程执行），返回是否执行了检查"""
+        interval = self.URGENT_RECHECK_INTERVAL if urgent else self.recheck_interval
+        with self._cond:
+            due = (
+                not self._rechecking
+                and any(not endpoint.healthy for endpoint in self.endpoints.values())
+                and time.monotonic() - self._last_recheck >= interval
+            )
+            if due:
+                self._rechecking = True
+        if not due:
+            return False
+        try:
+            self.check_health()
+        finally:
+            with self._cond:
+                self._rechecking = False
+        return True
+
+    def _select(self, exclude: Optional[set]) -> Optional[_Endpoint]:
+        candidates = [
+            endpoint for endpoint in self.endpoints.values()
+            if endpoint.healthy and endpoint.active < endpoint.limit
+            and (not exclude or endpoint.url not in exclude)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda endpoint: endpoint.active / endpoint.limit)
+
+    def acquire(self, exclude: Optional[set] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """占用负载最低的健康端点，返回其地址；没有可用端点或超时返回None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        urgent = False
+        while True:
+            rechecked = self._maybe_recheck(urgent)
+            with self._cond:
+                has_healthy = any(
+                    endpoint.healthy and (not exclude or endpoint.url not in exclude)
+                    for endpoint in self.endpoints.values()
+                )
+                if not has_healthy:
+                    if urgent or rechecked:
+                        return None
+                    # 全部端点都被移出时立即重新检查一次
+                    urgent = True
+                    continue
+                endpoint = self._select(exclude)
+                if endpoint is not None:
+                    endpoint.active += 1
+                    return endpoint.url
+                wait_time = self.recheck_interval
+                if deadline is not None:
+                    wait_time = min(wait_time, deadline - time.monotonic())
+                    if wait_time <= 0:
+                        return None
+                self._cond.wait(wait_time)
+
+    def release(self, url: str, success: bool = True) -> None:
+        """释放端点；连续失败达到阈值的端点被移出，等待健康检查恢复"""
+        with self._cond:
+            endpoint = self.endpoints.get(url)
+            if endpoint is None:
+                return
+            endpoint.active = max(0, endpoint.active - 1)
+            if success:
+                endpoint.completed += 1
+                endpoint.consecutive_failures = 0
+            else:
+                endpoint.failed += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.healthy and endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.healthy = False
+                    print(f"Ollama 服务 {url} 连续失败 {endpoint.consecutive_failures} 次，移出端点池")
+            self._cond.notify_all()
+
+    def format_stats(self) -> str:
+        with self._cond:
+            lines = []
+            for endpoint in self.endpoints.values():
+                state = "正常" if endpoint.healthy else "已移出"
+                lines.append(
+                    f"  {endpoint.url}: {state}, 并发上限 {endpoint.limit}, "
+                    f"成功 {endpoint.completed}, 失败 {endpoint.failed}"
+                )
+            return "\n".join(lines)
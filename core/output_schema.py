@@ -0,0 +1,91 @@
+from typing import Dict, Any, List
+
+
+# 估算 max_tokens 时描述的长度（字符），与重命名时截取的描述长度一致
+DESCRIPTION_MAX_LENGTH = 20
+
+# 不限制输出格式时使用的 max_tokens
+UNCONSTRAINED_MAX_TOKENS = 4096
+
+# response_format 约束级别：服务端拒绝时逐级降低
+FORMAT_JSON_SCHEMA = 2
+FORMAT_JSON_OBJECT = 1
+FORMAT_NONE = 0
+
+# HTTP 400 的错误信息包含这些关键词时才认为是不支持 response_format（其他 400 如图片过大不降级）
+RESPONSE_FORMAT_ERROR_KEYWORDS = ("response_format", "json_schema", "json_object")
+
+
+def is_response_format_error(error_text: str) -> bool:
+    text = (error_text or "").lower()
+    return any(keyword in text for keyword in RESPONSE_FORMAT_ERROR_KEYWORDS)
+
+
+def payload_format_level(payload: Dict[str, Any]) -> int:
+    """请求体中 response_format 对应的约束级别"""
+    response_format = payload.get("response_format")
+    if not response_format:
+        return FORMAT_NONE
+    return FORMAT_JSON_SCHEMA if response_format.get("type") == "json_schema" else FORMAT_JSON_OBJECT
+
+
+def item_schema(categories: List[str], with_description: bool, indexed: bool = False, nullable: bool = False) -> Dict[str, Any]:
+    """单个识别结果的 JSON Schema：类别限定为当前分类列表的枚举"""
+    category = {"type": "string", "enum": list(categories)}
+    if nullable:
+        category = {"anyOf": [category, {"type": "null"}]}
+    properties: Dict[str, Any] = {}
+    required = []
+    if indexed:
+        properties["index"] = {"type": "integer"}
+        required.append("index")
+    properties["category"] = category
+    required.append("category")
+    if with_description:
+        properties["description"] = {"type": "string"}
+        required.append("description")
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": required,
+        "additionalProperties": False
+    }
+
+
+def indexed_schema(categories: List[str], with_description: bool, nullable: bool = False) -> Dict[str, Any]:
+    """按编号返回多个结果的 JSON Schema（顶层必须是对象，数组放在 items 字段中）
+
+    只使用各服务商严格模式都支持的关键字（enum/required/anyOf），不限制数组长度和字符串长度。
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "items": {
+                "type": "array",
+                "items": item_schema(categories, with_description, indexed=True, nullable=nullable)
+            }
+        },
+        "required": ["items"],
+        "additionalProperties": False
+    }
+
+
+def build_response_format(schema: Dict[str, Any], level: int = FORMAT_JSON_SCHEMA) -> Dict[str, Any]:
+    """OpenAI 兼容接口的 response_format 参数"""
+    if level >= FORMAT_JSON_SCHEMA:
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "classification", "strict": True, "schema": schema}
+        }
+    return {"type": "json_object"}
+
+
+def estimate_max_tokens(categories: List[str], with_description: bool, count: int = 1) -> int:
+    """按输出结构估算 max_tokens：每个中文字符按 2 个token、每项 JSON 结构按 16 个token估算，再留出余量"""
+    longest_category = max((len(category) for category in categories), default=4)
+    per_item = 16 + longest_category * 2
+    if with_description:
+        per_item += 8 + DESCRIPTION_MAX_LENGTH * 2
+    if count > 1:
+        per_item += 8  # index 字段
+    return min(UNCONSTRAINED_MAX_TOKENS, per_item * count + 32)
@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Callable, Iterable
+
+# 队列中表示上游已结束的标记
+_END = object()
+
+
+class Stage:
+    """流水线中的一个阶段：独立的线程池和输入队列
+
+    func 接收上一阶段的任务并返回交给下一阶段的任务；任务带有结果（finished 判断为真）时
+    跳过后续阶段直接输出。队列有上限，下游处理不过来时上游阻塞（背压），内存占用有界。
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int, queue_size: int = 0):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue_size = queue_size or self.workers * 2
+        self.input: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self._lock = threading.Lock()
+        self._remaining_workers = self.workers
+
+    def record(self, busy: float, blocked: float) -> None:
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += busy
+            self.blocked_seconds += blocked
+
+    def worker_finished(self) -> bool:
+        """线程退出时调用，返回是否是本阶段最后一个退出的线程"""
+        with self._lock:
+            self._remaining_workers -= 1
+            return self._remaining_workers == 0
+
+
+class StagedPipeline:
+    """多阶段流水线：扫描 → 指纹/规则检查 → 解码 → 识别 → 移动/入库
+
+    每个阶段有独立大小的线程池（磁盘、CPU、网络分别按各自的瓶颈设置），阶段之间用有界队列连接。
+    结果由调用 run() 的线程逐个取出处理，停止时各阶段丢弃尚未处理的任务并尽快退出。
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        finished: Callable[[Any], bool],
+        on_error: Callable[[Any, Exception], Any],
+        should_stop: Callable[[], bool] = lambda: False,
+        output_size: int = 64
+    ):
+        self.stages = stages
+        self.finished = finished
+        self.on_error = on_error
+        self.should_stop = should_stop
+        self.output: "queue.Queue[Any]" = queue.Queue(maxsize=output_size)
+        self._threads: List[threading.Thread] = []
+
+    def _put(self, target: "queue.Queue[Any]", item: Any) -> float:
+        """放入队列（队列满时阻塞，停止时放弃），返回阻塞的时间"""
+        start = time.monotonic()
+        while True:
+            try:
+                target.put(item, timeout=0.1)
+                return time.monotonic() - start
+            except queue.Full:
+                if self.should_stop() and item is not _END:
+                    return time.monotonic() - start
+
+    def _feed(self, items: Iterable[Any]) -> None:
+        first = self.stages[0]
+        try:
+            for item in items:
+                if self.should_stop():
+                    break
+                self._put(first.input, item)
+        finally:
+            for _ in range(first.workers):
+                self._put(first.input, _END)
+
+    def _run_stage(self, index: int) -> None:
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        next_queue = self.output if is_last else self.stages[index + 1].input
+        while True:
+            item = stage.input.get()
+            if item is _END:
+                break
+            if self.should_stop():
+                continue
+            start = time.monotonic()
+            try:
+                item = stage.func(item)
+            except Exception as e:
+                item = self.on_error(item, e)
+            busy = time.monotonic() - start
+            # 已有结果的任务跳过后续阶段
+            target = self.output if self.finished(item) else next_queue
+            stage.record(busy, self._put(target, item))
+        if stage.worker_finished():
+            if is_last:
+                self._put(self.output, _END)
+            else:
+                for _ in range(self.stages[index + 1].workers):
+                    self._put(next_queue, _END)
+
+    def run(self, items: Iterable[Any]) -> Iterable[Any]:
+        """启动各阶段并逐个产出结果（生成器），所有阶段结束后返回"""
+        self._threads = [threading.Thread(target=self._feed, args=(items,), daemon=True, name="pipeline-feed")]
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                self._threads.append(threading.Thread(
+                    target=self._run_stage, args=(index,), daemon=True, name=f"pipeline-{stage.name}-{n}"
+                ))
+        for thread in self._threads:
+            thread.start()
+        while True:
+            item = self.output.get()
+            if item is _END:
+                break
+            yield item
+        for thread in self._threads:
+            thread.join()
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": stage.name,
+                "workers": stage.workers,
+                "queue_size": stage.queue_size,
+                "processed": stage.processed,
+                "avg_seconds": stage.busy_seconds / stage.processed if stage.processed else None,
+                # 下游队列已满时等待的时间，较大说明下游阶段是瓶颈
+                "blocked_seconds": stage.blocked_seconds
+            }
+            for stage in self.stages
+        ]
+
+    def format_stats(self) -> str:
+        lines = []
+        for stats in self.get_stats():
+            line = f"  {stats['name']}: {stats['workers']} 线程，处理 {stats['processed']} 个"
+            if stats["avg_seconds"] is not None:
+                line += f"，平均 {stats['avg_seconds'] * 1000:.0f} ms"
+            if stats["blocked_seconds"] > 0:
+                line += f"，等待下游 {stats['blocked_seconds']:.1f} 秒"
+            lines.append(line)
+        return "\n".join(lines)
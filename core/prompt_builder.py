@@ -0,0 +1,68 @@
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+
+class PromptBuilder:
+    """识别提示词和请求模板的预计算缓存
+
+    提示词由模板（填入分类列表）、重命名提示词和结构化输出要求依次拼接，
+    一次运行中只随“图片/视频 × 是否重命名”等少数组合变化：每种组合首次使用时渲染，
+    之后每次请求只需一次字典查找。分类列表或模板变化时清空缓存。
+    提示词全部是固定文本，并放在请求中图片之前，便于服务端的提示词前缀缓存命中。
+    """
+
+    def __init__(self, categories: List[str], prompt_template: str, video_prompt_template: str):
+        self._categories = list(categories)
+        self._prompt_template = prompt_template
+        self._video_prompt_template = video_prompt_template
+        self._cache: Dict[Tuple, Any] = {}
+
+    @property
+    def categories(self) -> List[str]:
+        return self._categories
+
+    @categories.setter
+    def categories(self, categories: List[str]) -> None:
+        self._categories = list(categories)
+        self._cache = {}
+
+    @property
+    def prompt_template(self) -> str:
+        return self._prompt_template
+
+    @prompt_template.setter
+    def prompt_template(self, template: str) -> None:
+        self._prompt_template = template
+        self._cache = {}
+
+    @property
+    def video_prompt_template(self) -> str:
+        return self._video_prompt_template
+
+    @video_prompt_template.setter
+    def video_prompt_template(self, template: str) -> None:
+        self._video_prompt_template = template
+        self._cache = {}
+
+    def cached(self, key: Tuple, factory: Callable[[], Any]) -> Any:
+        """按 key 缓存由分类列表/模板派生的内容（例如输出约束），随提示词一起失效"""
+        cache = self._cache
+        value = cache.get(key)
+        if value is None:
+            value = factory()
+            cache[key] = value
+        return value
+
+    def build(self, is_video: bool = False, structured_output_prompt: str = "", rename_prompt: Optional[str] = None) -> str:
+        return self.cached(
+            ("prompt", is_video, structured_output_prompt, rename_prompt),
+            lambda: self._render(is_video, structured_output_prompt, rename_prompt)
+        )
+
+    def _render(self, is_video: bool, structured_output_prompt: str, rename_prompt: Optional[str]) -> str:
+        template = self._video_prompt_template if is_video else self._prompt_template
+        parts = [template.replace("{categories}", "、".join(self._categories))]
+        if rename_prompt:
+            parts.append(rename_prompt)
+        if structured_output_prompt:
+            parts.append(structured_output_prompt)
+        return "\n\n".join(parts)
@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+
+
+class TokenBucket:
+    """按分钟额度匀速补充的令牌桶，允许预留后出现欠额（欠额需等待补足）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """预留令牌，返回需要等待的秒数"""
+        self._refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def adjust(self, amount: float, now: float) -> None:
+        """归还（正数）或追加扣除（负数）令牌"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelRateLimiter:
+    """按模型的 RPM / TPM 速率限制器
+
+    每个模型两个令牌桶：请求数和 token 数。发送前按预估 token 数预留额度，
+    收到响应后用响应中 usage 的实际 token 数修正，使实际用量保持在预算以内。
+    """
+
+    # 没有历史用量时单次图片请求的预估 token 数
+    DEFAULT_TOKEN_ESTIMATE = 1500
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None, safety_factor: float = 0.9):
+        # 预算按安全系数打折，留出余量避免触发服务端限流
+        self.safety_factor = safety_factor
+        self._lock = threading.Lock()
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        self._token_estimates: Dict[str, float] = {}
+        self.set_limits(limits or {})
+
+    def set_limits(self, limits: Dict[str, Dict[str, Any]]) -> None:
+        """设置模型预算，格式: {模型名: {"rpm": 每分钟请求数, "tpm": 每分钟token数}}，0 表示不限"""
+        with self._lock:
+            self.limits = {model: dict(budget) for model, budget in (limits or {}).items()}
+            self._request_buckets = {}
+            self._token_buckets = {}
+            for model, budget in self.limits.items():
+                rpm = float(budget.get("rpm") or 0) * self.safety_factor
+                tpm = float(budget.get("tpm") or 0) * self.safety_factor
+                if rpm > 0:
+                    self._request_buckets[model] = TokenBucket(rpm)
+                if tpm > 0:
+                    self._token_buckets[model] = TokenBucket(tpm)
+
+    def has_limits(self, model: str) -> bool:
+        return model in self._request_buckets or model in self._token_buckets
+
+    def reserve(self, model: str) -> Tuple[float, float]:
+        """预留一次请求的额度，返回 (需要等待的秒数, 预留的token数)"""
+        with self._lock:
+            if not self.has_limits(model):
+                return 0.0, 0.0
+            now = time.monotonic()
+            wait_time = 0.0
+            request_bucket = self._request_buckets.get(model)
+            if request_bucket:
+                wait_time = max(wait_time, request_bucket.reserve(1, now))
+            estimate = 0.0
+            token_bucket = self._token_buckets.get(model)
+            if token_bucket:
+                estimate = self._token_estimates.get(model, self.DEFAULT_TOKEN_ESTIMATE)
+                wait_time = max(wait_time, token_bucket.reserve(estimate, now))
+            return wait_time, estimate
+
+    def acquire(self, model: str) -> float:
+        """阻塞直到额度可用，返回预留的token数（用于之后的 record_usage）"""
+        wait_time, estimate = self.reserve(model)
+        if wait_time > 0:
+            print(f"模型 {model} 接近速率限制预算，等待 {wait_time:.1f} 秒")
+            time.sleep(wait_time)
+        return estimate
+
+    def record_usage(self, model: str, reserved_tokens: float, actual_tokens: Optional[float]) -> None:
+        """用实际用量修正预留额度；请求失败（无 usage）时归还预留的 token"""
+        with self._lock:
+            token_bucket = self._token_buckets.get(model)
+            if token_bucket is None:
+                return
+            now = time.monotonic()
+            if actual_tokens is None:
+                token_bucket.adjust(reserved_tokens, now)
+                return
+            token_bucket.adjust(reserved_tokens - actual_tokens, now)
+            # 预估值跟随实际用量
+            previous = self._token_estimates.get(model, actual_tokens)
+            self._token_estimates[model] = previous * 0.8 + actual_tokens * 0.2
@@ -0,0 +1,184 @@
+import json
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+from .streaming import JSONStreamScanner
+
+# 类别识别的可信程度
+CONFIDENCE_HIGH = "high"      # JSON 中的类别字段是有效类别
+CONFIDENCE_MEDIUM = "medium"  # 文本中只出现了一个类别
+CONFIDENCE_LOW = "low"        # 文本中出现了多个类别，或没有找到类别（使用最后一个类别兜底）
+
+# 从非 JSON 回答中提取描述时的最大长度（字符）
+DESCRIPTION_MAX_LENGTH = 20
+
+_THINK_BLOCK = re.compile(r"<think>.*?(</think>|$)", re.S)
+_QUOTED = re.compile(r'["\']([^"\']+)["\']')
+_CHINESE_RUN = re.compile(r"[\u4e00-\u9fa5]{2,10}")
+
+
+class CategoryMatcher:
+    """由类别名称构建的 Aho-Corasick 自动机（不区分大小写）
+
+    一次扫描找出文本中出现的所有类别，不再对每个类别分别做子串查找。
+    """
+
+    def __init__(self, categories: List[str]):
+        self.categories = list(categories)
+        # 每个节点：子节点表、失败指针、在该节点结束的类别序号
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        for index, category in enumerate(self.categories):
+            if category:
+                self._insert(category.lower(), index)
+        self._build_failure_links()
+
+    def _insert(self, word: str, index: int) -> None:
+        node = 0
+        for char in word:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(index)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                # 第一层节点的失败指针指向根节点
+                self._fail[child] = 0 if fail == child else fail
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回所有出现位置 (起点, 终点, 类别序号)"""
+        matches = []
+        node = 0
+        for position, char in enumerate(text.lower()):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for index in self._output[node]:
+                end = position + 1
+                matches.append((end - len(self.categories[index]), end, index))
+        return matches
+
+    def match(self, text: str) -> Tuple[Optional[str], int]:
+        """返回最先出现的类别（同一位置取最长的）和出现的不同类别数
+
+        被更长类别包含的匹配（例如“人物合照”中的“人物”）不单独计数。
+        """
+        selected = []
+        covered_until = -1
+        for start, end, index in sorted(self.find_all(text), key=lambda m: (m[0], m[0] - m[1])):
+            if end <= covered_until:
+                continue
+            selected.append(index)
+            covered_until = end
+        if not selected:
+            return None, 0
+        return self.categories[selected[0]], len(set(selected))
+
+
+class ResponseParser:
+    """识别结果的统一解析：一次得到类别、描述和可信程度
+
+    先尝试严格的 JSON（整段或回答中第一个完整的 JSON 对象），类别字段有效即为高可信；
+    否则用预先构建的类别匹配器扫描回答文本（跳过 <think> 思考内容）。
+    """
+
+    def __init__(self, categories: List[str]):
+        self.categories = list(categories)
+        self._category_set = set(self.categories)
+        self._lower_map = {category.lower(): category for category in self.categories}
+        self.matcher = CategoryMatcher(self.categories)
+
+    def normalize_category(self, value: Any) -> Optional[str]:
+        """把 JSON 中的类别值映射为有效类别（忽略大小写，或值中包含唯一的类别名称），无效时返回None"""
+        if not isinstance(value, str):
+            return None
+        value = value.strip()
+        if value in self._category_set:
+            return value
+        category = self._lower_map.get(value.lower())
+        if category is not None:
+            return category
+        category, distinct = self.matcher.match(value)
+        return category if distinct == 1 else None
+
+    @staticmethod
+    def load_json_object(text: str) -> Optional[Dict[str, Any]]:
+        """整段是 JSON 对象时直接解析，否则取其中第一个完整的 JSON 对象（跳过代码块标记和思考内容）"""
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None
+            scanner = JSONStreamScanner()
+            candidate = scanner.feed(text)
+            if candidate:
+                try:
+                    parsed = json.loads(candidate)
+                except ValueError:
+                    parsed = None
+        if isinstance(parsed, list) and len(parsed) == 1:
+            parsed = parsed[0]
+        return parsed if isinstance(parsed, dict) else None
+
+    def parse(self, text: str, with_description: bool = True) -> Dict[str, Any]:
+        """返回 {"category", "description", "confidence"}；没有找到类别时使用最后一个类别"""
+        text = (text or "").strip()
+        parsed = self.load_json_object(text)
+        if parsed is not None:
+            category = self.normalize_category(parsed.get("category"))
+            if category is not None:
+                description = parsed.get("description") if with_description else None
+                if description is not None:
+                    description = str(description).strip() or None
+                return {"category": category, "description": description, "confidence": CONFIDENCE_HIGH}
+
+        answer = _THINK_BLOCK.sub("", text)
+        category, distinct = self.matcher.match(answer)
+        if category is None:
+            category, confidence = self.categories[-1], CONFIDENCE_LOW
+        else:
+            confidence = CONFIDENCE_MEDIUM if distinct == 1 else CONFIDENCE_LOW
+        description = self._extract_description(answer, parsed) if with_description else None
+        return {"category": category, "description": description, "confidence": confidence}
+
+    def _extract_description(self, text: str, parsed: Optional[Dict[str, Any]]) -> Optional[str]:
+        """从不是标准 JSON 的回答中尽量提取描述"""
+        if parsed is not None and parsed.get("description"):
+            return str(parsed["description"]).strip()
+        cleaned = text.replace("```json", "").replace("```", "").strip()
+        # 引号中的内容（排除类别名称和JSON字段名）
+        for match in _QUOTED.findall(cleaned):
+            if len(match) <= 30 and match not in self._category_set and match not in ("category", "description"):
+                return match[:DESCRIPTION_MAX_LENGTH]
+        # 连续的中文字符（排除类别名称）
+        for match in _CHINESE_RUN.findall(cleaned):
+            if match not in self._category_set:
+                return match[:DESCRIPTION_MAX_LENGTH]
+        cleaned = "".join(char for char in cleaned if not char.isspace())
+        return cleaned[:DESCRIPTION_MAX_LENGTH] or None
+
+
+@lru_cache(maxsize=16)
+def _cached_parser(categories: Tuple[str, ...]) -> ResponseParser:
+    return ResponseParser(list(categories))
+
+
+def get_response_parser(categories: List[str]) -> ResponseParser:
+    """按类别列表缓存的解析器，同一类别列表只构建一次匹配器"""
+    return _cached_parser(tuple(categories))
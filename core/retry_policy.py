@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# 可以重试的错误类型；client（4xx，除 408/429 外）重试也不会成功
+RETRYABLE_ERROR_TYPES = ("rate_limit", "server", "timeout", "network")
+
+
+def is_retryable(error_type: str) -> bool:
+    return error_type in RETRYABLE_ERROR_TYPES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），返回等待秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def compute_backoff(
+    attempt: int,
+    base_delay: float,
+    max_delay: float,
+    retry_after: Optional[float] = None
+) -> float:
+    """指数退避 + 全抖动；服务端给出 Retry-After 时以其为下限"""
+    ceiling = min(max_delay, base_delay * (2 ** attempt))
+    delay = random.uniform(base_delay / 2, max(ceiling, base_delay / 2))
+    if retry_after is not None:
+        # 在 Retry-After 基础上加少量抖动，避免所有请求同时恢复
+        delay = max(delay, retry_after + random.uniform(0, max(0.1, retry_after * 0.1)))
+    return delay
+
+
+class CircuitBreaker:
+    """单个模型的熔断器
+
+    连续失败达到阈值后熔断（open），冷却期内不再分配请求；冷却结束进入半开
+    （half_open）只放行一个探测请求，成功则恢复，失败则以加倍的冷却时间再次熔断。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """是否可以向该模型分配请求（半开状态只放行一个探测请求）"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def is_available(self) -> bool:
+        """只读检查，不占用半开状态的探测名额"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not self._probe_in_flight
+
+    def record_success(self) -> bool:
+        """记录成功，返回是否从熔断中恢复"""
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.cooldown = self.base_cooldown
+            self._probe_in_flight = False
+            return recovered
+
+    def record_failure(self) -> bool:
+        """记录失败，返回是否因此触发熔断"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.state == self.OPEN or self.consecutive_failures < self.failure_threshold:
+                return False
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+            return True
+
+    def release_probe(self) -> None:
+        """探测请求结束但没有记录成功或失败（限流、对冲中被取消）时调用，释放半开状态的探测名额
+
+        不释放时 is_available() 会一直返回False，模型在本次运行中不再参与轮询。
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
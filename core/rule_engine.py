@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from .response_parser import CONFIDENCE_HIGH
+
+# EXIF 中相机厂商（Make）字段的标签号
+EXIF_MAKE_TAG = 271
+
+# 常见的屏幕分辨率（横向），截图和录屏的尺寸通常与之一致（竖屏时宽高互换）
+SCREEN_RESOLUTIONS = [
+    (1280, 720), (1280, 800), (1366, 768), (1440, 900), (1536, 864), (1600, 900),
+    (1680, 1050), (1920, 1080), (1920, 1200), (2560, 1440), (2560, 1600),
+    (2880, 1800), (3024, 1964), (3456, 2234), (3840, 2160),
+    # 手机
+    (1334, 750), (1792, 828), (2208, 1242), (2436, 1125), (2532, 1170), (2556, 1179),
+    (2688, 1242), (2778, 1284), (2796, 1290), (2340, 1080), (2400, 1080),
+    (2460, 1080), (2640, 1200), (3200, 1440)
+]
+
+
+class FileFacts:
+    """规则判断用到的文件信息，按需读取且只读取一次
+
+    文件名和扩展名直接从路径得到；尺寸和 EXIF 只读取文件头（不解码像素），
+    只有规则用到时才读取。
+    """
+
+    def __init__(self, file_path: str, is_video: bool):
+        self.file_path = file_path
+        self.is_video = is_video
+        self.filename = os.path.basename(file_path)
+        self.extension = os.path.splitext(file_path)[1].lower()
+        self._header_loaded = False
+        self._size: Optional[Tuple[int, int]] = None
+        self._camera_make: Optional[str] = None
+
+    @property
+    def size(self) -> Optional[Tuple[int, int]]:
+        self._load_header()
+        return self._size
+
+    @property
+    def camera_make(self) -> Optional[str]:
+        self._load_header()
+        return self._camera_make
+
+    def _load_header(self) -> None:
+        if self._header_loaded:
+            return
+        self._header_loaded = True
+        try:
+            if self.is_video:
+                import cv2
+                cap = cv2.VideoCapture(self.file_path)
+                try:
+                    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                finally:
+                    cap.release()
+                if width and height:
+                    self._size = (width, height)
+            else:
+                from PIL import Image
+                # Image.open 只解析文件头，不解码像素数据
+                with Image.open(self.file_path) as img:
+                    self._size = img.size
+                    make = img.getexif().get(EXIF_MAKE_TAG)
+                    if make:
+                        self._camera_make = str(make).strip("\x00 ").strip() or None
+        except Exception as e:
+            print(f"读取文件信息失败: {self.file_path}, 错误: {e}")
+
+
+class ClassificationRule:
+    """一条预分类规则：所有已配置的条件都满足时把文件直接归入 category
+
+    可用条件：
+    - media: "image" 或 "video"
+    - extensions: 扩展名列表，例如 [".png"]
+    - filename: 文件名正则（不区分大小写，re.search）
+    - no_camera_exif: 为 true 时要求没有 EXIF 相机厂商字段
+    - screen_size: 为 true 时要求尺寸是常见屏幕分辨率（可用 sizes 指定 [[宽, 高], ...]）
+    - min_ratio / max_ratio: 长边与短边之比的范围
+    """
+
+    def __init__(self, rule: Dict[str, Any]):
+        self.category = str(rule.get("category") or "").strip()
+        if not self.category:
+            raise ValueError("规则缺少 category")
+        self.name = str(rule.get("name") or self.category)
+        self.media = rule.get("media")
+        if self.media not in (None, "image", "video"):
+            raise ValueError(f"无效的 media: {self.media}")
+        self.extensions = {ext.lower() if ext.startswith(".") else "." + ext.lower()
+                           for ext in rule.get("extensions") or []}
+        self.filename = re.compile(rule["filename"], re.I) if rule.get("filename") else None
+        self.no_camera_exif = bool(rule.get("no_camera_exif"))
+        self.sizes = None
+        if rule.get("screen_size") or rule.get("sizes"):
+            sizes = rule.get("sizes") or SCREEN_RESOLUTIONS
+            self.sizes = {tuple(sorted((int(w), int(h)))) for w, h in sizes}
+        self.min_ratio = float(rule["min_ratio"]) if rule.get("min_ratio") else None
+        self.max_ratio = float(rule["max_ratio"]) if rule.get("max_ratio") else None
+
+    @property
+    def needs_header(self) -> bool:
+        return self.no_camera_exif or self.sizes is not None or self.min_ratio is not None or self.max_ratio is not None
+
+    def matches(self, facts: FileFacts) -> bool:
+        # 先判断只依赖路径的条件，都满足时才读取文件头
+        if self.media is not None and (self.media == "video") != facts.is_video:
+            return False
+        if self.extensions and facts.extension not in self.extensions:
+            return False
+        if self.filename is not None and not self.filename.search(facts.filename):
+            return False
+        if not self.needs_header:
+            return True
+        if self.no_camera_exif and facts.camera_make:
+            return False
+        size = facts.size
+        if size is None or min(size) <= 0:
+            return self.sizes is None and self.min_ratio is None and self.max_ratio is None
+        if self.sizes is not None and tuple(sorted(size)) not in self.sizes:
+            return False
+        ratio = max(size) / min(size)
+        if self.min_ratio is not None and ratio < self.min_ratio:
+            return False
+        if self.max_ratio is not None and ratio > self.max_ratio:
+            return False
+        return True
+
+
+class RuleEngine:
+    """在解码和AI识别之前按文件名、尺寸、EXIF 等信息预分类
+
+    规则按顺序检查，命中第一条即采用其类别；类别不在当前分类列表中的规则被忽略。
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], categories: List[str]):
+        self.rules: List[ClassificationRule] = []
+        self.ignored: List[str] = []
+        for rule in rules or []:
+            try:
+                compiled = ClassificationRule(rule)
+            except (ValueError, TypeError, KeyError, re.error) as e:
+                self.ignored.append(f"{rule.get('name', rule) if isinstance(rule, dict) else rule}（{e}）")
+                continue
+            if compiled.category not in categories:
+                self.ignored.append(f"{compiled.name}（类别“{compiled.category}”不在分类列表中）")
+                continue
+            self.rules.append(compiled)
+        self.checked = 0
+        self.hits = {rule.name: 0 for rule in self.rules}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rules)
+
+    def match(self, file_path: str, is_video: bool) -> Optional[ClassificationRule]:
+        if not self.rules:
+            return None
+        facts = FileFacts(file_path, is_video)
+        matched = next((rule for rule in self.rules if rule.matches(facts)), None)
+        with self._lock:
+            self.checked += 1
+            if matched is not None:
+                self.hits[matched.name] += 1
+        return matched
+
+    def classify(self, file_path: str, is_video: bool) -> Optional[Dict[str, Any]]:
+        """命中规则时返回与AI识别结果相同格式的结果，否则返回None"""
+        rule = self.match(file_path, is_video)
+        if rule is None:
+            return None
+        return {
+            "success": True,
+            "category": rule.category,
+            "description": None,
+            "confidence": CONFIDENCE_HIGH,
+            "raw_response": f"规则: {rule.name}",
+            "rule": rule.name
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total_hits = sum(self.hits.values())
+            return {
+                "checked": self.checked,
+                "hits": total_hits,
+                "hit_rate": total_hits / self.checked if self.checked else 0.0,
+                "rules": dict(self.hits)
+            }
+
+    def format_stats(self) -> str:
+        stats = self.get_stats()
+        text = (
+            f"检查 {stats['checked']} 个，命中 {stats['hits']} 个（{stats['hit_rate'] * 100:.1f}%），"
+            f"命中的文件跳过了解码和AI识别"
+        )
+        details = [f"{name} {count}" for name, count in stats["rules"].items()]
+        if details:
+            text += "；" + "，".join(details)
+        return text
+
+
+def format_rules(rules: List[Dict[str, Any]]) -> str:
+    """规则列表转为设置界面中的文本（每行一条 JSON）"""
+    return "\n".join(json.dumps(rule, ensure_ascii=False) for rule in rules or [])
+
+
+def parse_rules(text: str) -> List[Dict[str, Any]]:
+    """解析设置界面中的规则文本，每行一条 JSON 对象，无法解析的行被忽略"""
+    rules = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rule = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(rule, dict):
+            rules.append(rule)
+    return rules
@@ -0,0 +1,112 @@
+import os
+import heapq
+from typing import Dict, List, Callable, Optional
+
+# 调度策略
+POLICY_PATH = "path"                    # 按路径排序，图片在前、视频在后（扫描顺序）
+POLICY_LONGEST_FIRST = "longest_first"  # 按估计耗时从长到短，缩短整体完成时间
+POLICY_INTERLEAVE = "interleave"        # 视频均匀穿插在图片之间，CPU（抽帧）和网络同时忙碌
+POLICY_LOCALITY = "locality"            # 按目录分组，同一目录的图片和视频连续处理
+
+SCHEDULING_POLICIES = {
+    POLICY_PATH: "按路径顺序（图片在前、视频在后）",
+    POLICY_LONGEST_FIRST: "耗时长的先处理（按视频时长、文件大小估计）",
+    POLICY_INTERLEAVE: "图片和视频交替处理",
+    POLICY_LOCALITY: "按目录分组处理"
+}
+
+# 耗时估计（以一张普通图片的处理时间为 1）
+IMAGE_BASE_COST = 1.0
+IMAGE_COST_PER_MB = 0.1      # 大图解码和缩放更慢
+VIDEO_BASE_COST = 2.0        # 打开视频和抽帧的固定开销
+VIDEO_COST_PER_MINUTE = 0.5  # 抽帧时跳转的距离随时长增加
+VIDEO_COST_PER_MB = 0.02     # 无法读取时长时按文件大小估计
+
+
+class CostEstimator:
+    """按文件类型、大小和视频时长估计单个文件的处理耗时（相对值）"""
+
+    def __init__(self, is_video: Callable[[str], bool], probe_video_duration: bool = True):
+        self.is_video = is_video
+        self.probe_video_duration = probe_video_duration
+
+    @staticmethod
+    def video_duration(file_path: str) -> Optional[float]:
+        """只读取容器信息得到视频时长（秒），失败时返回None"""
+        try:
+            import cv2
+            cap = cv2.VideoCapture(file_path)
+            try:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            finally:
+                cap.release()
+            if fps > 0 and frames > 0:
+                return frames / fps
+        except Exception:
+            pass
+        return None
+
+    @staticmethod
+    def file_size_mb(file_path: str) -> float:
+        try:
+            return os.path.getsize(file_path) / (1024 * 1024)
+        except OSError:
+            return 0.0
+
+    def estimate(self, file_path: str) -> float:
+        size_mb = self.file_size_mb(file_path)
+        if not self.is_video(file_path):
+            return IMAGE_BASE_COST + size_mb * IMAGE_COST_PER_MB
+        duration = self.video_duration(file_path) if self.probe_video_duration else None
+        if duration is not None:
+            return VIDEO_BASE_COST + duration / 60 * VIDEO_COST_PER_MINUTE
+        return VIDEO_BASE_COST + size_mb * VIDEO_COST_PER_MB
+
+
+def interleave(images: List[str], videos: List[str]) -> List[str]:
+    """把视频均匀分布到图片之间（保持各自原有顺序）"""
+    total = len(images) + len(videos)
+    ordered = []
+    image_index = video_index = 0
+    for position in range(total):
+        # 每段的开头放一个视频，避免最后一个视频拖到队尾
+        take_video = video_index < len(videos) and (
+            image_index >= len(images) or video_index * total <= position * len(videos)
+        )
+        if take_video:
+            ordered.append(videos[video_index])
+            video_index += 1
+        else:
+            ordered.append(images[image_index])
+            image_index += 1
+    return ordered
+
+
+def order_files(
+    files: List[str],
+    policy: str,
+    is_video: Callable[[str], bool],
+    cost: Optional[Callable[[str], float]] = None
+) -> List[str]:
+    """按调度策略排列待处理文件；cost 只在 longest_first 时使用"""
+    if policy == POLICY_LONGEST_FIRST:
+        estimate = cost or CostEstimator(is_video).estimate
+        costs: Dict[str, float] = {file_path: estimate(file_path) for file_path in files}
+        return sorted(files, key=lambda file_path: -costs[file_path])
+    if policy == POLICY_INTERLEAVE:
+        images = [file_path for file_path in files if not is_video(file_path)]
+        videos = [file_path for file_path in files if is_video(file_path)]
+        return interleave(images, videos)
+    if policy == POLICY_LOCALITY:
+        return sorted(files, key=lambda file_path: (os.path.dirname(file_path), os.path.basename(file_path)))
+    return list(files)
+
+
+def simulate_makespan(ordered: List[str], cost: Callable[[str], float], workers: int) -> float:
+    """模拟 workers 个并发槽位按顺序领取任务（空闲即领取下一个）时的整体完成时间"""
+    slots = [0.0] * max(1, workers)
+    for file_path in ordered:
+        start = heapq.heappop(slots)
+        heapq.heappush(slots, start + cost(file_path))
+    return max(slots)
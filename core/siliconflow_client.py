@@ -1,5 +1,3 @@
-import requests
-import json
 from typing import Optional, Dict, Any, List
 import sys
 import os
@@ -8,8 +6,11 @@ from config import (
     DEFAULT_SILICONFLOW_URL, 
     DEFAULT_SILICONFLOW_MODEL, 
     CATEGORIES, 
-    DEFAULT_PROMPT
+    DEFAULT_PROMPT,
+    DEFAULT_NETWORK_API_MAX_CONCURRENT
 )
+from .http_session import PooledSession
+from .response_parser import get_response_parser
 
 
 class SiliconFlowClient:
@@ -19,13 +20,16 @@ class SiliconFlowClient:
         api_key: str = "",
         model: str = DEFAULT_SILICONFLOW_MODEL,
         categories: List[str] = None,
-        prompt_template: str = None
+        prompt_template: str = None,
+        pool_size: int = DEFAULT_NETWORK_API_MAX_CONCURRENT
     ):
         self.url = url.rstrip('/')
         self.api_key = api_key
         self.model = model
         self.categories = categories or CATEGORIES
         self.prompt_template = prompt_template or DEFAULT_PROMPT
+        # 共享的连接池会话，复用TCP/TLS连接
+        self.session = PooledSession(pool_size)
 
     def set_model(self, model: str) -> None:
         self.model = model
@@ -39,6 +43,12 @@ class SiliconFlowClient:
     def set_api_key(self, api_key: str) -> None:
         self.api_key = api_key
 
+    def set_pool_size(self, pool_size: int) -> None:
+        self.session.set_pool_size(pool_size)
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        return self.session.get_stats()
+
     def is_available(self) -> bool:
         if not self.api_key:
             return False
@@ -59,7 +69,7 @@ class SiliconFlowClient:
                 "max_tokens": 10
             }
             
-            response = requests.post(self.url, json=payload, headers=headers, timeout=10)
+            response = self.session.post(self.url, json=payload, headers=headers, timeout=10)
             return response.status_code == 200
         except Exception:
             return False
@@ -106,7 +116,7 @@ class SiliconFlowClient:
                 "temperature": 0.3
             }
 
-            response = requests.post(
+            response = self.session.post(
                 self.url,
                 json=payload,
                 headers=headers,
@@ -116,10 +126,12 @@ class SiliconFlowClient:
             if response.status_code == 200:
                 result = response.json()
                 ai_response = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-                category = self._extract_category(ai_response)
+                parsed = get_response_parser(self.categories).parse(ai_response)
                 return {
                     "success": True,
-                    "category": category,
+                    "category": parsed["category"],
+                    "description": parsed["description"],
+                    "confidence": parsed["confidence"],
                     "raw_response": ai_response
                 }
             else:
@@ -132,17 +144,3 @@ class SiliconFlowClient:
                 "success": False,
                 "error": str(e)
             }
-
-    def _extract_category(self, ai_response: str) -> str:
-        response_lower = ai_response.lower()
-        
-        for category in self.categories:
-            if category in ai_response:
-                return category
-        
-        for category in self.categories:
-            category_lower = category.lower()
-            if category_lower in response_lower:
-                return category
-        
-        return self.categories[-1]
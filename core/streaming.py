@@ -0,0 +1,181 @@
+import json
+import re
+from typing import Optional, Dict, Any, List
+
+
+class JSONStreamScanner:
+    """逐段扫描模型输出，找到第一个完整的顶层 JSON 值（对象或数组）
+
+    跟踪括号深度和字符串/转义状态，不需要等待整个回答结束；
+    <think>...</think> 中的思考内容会被跳过。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_think = False
+        self.result: Optional[str] = None
+
+    @property
+    def started(self) -> bool:
+        return self._start >= 0
+
+    @property
+    def in_think(self) -> bool:
+        return self._in_think
+
+    @property
+    def json_text(self) -> str:
+        """已收到的 JSON 部分（可能还不完整）"""
+        return self.text[self._start:] if self._start >= 0 else ""
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """追加一段输出，出现完整的 JSON 值时返回其文本"""
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            if self._in_think:
+                end = text.find("</think>", self._pos)
+                if end < 0:
+                    # 保留可能被截断的结束标签，等下一段再找
+                    self._pos = max(self._pos, len(text) - len("</think>") + 1)
+                    return None
+                self._in_think = False
+                self._pos = end + len("</think>")
+                continue
+
+            char = text[self._pos]
+            if self._start < 0:
+                if char == "<":
+                    if text.startswith("<think>", self._pos):
+                        self._in_think = True
+                        self._pos += len("<think>")
+                        continue
+                    if "<think>".startswith(text[self._pos:]):
+                        # 可能是被截断的 <think> 标签
+                        return None
+                elif char in "{[":
+                    self._start = self._pos
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.result = text[self._start:self._pos]
+                    return self.result
+        return None
+
+
+class StreamAccumulator:
+    """解析 OpenAI 兼容接口的 SSE 流，拼接回答内容并判断是否可以提前结束
+
+    出现完整的 JSON 值即可结束；只需要类别时（stop_on_category），
+    JSON 中的 "category" 字段或单独一行的类别名称一出现就结束。
+    """
+
+    _CATEGORY_FIELD = re.compile(r'"category"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+    def __init__(self, categories: List[str], stop_on_category: bool = False):
+        self.categories = categories
+        self.stop_on_category = stop_on_category
+        self.scanner = JSONStreamScanner()
+        self.usage: Optional[Dict[str, Any]] = None
+        self.finish_reason: Optional[str] = None
+        self.done = False
+        self.early_stopped = False
+
+    @property
+    def content(self) -> str:
+        return self.scanner.text
+
+    def feed_line(self, line: str) -> bool:
+        """处理一行 SSE 数据，返回是否已经可以结束读取"""
+        line = line.strip()
+        if not line.startswith("data:"):
+            return self.done
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            self.done = True
+            return True
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return self.done
+
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            # 思考模型的 reasoning_content 不参与解析
+            text = delta.get("content")
+            if text and not self.early_stopped:
+                if self.scanner.feed(text) is not None or self._category_complete():
+                    self.early_stopped = True
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+        if self.early_stopped or self.finish_reason:
+            self.done = True
+        return self.done
+
+    def _category_complete(self) -> bool:
+        if not self.stop_on_category:
+            return False
+        if self.scanner.started:
+            match = self._CATEGORY_FIELD.search(self.scanner.json_text)
+            return bool(match) and match.group(1) in self.categories
+        if self.scanner.in_think:
+            return False
+        # 不是JSON回答时，思考内容之后已经完整输出的某一行恰好是类别名称
+        answer = self.scanner.text.rsplit("</think>", 1)[-1]
+        lines = answer.split("\n")[:-1]
+        return any(line.strip(" \t\r*`。.：:") in self.categories for line in lines)
+
+    def to_result(self) -> Dict[str, Any]:
+        """组装成与非流式响应相同结构的响应体"""
+        result = {
+            "choices": [{
+                "message": {"role": "assistant", "content": self.content},
+                "finish_reason": "stop" if self.early_stopped else self.finish_reason
+            }]
+        }
+        if self.usage:
+            result["usage"] = self.usage
+        return result
+
+
+class StreamedResponse:
+    """流式读取后组装的响应，提供与 HTTP 响应相同的 status_code/headers/text/json()"""
+
+    def __init__(self, status_code: int, headers, result: Dict[str, Any], early_stopped: bool = False):
+        self.status_code = status_code
+        self.headers = headers
+        self._result = result
+        self.early_stopped = early_stopped
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self._result, ensure_ascii=False)
+
+    def json(self) -> Dict[str, Any]:
+        return self._result
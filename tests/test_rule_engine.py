@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_CLASSIFICATION_RULES
+from core.rule_engine import ClassificationRule
+
+
+def _matches(rule_name, filename):
+    rule = next(rule for rule in DEFAULT_CLASSIFICATION_RULES if rule["name"] == rule_name)
+    return ClassificationRule(rule).filename.search(filename) is not None
+
+
+def test_screenshot_filenames():
+    for name in ["Screenshot_20240101-120000.png", "Screen Shot 2023-05-01 at 10.00.00.png",
+                 "screenshot.png", "Snipaste_2024-01-01_10-00-00.png", "微信截图_20240101.png", "截屏2024-01-01.png"]:
+        assert _matches("截图文件名", name), name
+    for name in ["screenshots_wallpaper.png", "screensaver.jpg", "snipasted.png", "IMG_0001.jpg"]:
+        assert not _matches("截图文件名", name), name
+
+
+def test_screen_recording_filenames():
+    for name in ["ScreenRecording_01-01-2024.mp4", "screen-recording 1.mov", "录屏_20240101.mp4"]:
+        assert _matches("录屏文件名", name), name
+    for name in ["screenrecordings_backup.mp4", "VID_20240101.mp4"]:
+        assert not _matches("录屏文件名", name), name
+
+
+def test_scan_filenames():
+    for name in ["scan0001.jpg", "Scan_2024-01-01.png", "scanned document.jpg", "scan.jpg",
+                 "CamScanner 01-01-2024 10.00.jpg", "扫描件_001.jpg", "全能扫描王 2024.jpg"]:
+        assert _matches("扫描件文件名", name), name
+    for name in ["Scandinavia.jpg", "scanner.png", "scans_of_trip.jpg", "IMG_scan.jpg"]:
+        assert not _matches("扫描件文件名", name), name
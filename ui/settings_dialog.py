@@ -17,15 +17,30 @@ from config import (
     DEFAULT_VIDEO_FRAME_MODE,
     DEFAULT_API_TYPE, DEFAULT_NETWORK_API_URL, DEFAULT_NETWORK_API_KEY,
     DEFAULT_NETWORK_API_MODEL, DEFAULT_NETWORK_API_MAX_CONCURRENT,
-    DEFAULT_NETWORK_API_MODELS,
+    DEFAULT_NETWORK_API_MODELS, DEFAULT_NETWORK_API_MODEL_LIMITS,
     DEFAULT_RENAME_ENABLED, DEFAULT_RENAME_PROMPT, DEFAULT_VIDEO_RENAME_PROMPT,
     DEFAULT_RENAME_INCLUDE_ORIGINAL_NAME, DEFAULT_RENAME_DATE_TYPE,
     DEFAULT_RENAME_DATE_FORMAT,
     DEFAULT_RETRY_ENABLED, DEFAULT_RETRY_COUNT, DEFAULT_RETRY_DELAY,
-    DEFAULT_REQUEST_TIMEOUT, DEFAULT_ERROR_EXPORT_ENABLED, DEFAULT_ERROR_EXPORT_FOLDER
+    DEFAULT_REQUEST_TIMEOUT, DEFAULT_ERROR_EXPORT_ENABLED, DEFAULT_ERROR_EXPORT_FOLDER,
+    DEFAULT_ASYNC_ENGINE_ENABLED, DEFAULT_ASYNC_MAX_IN_FLIGHT,
+    DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED, DEFAULT_ADAPTIVE_CONCURRENCY_MIN,
+    DEFAULT_ADAPTIVE_CONCURRENCY_MAX, DEFAULT_NETWORK_API_ROUTING,
+    DEFAULT_HEDGE_ENABLED, DEFAULT_HEDGE_BUDGET_PERCENT,
+    DEFAULT_NETWORK_BATCH_SIZE, DEFAULT_CONTACT_SHEET_SIZE, DEFAULT_NETWORK_STREAM_ENABLED,
+    DEFAULT_STRUCTURED_OUTPUT_ENABLED, DEFAULT_CASCADE_ENABLED,
+    DEFAULT_RULE_ENGINE_ENABLED, DEFAULT_CLASSIFICATION_RULES,
+    DEFAULT_BATCH_JOB_ENABLED, DEFAULT_BATCH_JOB_BACKEND, DEFAULT_BATCH_JOB_SHARD_SIZE, DEFAULT_BATCH_JOB_SHARD_MAX_MB,
+    DEFAULT_BATCH_JOB_POLL_INTERVAL,
+    DEFAULT_PIPELINE_ENABLED, DEFAULT_PIPELINE_IO_WORKERS, DEFAULT_PIPELINE_DECODE_WORKERS,
+    DEFAULT_SCHEDULING_POLICY, DEFAULT_CHECKPOINT_ENABLED, DEFAULT_CHECKPOINT_RESCAN,
+    DEFAULT_OLLAMA_KEEP_ALIVE, DEFAULT_OLLAMA_NUM_PREDICT, DEFAULT_OLLAMA_NUM_PARALLEL,
+    DEFAULT_OLLAMA_URLS
 )
 from core.ollama_client import OllamaClient
 from core.network_client import NetworkClient
+from core.scheduler import SCHEDULING_POLICIES
+from core.rule_engine import format_rules, parse_rules
 
 
 class SettingsDialog(QDialog):
@@ -146,6 +161,29 @@ class SettingsDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"测试失败: {str(e)}")
 
+    @staticmethod
+    def _format_model_limits(model_limits: dict) -> str:
+        lines = []
+        for model, budget in (model_limits or {}).items():
+            lines.append(f"{model} {budget.get('rpm', 0)} {budget.get('tpm', 0)}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _parse_model_limits(text: str) -> dict:
+        """解析模型限流配置，每行格式: 模型名 RPM TPM"""
+        model_limits = {}
+        for line in text.split("\n"):
+            parts = line.split()
+            if not parts:
+                continue
+            try:
+                rpm = int(parts[1]) if len(parts) > 1 else 0
+                tpm = int(parts[2]) if len(parts) > 2 else 0
+            except ValueError:
+                continue
+            model_limits[parts[0]] = {"rpm": rpm, "tpm": tpm}
+        return model_limits
+
     def reset_defaults(self):
         reply = QMessageBox.question(
             self, "确认", "确定要重置为默认设置吗？",
@@ -166,14 +204,43 @@ class SettingsDialog(QDialog):
                 self.model_combo.addItem(model)
             self.model_combo.setCurrentText(defaults["ollama_model"])
             self.concurrent_spin.setValue(defaults["max_concurrent"])
+            self.ollama_keep_alive_edit.setText(defaults.get("ollama_keep_alive", DEFAULT_OLLAMA_KEEP_ALIVE))
+            self.ollama_num_predict_spin.setValue(defaults.get("ollama_num_predict", DEFAULT_OLLAMA_NUM_PREDICT))
+            self.ollama_num_parallel_spin.setValue(defaults.get("ollama_num_parallel", DEFAULT_OLLAMA_NUM_PARALLEL))
+            self.ollama_urls_text.setPlainText("\n".join(defaults.get("ollama_urls", DEFAULT_OLLAMA_URLS)))
             
             # Network API Settings
             self.network_api_url_edit.setText(defaults["network_api_url"])
             self.network_api_key_edit.setText(defaults["network_api_key"])
             self.network_api_models_text.setPlainText("\n".join(defaults["available_network_models"]))
+            self.network_api_model_limits_text.setPlainText(
+                self._format_model_limits(defaults.get("network_api_model_limits", DEFAULT_NETWORK_API_MODEL_LIMITS))
+            )
             self.network_api_round_robin_check.setChecked(defaults.get("network_api_round_robin", True))
+            routing_index = self.network_api_routing_combo.findData(defaults.get("network_api_routing", DEFAULT_NETWORK_API_ROUTING))
+            if routing_index >= 0:
+                self.network_api_routing_combo.setCurrentIndex(routing_index)
+            self.network_batch_size_spin.setValue(defaults.get("network_batch_size", DEFAULT_NETWORK_BATCH_SIZE))
+            self.contact_sheet_size_spin.setValue(defaults.get("contact_sheet_size", DEFAULT_CONTACT_SHEET_SIZE))
+            self.hedge_enabled_check.setChecked(defaults.get("hedge_enabled", DEFAULT_HEDGE_ENABLED))
+            self.hedge_budget_spin.setValue(defaults.get("hedge_budget_percent", DEFAULT_HEDGE_BUDGET_PERCENT))
+            self.network_stream_check.setChecked(defaults.get("network_stream_enabled", DEFAULT_NETWORK_STREAM_ENABLED))
+            self.structured_output_check.setChecked(defaults.get("structured_output_enabled", DEFAULT_STRUCTURED_OUTPUT_ENABLED))
+            self.cascade_enabled_check.setChecked(defaults.get("cascade_enabled", DEFAULT_CASCADE_ENABLED))
+            self.batch_job_check.setChecked(defaults.get("batch_job_enabled", DEFAULT_BATCH_JOB_ENABLED))
+            backend_index = self.batch_job_backend_combo.findData(defaults.get("batch_job_backend", DEFAULT_BATCH_JOB_BACKEND))
+            if backend_index >= 0:
+                self.batch_job_backend_combo.setCurrentIndex(backend_index)
+            self.batch_job_shard_size_spin.setValue(defaults.get("batch_job_shard_size", DEFAULT_BATCH_JOB_SHARD_SIZE))
+            self.batch_job_shard_max_mb_spin.setValue(defaults.get("batch_job_shard_max_mb", DEFAULT_BATCH_JOB_SHARD_MAX_MB))
+            self.batch_job_poll_interval_spin.setValue(defaults.get("batch_job_poll_interval", DEFAULT_BATCH_JOB_POLL_INTERVAL))
             self.network_concurrent_spin.setValue(defaults["network_api_max_concurrent"])
             self.network_model_max_concurrent_spin.setValue(defaults.get("network_api_model_max_concurrent", 2))
+            self.adaptive_concurrency_check.setChecked(defaults.get("adaptive_concurrency_enabled", DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED))
+            self.adaptive_concurrency_min_spin.setValue(defaults.get("adaptive_concurrency_min", DEFAULT_ADAPTIVE_CONCURRENCY_MIN))
+            self.adaptive_concurrency_max_spin.setValue(defaults.get("adaptive_concurrency_max", DEFAULT_ADAPTIVE_CONCURRENCY_MAX))
+            self.async_engine_check.setChecked(defaults.get("async_engine_enabled", DEFAULT_ASYNC_ENGINE_ENABLED))
+            self.async_max_in_flight_spin.setValue(defaults.get("async_max_in_flight", DEFAULT_ASYNC_MAX_IN_FLIGHT))
             
             # Network Retry Settings
             self.retry_enabled_check.setChecked(defaults["retry_enabled"])
@@ -201,6 +268,22 @@ class SettingsDialog(QDialog):
             fs_index = self.folder_structure_combo.findData(defaults["folder_structure"])
             if fs_index >= 0:
                 self.folder_structure_combo.setCurrentIndex(fs_index)
+            self.checkpoint_check.setChecked(defaults.get("checkpoint_enabled", DEFAULT_CHECKPOINT_ENABLED))
+            self.checkpoint_rescan_check.setChecked(defaults.get("checkpoint_rescan", DEFAULT_CHECKPOINT_RESCAN))
+            
+            # Staged pipeline
+            self.pipeline_check.setChecked(defaults.get("pipeline_enabled", DEFAULT_PIPELINE_ENABLED))
+            self.pipeline_io_workers_spin.setValue(defaults.get("pipeline_io_workers", DEFAULT_PIPELINE_IO_WORKERS))
+            self.pipeline_decode_workers_spin.setValue(defaults.get("pipeline_decode_workers", DEFAULT_PIPELINE_DECODE_WORKERS))
+            sp_index = self.scheduling_policy_combo.findData(defaults.get("scheduling_policy", DEFAULT_SCHEDULING_POLICY))
+            if sp_index >= 0:
+                self.scheduling_policy_combo.setCurrentIndex(sp_index)
+            
+            # Rule-based pre-classification
+            self.rule_engine_check.setChecked(defaults.get("rule_engine_enabled", DEFAULT_RULE_ENGINE_ENABLED))
+            self.classification_rules_text.setPlainText(
+                format_rules(defaults.get("classification_rules", DEFAULT_CLASSIFICATION_RULES))
+            )
             
             # Processing Settings
             self.process_images_check.setChecked(defaults["process_images"])
@@ -258,18 +341,45 @@ class SettingsDialog(QDialog):
         # 按换行符分割并清理
         models = [line.strip() for line in models_text.split("\n") if line.strip()]
         
-        return {
+        ollama_urls = [line.strip() for line in self.ollama_urls_text.toPlainText().split("\n") if line.strip()]
+        
+        # 保留对话框中没有对应控件的设置项（例如直接在 settings.json 中配置的高级选项）
+        settings = dict(self.settings)
+        settings.update({
             "api_type": self.api_type_combo.currentData(),
             "ollama_url": self.url_edit.text().strip(),
             "ollama_model": self.model_combo.currentText().strip(),
+            "ollama_keep_alive": self.ollama_keep_alive_edit.text().strip() or DEFAULT_OLLAMA_KEEP_ALIVE,
+            "ollama_num_predict": self.ollama_num_predict_spin.value(),
+            "ollama_num_parallel": self.ollama_num_parallel_spin.value(),
+            "ollama_urls": ollama_urls,
             "available_models": self.settings.get("available_models", DEFAULT_MODELS),
             "network_api_url": self.network_api_url_edit.text().strip(),
             "network_api_key": self.network_api_key_edit.text().strip(),
             "network_api_model": models[0] if models else "",
             "available_network_models": models,
+            "network_api_model_limits": self._parse_model_limits(self.network_api_model_limits_text.toPlainText()),
             "network_api_round_robin": self.network_api_round_robin_check.isChecked(),
+            "network_api_routing": self.network_api_routing_combo.currentData(),
+            "network_batch_size": self.network_batch_size_spin.value(),
+            "contact_sheet_size": self.contact_sheet_size_spin.value(),
+            "hedge_enabled": self.hedge_enabled_check.isChecked(),
+            "hedge_budget_percent": self.hedge_budget_spin.value(),
+            "network_stream_enabled": self.network_stream_check.isChecked(),
+            "structured_output_enabled": self.structured_output_check.isChecked(),
+            "cascade_enabled": self.cascade_enabled_check.isChecked(),
+            "batch_job_enabled": self.batch_job_check.isChecked(),
+            "batch_job_backend": self.batch_job_backend_combo.currentData(),
+            "batch_job_shard_size": self.batch_job_shard_size_spin.value(),
+            "batch_job_shard_max_mb": self.batch_job_shard_max_mb_spin.value(),
+            "batch_job_poll_interval": self.batch_job_poll_interval_spin.value(),
             "network_api_max_concurrent": self.network_concurrent_spin.value(),
             "network_api_model_max_concurrent": self.network_model_max_concurrent_spin.value(),
+            "adaptive_concurrency_enabled": self.adaptive_concurrency_check.isChecked(),
+            "adaptive_concurrency_min": self.adaptive_concurrency_min_spin.value(),
+            "adaptive_concurrency_max": self.adaptive_concurrency_max_spin.value(),
+            "async_engine_enabled": self.async_engine_check.isChecked(),
+            "async_max_in_flight": self.async_max_in_flight_spin.value(),
             # 图片AI设置
             "image_categories": image_categories,
             "image_prompt": self.image_prompt_edit.toPlainText(),
@@ -303,6 +413,14 @@ class SettingsDialog(QDialog):
             "operation_mode": self.operation_combo.currentData(),
             "time_source": self.time_source_combo.currentData(),
             "folder_structure": self.folder_structure_combo.currentData(),
+            "checkpoint_enabled": self.checkpoint_check.isChecked(),
+            "checkpoint_rescan": self.checkpoint_rescan_check.isChecked(),
+            "pipeline_enabled": self.pipeline_check.isChecked(),
+            "pipeline_io_workers": self.pipeline_io_workers_spin.value(),
+            "pipeline_decode_workers": self.pipeline_decode_workers_spin.value(),
+            "scheduling_policy": self.scheduling_policy_combo.currentData(),
+            "rule_engine_enabled": self.rule_engine_check.isChecked(),
+            "classification_rules": parse_rules(self.classification_rules_text.toPlainText()),
             "process_images": self.process_images_check.isChecked(),
             "process_videos": self.process_videos_check.isChecked(),
             # AI enable settings
@@ -315,7 +433,8 @@ class SettingsDialog(QDialog):
             "request_timeout": self.request_timeout_spin.value(),
             "error_export_enabled": self.error_export_check.isChecked(),
             "error_export_folder": self.error_export_folder_edit.text().strip()
-        }
+        })
+        return settings
 
     def accept(self):
         new_settings = self.get_settings()
@@ -364,6 +483,29 @@ class SettingsDialog(QDialog):
         self.concurrent_spin.setValue(self.settings.get("max_concurrent", DEFAULT_MAX_CONCURRENT))
         ollama_layout.addRow("最大并发数:", self.concurrent_spin)
         
+        self.ollama_keep_alive_edit = QLineEdit(self.settings.get("ollama_keep_alive", DEFAULT_OLLAMA_KEEP_ALIVE))
+        self.ollama_keep_alive_edit.setPlaceholderText("例如 30m、2h，-1 表示常驻")
+        ollama_layout.addRow("模型保留时间:", self.ollama_keep_alive_edit)
+        
+        self.ollama_num_predict_spin = QSpinBox()
+        self.ollama_num_predict_spin.setMinimum(16)
+        self.ollama_num_predict_spin.setMaximum(4096)
+        self.ollama_num_predict_spin.setValue(self.settings.get("ollama_num_predict", DEFAULT_OLLAMA_NUM_PREDICT))
+        ollama_layout.addRow("最大生成token数:", self.ollama_num_predict_spin)
+        
+        self.ollama_num_parallel_spin = QSpinBox()
+        self.ollama_num_parallel_spin.setMinimum(0)
+        self.ollama_num_parallel_spin.setMaximum(64)
+        self.ollama_num_parallel_spin.setSpecialValueText("自动检测")
+        self.ollama_num_parallel_spin.setValue(self.settings.get("ollama_num_parallel", DEFAULT_OLLAMA_NUM_PARALLEL))
+        ollama_layout.addRow("服务端并行数:", self.ollama_num_parallel_spin)
+        
+        self.ollama_urls_text = QTextEdit()
+        self.ollama_urls_text.setPlainText("\n".join(self.settings.get("ollama_urls", DEFAULT_OLLAMA_URLS)))
+        self.ollama_urls_text.setPlaceholderText("http://192.168.1.10:11434\nhttp://192.168.1.11:11434")
+        self.ollama_urls_text.setMaximumHeight(80)
+        ollama_layout.addRow("多个服务地址（一行一个，留空只用上面的地址）:", self.ollama_urls_text)
+        
         ollama_group.setLayout(ollama_layout)
         
         # Network API Settings
@@ -387,23 +529,132 @@ class SettingsDialog(QDialog):
         
         self.network_model_max_concurrent_spin = QSpinBox()
         self.network_model_max_concurrent_spin.setMinimum(1)
-        self.network_model_max_concurrent_spin.setMaximum(5)
+        self.network_model_max_concurrent_spin.setMaximum(500)
         self.network_model_max_concurrent_spin.setValue(self.settings.get("network_api_model_max_concurrent", 2))
         
+        self.adaptive_concurrency_check = QCheckBox("启用自适应并发（根据延迟和限流自动调整全局并发数）")
+        self.adaptive_concurrency_check.setChecked(self.settings.get("adaptive_concurrency_enabled", DEFAULT_ADAPTIVE_CONCURRENCY_ENABLED))
+        
+        self.adaptive_concurrency_min_spin = QSpinBox()
+        self.adaptive_concurrency_min_spin.setMinimum(1)
+        self.adaptive_concurrency_min_spin.setMaximum(100)
+        self.adaptive_concurrency_min_spin.setValue(self.settings.get("adaptive_concurrency_min", DEFAULT_ADAPTIVE_CONCURRENCY_MIN))
+        
+        self.adaptive_concurrency_max_spin = QSpinBox()
+        self.adaptive_concurrency_max_spin.setMinimum(1)
+        self.adaptive_concurrency_max_spin.setMaximum(100)
+        self.adaptive_concurrency_max_spin.setValue(self.settings.get("adaptive_concurrency_max", DEFAULT_ADAPTIVE_CONCURRENCY_MAX))
+        
+        self.async_engine_check = QCheckBox("启用异步推理引擎（需要 httpx，支持数百个并发请求）")
+        self.async_engine_check.setChecked(self.settings.get("async_engine_enabled", DEFAULT_ASYNC_ENGINE_ENABLED))
+        
+        self.async_max_in_flight_spin = QSpinBox()
+        self.async_max_in_flight_spin.setMinimum(1)
+        self.async_max_in_flight_spin.setMaximum(1000)
+        self.async_max_in_flight_spin.setValue(self.settings.get("async_max_in_flight", DEFAULT_ASYNC_MAX_IN_FLIGHT))
+        
         self.network_api_models_text = QTextEdit()
         available_network_models = self.settings.get("available_network_models", DEFAULT_NETWORK_API_MODELS)
         self.network_api_models_text.setPlainText("\n".join(available_network_models))
         self.network_api_models_text.setPlaceholderText("Qwen/Qwen3-VL-8B-Instruct\nPro/zai-org/GLM-4.7\ndeepseek-ai/DeepSeek-V3.2\ngemini-3-pro-low")
         
+        self.network_api_model_limits_text = QTextEdit()
+        self.network_api_model_limits_text.setPlainText(
+            self._format_model_limits(self.settings.get("network_api_model_limits", DEFAULT_NETWORK_API_MODEL_LIMITS))
+        )
+        self.network_api_model_limits_text.setPlaceholderText("每行一个模型: 模型名 RPM TPM（0 表示不限）\nQwen/Qwen3-VL-8B-Instruct 1000 50000")
+        self.network_api_model_limits_text.setMaximumHeight(80)
+        
         self.network_api_round_robin_check = QCheckBox("启用模型轮询")
         self.network_api_round_robin_check.setChecked(self.settings.get("network_api_round_robin", True))
         
+        self.network_batch_size_spin = QSpinBox()
+        self.network_batch_size_spin.setMinimum(1)
+        self.network_batch_size_spin.setMaximum(16)
+        self.network_batch_size_spin.setValue(self.settings.get("network_batch_size", DEFAULT_NETWORK_BATCH_SIZE))
+        
+        self.contact_sheet_size_spin = QSpinBox()
+        self.contact_sheet_size_spin.setMinimum(1)
+        self.contact_sheet_size_spin.setMaximum(25)
+        self.contact_sheet_size_spin.setValue(self.settings.get("contact_sheet_size", DEFAULT_CONTACT_SHEET_SIZE))
+        
+        self.hedge_enabled_check = QCheckBox("启用对冲请求（超过模型 P95 延迟时向另一个模型发送副本）")
+        self.hedge_enabled_check.setChecked(self.settings.get("hedge_enabled", DEFAULT_HEDGE_ENABLED))
+        
+        self.hedge_budget_spin = QSpinBox()
+        self.hedge_budget_spin.setMinimum(1)
+        self.hedge_budget_spin.setMaximum(50)
+        self.hedge_budget_spin.setValue(self.settings.get("hedge_budget_percent", DEFAULT_HEDGE_BUDGET_PERCENT))
+        
+        self.network_stream_check = QCheckBox("启用流式响应（回答完整后立即断开）")
+        self.network_stream_check.setChecked(self.settings.get("network_stream_enabled", DEFAULT_NETWORK_STREAM_ENABLED))
+        
+        self.structured_output_check = QCheckBox("启用输出约束（response_format 限定类别，按输出结构设置 max_tokens）")
+        self.structured_output_check.setChecked(self.settings.get("structured_output_enabled", DEFAULT_STRUCTURED_OUTPUT_ENABLED))
+        
+        self.cascade_enabled_check = QCheckBox("两级识别（先用 Ollama 模型识别，没有把握时再请求网络模型）")
+        self.cascade_enabled_check.setChecked(self.settings.get("cascade_enabled", DEFAULT_CASCADE_ENABLED))
+        
+        self.batch_job_check = QCheckBox("离线批处理（写出 JSONL 提交批处理任务，完成后统一入库，适合通宵运行）")
+        self.batch_job_check.setChecked(self.settings.get("batch_job_enabled", DEFAULT_BATCH_JOB_ENABLED))
+        
+        self.batch_job_backend_combo = QComboBox()
+        self.batch_job_backend_combo.addItem("Batch API（OpenAI 兼容）", "openai")
+        self.batch_job_backend_combo.addItem("本地逐个发送", "local")
+        backend_index = self.batch_job_backend_combo.findData(self.settings.get("batch_job_backend", DEFAULT_BATCH_JOB_BACKEND))
+        if backend_index >= 0:
+            self.batch_job_backend_combo.setCurrentIndex(backend_index)
+        
+        self.batch_job_shard_size_spin = QSpinBox()
+        self.batch_job_shard_size_spin.setMinimum(1)
+        self.batch_job_shard_size_spin.setMaximum(50000)
+        self.batch_job_shard_size_spin.setValue(self.settings.get("batch_job_shard_size", DEFAULT_BATCH_JOB_SHARD_SIZE))
+        
+        self.batch_job_shard_max_mb_spin = QSpinBox()
+        self.batch_job_shard_max_mb_spin.setMinimum(1)
+        self.batch_job_shard_max_mb_spin.setMaximum(200)
+        self.batch_job_shard_max_mb_spin.setSuffix(" MB")
+        self.batch_job_shard_max_mb_spin.setValue(self.settings.get("batch_job_shard_max_mb", DEFAULT_BATCH_JOB_SHARD_MAX_MB))
+        
+        self.batch_job_poll_interval_spin = QSpinBox()
+        self.batch_job_poll_interval_spin.setMinimum(5)
+        self.batch_job_poll_interval_spin.setMaximum(3600)
+        self.batch_job_poll_interval_spin.setSuffix(" 秒")
+        self.batch_job_poll_interval_spin.setValue(self.settings.get("batch_job_poll_interval", DEFAULT_BATCH_JOB_POLL_INTERVAL))
+        
+        self.network_api_routing_combo = QComboBox()
+        self.network_api_routing_combo.addItem("预期完成时间最短（按延迟和成功率）", "least_latency")
+        self.network_api_routing_combo.addItem("随机二选一（Power of Two Choices）", "p2c")
+        self.network_api_routing_combo.addItem("活跃请求最少", "least_loaded")
+        routing_index = self.network_api_routing_combo.findData(self.settings.get("network_api_routing", DEFAULT_NETWORK_API_ROUTING))
+        if routing_index >= 0:
+            self.network_api_routing_combo.setCurrentIndex(routing_index)
+        
         network_layout.addRow("API URL:", self.network_api_url_edit)
         network_layout.addRow("API Key:", self.network_api_key_edit)
         network_layout.addRow("模型列表（一行一个）:", self.network_api_models_text)
+        network_layout.addRow("模型速率预算:", self.network_api_model_limits_text)
         network_layout.addRow(self.network_api_round_robin_check)
+        network_layout.addRow("模型路由策略:", self.network_api_routing_combo)
+        network_layout.addRow("每次请求图片数（批量）:", self.network_batch_size_spin)
+        network_layout.addRow("联系表缩略图数（1 为关闭）:", self.contact_sheet_size_spin)
+        network_layout.addRow(self.hedge_enabled_check)
+        network_layout.addRow("对冲请求预算(%):", self.hedge_budget_spin)
+        network_layout.addRow(self.network_stream_check)
+        network_layout.addRow(self.structured_output_check)
+        network_layout.addRow(self.cascade_enabled_check)
+        network_layout.addRow(self.batch_job_check)
+        network_layout.addRow("批处理方式:", self.batch_job_backend_combo)
+        network_layout.addRow("每个分片请求数:", self.batch_job_shard_size_spin)
+        network_layout.addRow("每个分片大小上限:", self.batch_job_shard_max_mb_spin)
+        network_layout.addRow("批处理状态查询间隔:", self.batch_job_poll_interval_spin)
         network_layout.addRow("全局最大并发数:", self.network_concurrent_spin)
         network_layout.addRow("每个模型最大并发数:", self.network_model_max_concurrent_spin)
+        network_layout.addRow(self.adaptive_concurrency_check)
+        network_layout.addRow("自适应并发下限:", self.adaptive_concurrency_min_spin)
+        network_layout.addRow("自适应并发上限:", self.adaptive_concurrency_max_spin)
+        network_layout.addRow(self.async_engine_check)
+        network_layout.addRow("异步最大在途请求数:", self.async_max_in_flight_spin)
         network_layout.addRow(test_layout)
         
         network_group.setLayout(network_layout)
@@ -778,9 +1029,74 @@ class SettingsDialog(QDialog):
             self.folder_structure_combo.setCurrentIndex(fs_index)
         operation_layout.addRow("目录结构:", self.folder_structure_combo)
 
+        self.checkpoint_check = QCheckBox("保存运行检查点（中断后以相同设置再次运行同一目录时从中断处继续）")
+        self.checkpoint_check.setChecked(self.settings.get("checkpoint_enabled", DEFAULT_CHECKPOINT_ENABLED))
+        operation_layout.addRow(self.checkpoint_check)
+
+        self.checkpoint_rescan_check = QCheckBox("从检查点继续时重新扫描源目录（加入中断后新增的文件）")
+        self.checkpoint_rescan_check.setChecked(self.settings.get("checkpoint_rescan", DEFAULT_CHECKPOINT_RESCAN))
+        operation_layout.addRow(self.checkpoint_rescan_check)
+
         operation_group.setLayout(operation_layout)
         layout.addWidget(operation_group)
 
+        # 处理流水线
+        pipeline_group = QGroupBox("处理流水线")
+        pipeline_layout = QFormLayout()
+        
+        self.pipeline_check = QCheckBox("启用分阶段流水线（检查、解码、识别、移动各用独立线程池）")
+        self.pipeline_check.setChecked(self.settings.get("pipeline_enabled", DEFAULT_PIPELINE_ENABLED))
+        pipeline_layout.addRow(self.pipeline_check)
+        
+        self.pipeline_io_workers_spin = QSpinBox()
+        self.pipeline_io_workers_spin.setMinimum(1)
+        self.pipeline_io_workers_spin.setMaximum(32)
+        self.pipeline_io_workers_spin.setValue(self.settings.get("pipeline_io_workers", DEFAULT_PIPELINE_IO_WORKERS))
+        pipeline_layout.addRow("检查/移动线程数:", self.pipeline_io_workers_spin)
+        
+        self.pipeline_decode_workers_spin = QSpinBox()
+        self.pipeline_decode_workers_spin.setMinimum(0)
+        self.pipeline_decode_workers_spin.setMaximum(64)
+        self.pipeline_decode_workers_spin.setSpecialValueText("自动（CPU 核数）")
+        self.pipeline_decode_workers_spin.setValue(self.settings.get("pipeline_decode_workers", DEFAULT_PIPELINE_DECODE_WORKERS))
+        pipeline_layout.addRow("解码线程数:", self.pipeline_decode_workers_spin)
+        
+        self.scheduling_policy_combo = QComboBox()
+        for policy, description in SCHEDULING_POLICIES.items():
+            self.scheduling_policy_combo.addItem(description, policy)
+        sp_index = self.scheduling_policy_combo.findData(
+            self.settings.get("scheduling_policy", DEFAULT_SCHEDULING_POLICY)
+        )
+        if sp_index >= 0:
+            self.scheduling_policy_combo.setCurrentIndex(sp_index)
+        pipeline_layout.addRow("处理顺序:", self.scheduling_policy_combo)
+        
+        pipeline_group.setLayout(pipeline_layout)
+        layout.addWidget(pipeline_group)
+
+        # 规则预分类
+        rule_group = QGroupBox("规则预分类")
+        rule_layout = QVBoxLayout()
+        
+        self.rule_engine_check = QCheckBox("启用规则预分类（命中规则的文件跳过解码和AI识别）")
+        self.rule_engine_check.setChecked(self.settings.get("rule_engine_enabled", DEFAULT_RULE_ENGINE_ENABLED))
+        rule_layout.addWidget(self.rule_engine_check)
+        
+        rule_layout.addWidget(QLabel("规则（每行一条 JSON，按顺序检查，命中第一条即采用其类别）:"))
+        self.classification_rules_text = QTextEdit()
+        self.classification_rules_text.setPlainText(
+            format_rules(self.settings.get("classification_rules", DEFAULT_CLASSIFICATION_RULES))
+        )
+        self.classification_rules_text.setPlaceholderText(
+            '{"name": "截图文件名", "category": "截图", "filename": "^screenshot"}\n'
+            '条件: media, extensions, filename, no_camera_exif, screen_size, sizes, min_ratio, max_ratio'
+        )
+        self.classification_rules_text.setMaximumHeight(100)
+        rule_layout.addWidget(self.classification_rules_text)
+        
+        rule_group.setLayout(rule_layout)
+        layout.addWidget(rule_group)
+
         # 网络重试设置
         retry_group = QGroupBox("网络重试设置")
         retry_layout = QFormLayout()